@@ -9,6 +9,7 @@ from Gamepad.Gamepad import Gamepad
 
 class PS3(Gamepad):
     fullName = 'PlayStation 3 controller'
+    joystickNames = ('Sony PLAYSTATION(R)3 Controller',)
 
     def __init__(self, joystickNumber = 0):
         Gamepad.__init__(self, joystickNumber)
@@ -93,6 +94,10 @@ class PS3(Gamepad):
 
 class PS4(Gamepad):
     fullName = 'PlayStation 4 controller'
+    joystickNames = ('Sony Interactive Entertainment Wireless Controller',
+                     'Sony Computer Entertainment Wireless Controller')
+    # What hid-sony reports over Bluetooth. Third-party pads often have it in their names too.
+    joystickExactNames = ('Wireless Controller',)
 
     def __init__(self, joystickNumber = 0):
         Gamepad.__init__(self, joystickNumber)
@@ -161,6 +166,7 @@ class PS4(Gamepad):
 
 class Xbox360(Gamepad):
     fullName = 'Xbox 360 controller'
+    joystickNames = ('Microsoft X-Box 360 pad', 'Xbox 360 Wireless Receiver')
 
     def __init__(self, joystickNumber = 0):
         Gamepad.__init__(self, joystickNumber)
@@ -189,6 +195,7 @@ class Xbox360(Gamepad):
 
 class XboxONE(Gamepad):
     fullName = 'Xbox ONE controller'
+    joystickNames = ('Microsoft X-Box One pad', 'Microsoft X-Box One S pad', 'Xbox Wireless Controller')
 
     def __init__(self, joystickNumber = 0):
         Gamepad.__init__(self, joystickNumber)
@@ -219,6 +226,7 @@ class XboxONE(Gamepad):
         
 class Steam(Gamepad):
     fullName = 'Steam controller'
+    joystickNames = ('Valve Software Steam Controller', 'Steam Controller')
 
     def __init__(self, joystickNumber = 0):
         Gamepad.__init__(self, joystickNumber)
@@ -309,6 +317,7 @@ class GameHat(Gamepad):
 
 class PG9099(Gamepad):
     fullName = 'ipega PG-9099 Bluetooth Controller'
+    joystickNames = ('PG-9099',)
 
     def __init__(self, joystickNumber = 0):
         Gamepad.__init__(self, joystickNumber)
@@ -347,6 +356,8 @@ class Joystick(Gamepad):
     # self.buttonNames needs the same treatment.
     # Use python Gamepad.py to get the event mappings.
     fullName = 'AV8R'
+    joystickNames = ('AV8R',)
+    joystickLayout = (7, 14)
 
     def __init__(self, joystickNumber = 0):
         Gamepad.__init__(self, joystickNumber)
@@ -11,35 +11,66 @@ For basic use see the following examples:
     AsyncAndEventExample.py - Mixing callbacks and background updates.
 """
 
+import fcntl
 import os
 import sys
 import struct
 import time
 import threading
-import inspect
+
+# joydev ioctls, from linux/joystick.h
+JSIOCGAXES = 0x80016a11
+JSIOCGBUTTONS = 0x80016a12
+JSIOCGNAME_BASE = 0x80006a13
+DEVICE_NAME_LENGTH = 128
 
 def available(joystickNumber = 0):
     """Check if a joystick is connected and ready to use."""
     joystickPath = '/dev/input/js' + str(joystickNumber)
     return os.path.exists(joystickPath)
 
+def deviceInfo(joystickNumber = 0):
+    """Returns (name, axis count, button count) for a joystick, as reported by the joydev driver.
+
+    Throws IOError if the device cannot be opened or queried."""
+    with open('/dev/input/js' + str(joystickNumber), 'rb', buffering=0) as joystickFile:
+        name = bytearray(DEVICE_NAME_LENGTH)
+        length = fcntl.ioctl(joystickFile, JSIOCGNAME_BASE | (DEVICE_NAME_LENGTH << 16), name, True)
+        count = bytearray(1)
+        fcntl.ioctl(joystickFile, JSIOCGAXES, count, True)
+        axes = count[0]
+        fcntl.ioctl(joystickFile, JSIOCGBUTTONS, count, True)
+        buttons = count[0]
+    return bytes(name[:length]).rstrip(b'\0').decode('utf-8', 'replace'), axes, buttons
+
 class Gamepad:
     EVENT_CODE_BUTTON = 0x01
     EVENT_CODE_AXIS = 0x02
-    EVENT_CODE_INIT_BUTTON = 0x80 | EVENT_CODE_BUTTON
-    EVENT_CODE_INIT_AXIS = 0x80 | EVENT_CODE_AXIS
+    EVENT_CODE_INIT = 0x80
+    EVENT_CODE_INIT_BUTTON = EVENT_CODE_INIT | EVENT_CODE_BUTTON
+    EVENT_CODE_INIT_AXIS = EVENT_CODE_INIT | EVENT_CODE_AXIS
     MIN_AXIS = -32767.0
     MAX_AXIS = +32767.0
     EVENT_BUTTON = 'BUTTON'
     EVENT_AXIS = 'AXIS'
     fullName = 'Generic (numbers only)'
+    # Bytes read at once by updateStateBatch, a whole number of events
+    BATCH_SIZE = 64 * 8
+    # Names the kernel reports for devices this mapping fits, see identify().
+    # Exact names are tried first, then the longest one contained in the device name.
+    joystickNames = ()
+    # Names that only match exactly, for generic ones other vendors' pads also contain
+    joystickExactNames = ()
+    # (axis count, button count), used to pick a mapping when the name is unknown
+    joystickLayout = None
 
     class UpdateThread(threading.Thread):
         """Thread used to continually run the updateState function on a Gamepad in the background
 
         One of these is created by the Gamepad startBackgroundUpdates function and closed by stopBackgroundUpdates"""
-        def __init__(self, gamepad):
+        def __init__(self, gamepad, coalesce = False):
             threading.Thread.__init__(self)
+            self.coalesce = coalesce
             if isinstance(gamepad, Gamepad):
                 self.gamepad = gamepad
             else:
@@ -47,14 +78,19 @@ class Gamepad:
             self.running = True
 
         def run(self):
+            readyEvent = self.gamepad.readyEvent
             try:
+                update = self.gamepad.updateStateBatch if self.coalesce else self.gamepad.updateState
                 while self.running:
-                    self.gamepad.updateState()
+                    update()
                 self.gamepad = None
             except:
                 self.running = False
                 self.gamepad = None
                 raise
+            finally:
+                # Wakes anyone waiting for ready, they check isConnected afterwards
+                readyEvent.set()
 
     def __init__(self, joystickNumber = 0):
         self.joystickNumber = str(joystickNumber)
@@ -80,12 +116,19 @@ class Gamepad:
         self.axisNames = {}
         self.axisIndex = {}
         self.lastTimestamp = 0
+        self.eventCount = 0
+        self.coalescedCount = 0
         self.updateThread = None
         self.connected = True
         self.pressedEventMap = {}
         self.releasedEventMap = {}
         self.changedEventMap = {}
         self.movedEventMap = {}
+        self.axisTransforms = {}
+        self.readyEvent = threading.Event()
+        self.asyncLoop = None
+        self.asyncQueues = []
+        self.asyncWaiters = {}
 
     def __del__(self):
         try:
@@ -115,6 +158,7 @@ class Gamepad:
                 self.connected = False
                 raise IOError('Gamepad %s disconnected' % self.joystickNumber)
             else:
+                self.eventCount += 1
                 return struct.unpack('IhBB', rawEvent)
         else:
             raise IOError('Gamepad has been disconnected')
@@ -206,7 +250,7 @@ class Gamepad:
                 entityName = self.axisNames[index]
             else:
                 entityName = index
-            finalValue = value / Gamepad.MAX_AXIS
+            finalValue = self._axisValue(index, value)
             self.axisMap[index] = finalValue
             for callback in self.movedEventMap[index]:
                 callback(finalValue)
@@ -233,7 +277,7 @@ class Gamepad:
                 entityName = self.axisNames[index]
             else:
                 entityName = index
-            finalValue = value / Gamepad.MAX_AXIS
+            finalValue = self._axisValue(index, value)
             self.axisMap[index] = finalValue
             self.movedEventMap[index] = []
             skip = skipInit
@@ -250,6 +294,45 @@ class Gamepad:
 
         This call waits for a new event if there are not any waiting to be processed."""
         self.lastTimestamp, value, eventType, index = self._getNextEventRaw()
+        self._handleEvent(value, eventType, index)
+
+    def updateStateBatch(self):
+        """Updates the internal button and axis states with every pending event at once.
+
+        Only the last value of each axis in the batch is kept, and its moved callbacks
+        run once, after the button events. Button events are all handled, in order,
+        so no press or release is lost. Waits for an event if none are pending.
+
+        Do not mix with updateState or getNextEvent on the same gamepad."""
+        if not self.connected:
+            raise IOError('Gamepad has been disconnected')
+        try:
+            # One read returns every event joydev has queued, up to the batch size
+            rawEvents = self.joystickFile.read1(Gamepad.BATCH_SIZE)
+        except IOError as e:
+            self.connected = False
+            raise IOError('Gamepad %s disconnected: %s' % (self.joystickNumber, str(e)))
+        if not rawEvents:
+            self.connected = False
+            raise IOError('Gamepad %s disconnected' % self.joystickNumber)
+        partial = len(rawEvents) % self.eventSize
+        if partial:
+            # joydev hands out whole events, but the buffer may split one after a plain read
+            rawEvents += self.joystickFile.read(self.eventSize - partial)
+        eventCount = len(rawEvents) // self.eventSize
+        self.eventCount += eventCount
+        axisValues = {}
+        for self.lastTimestamp, value, eventType, index in struct.iter_unpack('IhBB', rawEvents):
+            if eventType == Gamepad.EVENT_CODE_AXIS:
+                if index in axisValues:
+                    self.coalescedCount += 1
+                axisValues[index] = value
+            else:
+                self._handleEvent(value, eventType, index)
+        for index, value in axisValues.items():
+            self._handleEvent(value, Gamepad.EVENT_CODE_AXIS, index)
+
+    def _handleEvent(self, value, eventType, index):
         if eventType == Gamepad.EVENT_CODE_BUTTON:
             if value == 0:
                 finalValue = False
@@ -265,7 +348,7 @@ class Gamepad:
             for callback in self.changedEventMap[index]:
                 callback(finalValue)
         elif eventType == Gamepad.EVENT_CODE_AXIS:
-            finalValue = value / Gamepad.MAX_AXIS
+            finalValue = self._axisValue(index, value)
             self.axisMap[index] = finalValue
             for callback in self.movedEventMap[index]:
                 callback(finalValue)
@@ -280,24 +363,31 @@ class Gamepad:
             self.pressedEventMap[index] = []
             self.releasedEventMap[index] = []
             self.changedEventMap[index] = []
+            if self.isReady():
+                self.readyEvent.set()
         elif eventType == Gamepad.EVENT_CODE_INIT_AXIS:
-            finalValue = value / Gamepad.MAX_AXIS
+            finalValue = self._axisValue(index, value)
             self.axisMap[index] = finalValue
             self.movedEventMap[index] = []
+            if self.isReady():
+                self.readyEvent.set()
 
-    def startBackgroundUpdates(self, waitForReady = True):
+    def startBackgroundUpdates(self, waitForReady = True, coalesce = False):
         """Starts a background thread which keeps the gamepad state updated automatically.
         This allows for asynchronous gamepad updates and event callback code.
 
+        With coalesce the thread uses updateStateBatch, for callers that only need the
+        latest axis positions. coalescedCount tells how many axis events that skipped.
+
         Do not use with getNextEvent"""
         if self.updateThread is not None:
             if self.updateThread.running:
                 raise RuntimeError('Called startBackgroundUpdates when the update thread is already running')
-        self.updateThread = Gamepad.UpdateThread(self)
+        self.updateThread = Gamepad.UpdateThread(self, coalesce)
         self.updateThread.start()
         if waitForReady:
-            while not self.isReady() and self.connected:
-                time.sleep(1.0)
+            # Set by updateState once ready, or by the update thread when it stops
+            self.readyEvent.wait()
 
     def stopBackgroundUpdates(self):
         """Stops the background thread which keeps the gamepad state updated automatically.
@@ -307,6 +397,127 @@ class Gamepad:
         if self.updateThread is not None:
             self.updateThread.running = False
 
+    def startAsyncUpdates(self, loop = None):
+        """Keeps the gamepad state updated from an asyncio event loop instead of a thread.
+        The joystick file is watched with loop.add_reader and every pending event is handled
+        as soon as it arrives, so the state functions and event callbacks work as usual.
+
+        events() and waitPressed() call this for you. Must be called with the loop running
+        when loop is not given. Do not use with startBackgroundUpdates or getNextEvent."""
+        if loop is None:
+            import asyncio
+            loop = asyncio.get_running_loop()
+        if self.asyncLoop is loop:
+            return
+        if self.asyncLoop is not None:
+            raise RuntimeError('Gamepad is already updated by a different event loop')
+        if self.updateThread is not None and self.updateThread.running:
+            raise RuntimeError('Called startAsyncUpdates when the update thread is already running')
+        if not self.connected:
+            raise IOError('Gamepad has been disconnected')
+        loop.add_reader(self.joystickFile.fileno(), self._readAsync)
+        self.asyncLoop = loop
+
+    def stopAsyncUpdates(self):
+        """Stops watching the joystick from the event loop.
+        This may be called even if startAsyncUpdates was never called."""
+        if self.asyncLoop is not None:
+            try:
+                self.asyncLoop.remove_reader(self.joystickFile.fileno())
+            except (AttributeError, ValueError):
+                # The file is already closed or gone
+                pass
+            self.asyncLoop = None
+
+    def _readAsync(self):
+        """Reader callback for the event loop, the file is readable so this does not block."""
+        try:
+            rawEvents = self.joystickFile.read1(Gamepad.BATCH_SIZE)
+            if not rawEvents:
+                raise IOError('end of file')
+            partial = len(rawEvents) % self.eventSize
+            if partial:
+                rawEvents += self.joystickFile.read(self.eventSize - partial)
+        except (IOError, ValueError) as e:
+            self.connected = False
+            self.stopAsyncUpdates()
+            self.readyEvent.set()
+            error = IOError('Gamepad %s disconnected: %s' % (self.joystickNumber, str(e)))
+            for queue in self.asyncQueues:
+                queue.put_nowait(error)
+            for waiters in self.asyncWaiters.values():
+                for future in waiters:
+                    if not future.done():
+                        future.set_exception(error)
+            self.asyncWaiters = {}
+            return
+        for event in struct.iter_unpack('IhBB', rawEvents):
+            self.lastTimestamp, value, eventType, index = event
+            self.eventCount += 1
+            self._handleEvent(value, eventType, index)
+            if eventType == Gamepad.EVENT_CODE_BUTTON and value != 0 and index in self.asyncWaiters:
+                for future in self.asyncWaiters.pop(index):
+                    if not future.done():
+                        future.set_result(None)
+            if self.asyncQueues:
+                # Decoded from the state just updated, so axis transforms only run once per event
+                if eventType & ~Gamepad.EVENT_CODE_INIT == Gamepad.EVENT_CODE_BUTTON:
+                    decoded = (Gamepad.EVENT_BUTTON, self.buttonNames.get(index, index), self.pressedMap[index])
+                elif eventType & ~Gamepad.EVENT_CODE_INIT == Gamepad.EVENT_CODE_AXIS:
+                    decoded = (Gamepad.EVENT_AXIS, self.axisNames.get(index, index), self.axisMap[index])
+                else:
+                    continue
+                isInit = bool(eventType & Gamepad.EVENT_CODE_INIT)
+                for queue in self.asyncQueues:
+                    queue.put_nowait((isInit, decoded))
+
+    async def events(self, skipInit = True):
+        """Asynchronous iterator over the gamepad events, for use with asyncio:
+
+            async for eventType, control, value in gamepad.events():
+
+        Each event has the same format as getNextEvent returns. Several iterators may run
+        at once and each sees every event. State and callbacks are updated as well.
+
+        Raises an IOError if the gamepad is disconnected"""
+        import asyncio
+        self.startAsyncUpdates()
+        queue = asyncio.Queue()
+        self.asyncQueues.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if isinstance(event, Exception):
+                    raise event
+                isInit, decoded = event
+                if not (isInit and skipInit):
+                    yield decoded
+        finally:
+            self.asyncQueues.remove(queue)
+
+    async def waitPressed(self, buttonName):
+        """Waits until the button specified by name or index is next pressed, for use with asyncio.
+
+        Throws ValueError if the button name cannot be found.
+        Raises an IOError if the gamepad is disconnected first"""
+        if buttonName in self.buttonIndex:
+            buttonIndex = self.buttonIndex[buttonName]
+        else:
+            try:
+                buttonIndex = int(buttonName)
+            except ValueError:
+                raise ValueError('Button name %s was not found' % buttonName)
+        self.startAsyncUpdates()
+        future = self.asyncLoop.create_future()
+        self.asyncWaiters.setdefault(buttonIndex, []).append(future)
+        try:
+            await future
+        finally:
+            waiters = self.asyncWaiters.get(buttonIndex)
+            if waiters and future in waiters:
+                # Cancelled before the press
+                waiters.remove(future)
+
     def isReady(self):
         """Used with updateState to indicate that the gamepad is now ready for use.
 
@@ -526,6 +737,28 @@ class Gamepad:
         except ValueError:
             raise ValueError('Button name %s was not found' % axisName)
 
+    def _axisValue(self, index, value):
+        transform = self.axisTransforms.get(index)
+        if transform is None:
+            return value / Gamepad.MAX_AXIS
+        return transform(value)
+
+    def setAxisTransform(self, axisName, transform):
+        """Replaces the default value / MAX_AXIS scaling of an axis specified by name or index.
+        transform gets the raw value and returns the position, e.g. a calibration.
+        Passing None restores the default."""
+        if axisName in self.axisIndex:
+            axisIndex = self.axisIndex[axisName]
+        else:
+            try:
+                axisIndex = int(axisName)
+            except ValueError:
+                raise ValueError('Axis name %s was not found' % axisName)
+        if transform is None:
+            self.axisTransforms.pop(axisIndex, None)
+        else:
+            self.axisTransforms[axisIndex] = transform
+
     def removeAllEventHandlers(self):
         """Removes all event handlers from all axes and buttons."""
         for index in self.pressedEventMap.keys():
@@ -539,24 +772,85 @@ class Gamepad:
         self.connected = False
         self.removeAllEventHandlers()
         self.stopBackgroundUpdates()
+        self.stopAsyncUpdates()
         del self.joystickFile
 
 ###########################
 # Import gamepad mappings #
 ###########################
-scriptDir = os.path.dirname(os.path.realpath(__file__))
-controllerScript = os.path.join(scriptDir, "Controllers.py")
-exec(open(controllerScript).read())
-
-# Generate a list of available gamepad types
-moduleDict = globals()
-classList = [moduleDict[a] for a in moduleDict.keys() if inspect.isclass(moduleDict[a])]
-controllerDict = {}
-deviceNames = []
-for gamepad in classList:
-    controllerDict[gamepad.__name__.upper()] = gamepad
-    deviceNames.append(gamepad.__name__)
-deviceNames.sort()
+# The mappings in Controllers.py are only imported the first time one is used,
+# e.g. Gamepad.PS4 or Gamepad.controllerDict, so importing this module stays cheap.
+_controllerDict = None
+_nameIndex = None
+_containedNames = None
+_identified = {}
+
+def _loadControllers():
+    global _controllerDict, _nameIndex, _containedNames
+    if _controllerDict is None:
+        from Gamepad import Controllers
+        # The mappings subclass Gamepad.Gamepad.Gamepad, which is not this module's
+        # Gamepad when it is run as __main__
+        from Gamepad.Gamepad import Gamepad as base
+        classList = [base] + [value for value in vars(Controllers).values()
+                              if isinstance(value, type) and issubclass(value, base) and value is not base]
+        _nameIndex = {}
+        for gamepad in classList:
+            for joystickName in gamepad.joystickNames:
+                _nameIndex[joystickName.casefold()] = gamepad
+        _containedNames = list(_nameIndex)
+        for gamepad in classList:
+            for joystickName in gamepad.joystickExactNames:
+                _nameIndex[joystickName.casefold()] = gamepad
+        _controllerDict = {gamepad.__name__.upper(): gamepad for gamepad in classList}
+    return _controllerDict
+
+def getController(name):
+    """Returns the gamepad class for a mapping name such as 'PS4', case insensitive.
+    Throws KeyError if there is no such mapping."""
+    return _loadControllers()[name.upper()]
+
+def _matchMapping(name, axes, buttons):
+    controllers = _loadControllers()
+    name = name.casefold()
+    if name in _nameIndex:
+        return _nameIndex[name]
+    contained = [joystickName for joystickName in _containedNames if joystickName in name]
+    if contained:
+        return _nameIndex[max(contained, key=len)]
+    for gamepad in controllers.values():
+        if gamepad.joystickLayout == (axes, buttons):
+            return gamepad
+    return None
+
+def identify(joystickNumber = 0, default = None):
+    """Picks the mapping class for a connected joystick from its joydev name and layout.
+
+    Returns (mapping class, (name, axis count, button count)). When nothing matches
+    the default is used, or the generic Gamepad without one. Decisions are cached per
+    device name and layout, so identifying a controller seen before only costs the ioctls.
+    Throws IOError if the device cannot be opened or queried."""
+    info = deviceInfo(joystickNumber)
+    if info not in _identified:
+        _identified[info] = _matchMapping(*info)
+    mapping = _identified[info]
+    if mapping is None:
+        mapping = default or Gamepad
+    return mapping, info
+
+def __getattr__(name):
+    if name.startswith('__'):
+        # The import system probes for names like __path__, often while Controllers is
+        # still importing, and loading the mappings then would recurse
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    if name == 'controllerDict':
+        return _loadControllers()
+    if name == 'deviceNames':
+        return sorted(gamepad.__name__ for gamepad in _loadControllers().values())
+    for gamepad in _loadControllers().values():
+        if gamepad.__name__ == name:
+            return gamepad
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 ##################################################################
 # When this script is run it provides testing code for a gamepad #
@@ -581,7 +875,8 @@ if __name__ == "__main__":
     print('')
     print('Available device names:')
     formatString = '    ' + GREEN + '%s' + RESET + ' - ' + CYAN + '%s' + RESET
-    for device in deviceNames:
+    controllerDict = _loadControllers()
+    for device in sorted(gamepad.__name__ for gamepad in controllerDict.values()):
         print(formatString % (device, controllerDict[device.upper()].fullName))
     print('')
     print('What device name are you using (leave blank if not in the list)')
@@ -0,0 +1,121 @@
+"""Who is in charge of the couch when a passenger has a gamepad too.
+
+The driver's gamepad (js0) drives. A second gamepad (js1), when plugged in,
+belongs to the passenger and outranks the driver:
+
+- kill: its kill button latches neutral, motor current cut like the neutral
+  speed mode, until the passenger presses resume. With no passenger gamepad
+  connected, the driver clears a kill by selecting a stop mode.
+- takeover: while its takeover button is held, its stick drives instead of
+  the driver's. The driver's speed mode still applies.
+
+The kill button's callback runs on the gamepad reader thread as soon as the
+press is read, and wakes the control loop, so the neutral command goes out
+within one control tick of the press instead of after the loop's poll sleep.
+The press-to-command time is exported as couch_kill_reaction_seconds.
+"""
+import logging
+import threading
+import time
+from typing import Optional, Sequence, Tuple
+
+import Gamepad.Gamepad as Gamepad
+from logging_setup import fields
+
+# Higher wins
+AUTHORITY_DRIVER = 0
+AUTHORITY_PASSENGER = 1
+AUTHORITY_KILL = 2
+AUTHORITY_NAMES = ("driver", "passenger", "kill")
+
+DRIVER_JOYSTICK = 0
+PASSENGER_JOYSTICK = 1
+# The first of each the passenger's controller has, by mapping naming convention
+KILL_BUTTONS = ("TRIGGER", "CROSS", "A")
+RESUME_BUTTONS = ("MIDDLE", "TRIANGLE", "Y")
+TAKEOVER_BUTTONS = ("RED", "L1", "LB")
+
+logger = logging.getLogger(__name__)
+
+
+def first_available(names: Sequence[str], available) -> Optional[str]:
+    return next((name for name in names if name in available), None)
+
+
+class Arbiter:
+    """Decides each tick whether the driver, the passenger or a kill controls the couch."""
+
+    def __init__(self, wake: threading.Event):
+        # Set to cut the control loop's sleep short
+        self.wake = wake
+        self.passenger: Optional[Gamepad.Gamepad] = None
+        self.passenger_axes: Tuple[object, object] = (0, 1)
+        self.takeover_button: Optional[str] = None
+        self.killed = False
+        # time.monotonic() of a kill press the control loop has not acted on yet
+        self.kill_pending_since: Optional[float] = None
+
+    def attach_passenger(self, joystick: Gamepad.Gamepad, axes: Tuple[object, object]):
+        """Starts listening to the passenger's gamepad. Its initial state must have been read already."""
+        buttons = joystick.buttonIndex
+        kill = first_available(KILL_BUTTONS, buttons)
+        resume = first_available(RESUME_BUTTONS, buttons)
+        if kill is None:
+            # Without a kill button the second gamepad would only be able to take over
+            kill = 0
+        joystick.addButtonPressedHandler(kill, self.kill)
+        if resume is not None:
+            joystick.addButtonPressedHandler(resume, self.resume)
+        self.takeover_button = first_available(TAKEOVER_BUTTONS, buttons)
+        self.passenger_axes = axes
+        self.passenger = joystick
+        logger.info("Passenger gamepad connected",
+                    extra=fields(kill=kill, resume=resume, takeover=self.takeover_button))
+
+    def detach_passenger(self):
+        passenger = self.passenger
+        if passenger is None:
+            return
+        self.passenger = None
+        if self.takeover_button is not None and passenger.pressedMap.get(passenger.buttonIndex[self.takeover_button]):
+            # The passenger was driving, so don't hand a moving couch back to the driver unannounced
+            self.kill()
+        logger.warning("Passenger gamepad disconnected", extra=fields(killed=self.killed))
+
+    def kill(self):
+        if not self.killed:
+            # Before killed, so the control loop never sees a kill without its press time
+            self.kill_pending_since = time.monotonic()
+            self.killed = True
+            self.wake.set()
+            logger.warning("Kill switch pressed")
+
+    def resume(self):
+        if self.killed:
+            self.killed = False
+            logger.info("Kill switch released")
+
+    def authority(self, driver_stopped: bool) -> int:
+        """Who controls this tick. driver_stopped is whether the driver has a stop mode selected."""
+        if self.killed:
+            if self.passenger is None and driver_stopped:
+                self.resume()
+            else:
+                return AUTHORITY_KILL
+        passenger = self.passenger
+        if passenger is not None and self.takeover_button is not None:
+            if not passenger.isConnected():
+                # Read as gone here rather than waiting for whoever connected it to notice
+                self.detach_passenger()
+                return AUTHORITY_KILL if self.killed else AUTHORITY_DRIVER
+            if passenger.isPressed(self.takeover_button):
+                return AUTHORITY_PASSENGER
+        return AUTHORITY_DRIVER
+
+    def kill_acted_on(self) -> Optional[float]:
+        """Seconds from the pending kill press until now, once per press, or None."""
+        pressed = self.kill_pending_since
+        if pressed is None:
+            return None
+        self.kill_pending_since = None
+        return time.monotonic() - pressed
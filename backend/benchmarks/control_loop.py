@@ -0,0 +1,159 @@
+"""Per-call cost of every stage of the couch control loop, plus one full simulated tick.
+
+Everything runs without hardware: the gamepad reads synthetic joydev events
+and the motors talk to the fake VESC through the real serial scheduler.
+
+Run from backend/:
+    python -m benchmarks.control_loop
+    python -m benchmarks.control_loop --compare benchmarks/results/control_loop-<rev>.json
+"""
+import argparse
+import io
+import struct
+import sys
+from unittest import mock
+
+import Gamepad.Controllers as Controllers
+from Gamepad.Gamepad import Gamepad
+from battery import voltage_to_percentage
+from couch import TELEMETRY_FIELDS, Couch
+from detect_motor_controllers import LEFT_MOTOR_ID, RIGHT_MOTOR_ID
+from drive_modes import arcade_drive_ik
+from fake_vesc import FakeSerialPort, FakeVESC
+from mathutils import InputSmoother, map_range
+from motor_controller import CanVESC, MotorController, VESCMotorController
+from serial_scheduler import Priority, SerialScheduler
+from trim import WheelTrim
+from pyvesc import encode  # pyright: ignore[reportMissingImports]
+from pyvesc.VESC.messages import SetRPM  # pyright: ignore[reportMissingImports]
+
+from benchmarks.harness import compare, save_results, time_per_call
+
+EVENT_FORMAT = "IhBB"
+JOYSTICK_BUTTONS = 14
+JOYSTICK_AXES = 7
+
+
+def init_events() -> bytes:
+    """The burst of INIT events joydev sends when the device is opened."""
+    events = [struct.pack(EVENT_FORMAT, 0, 0, Gamepad.EVENT_CODE_INIT_BUTTON, i) for i in range(JOYSTICK_BUTTONS)]
+    events += [struct.pack(EVENT_FORMAT, 0, 0, Gamepad.EVENT_CODE_INIT_AXIS, i) for i in range(JOYSTICK_AXES)]
+    return b"".join(events)
+
+
+def axis_events(count: int) -> bytes:
+    return b"".join(
+        struct.pack(EVENT_FORMAT, i, (i * 97) % 65535 - 32767, Gamepad.EVENT_CODE_AXIS, i % 2) for i in range(count)
+    )
+
+
+def make_joystick(events: bytes = b"") -> Controllers.Joystick:
+    """Builds the couch's joystick mapping on top of an in-memory event stream."""
+    with mock.patch("builtins.open", return_value=io.BytesIO(init_events())):
+        joystick = Controllers.Joystick()
+    for _ in range(JOYSTICK_BUTTONS + JOYSTICK_AXES):
+        joystick.updateState()
+    joystick.joystickFile = io.BytesIO(events)
+    return joystick
+
+
+class _FakeVESCHandle:
+    def __init__(self, port: FakeSerialPort):
+        self.serial_port = port
+
+    def stop_heartbeat(self):
+        pass
+
+
+def make_motors():
+    fake = FakeVESC(controller_id=LEFT_MOTOR_ID, can_ids=(RIGHT_MOTOR_ID,))
+    # Back-to-back ticks would otherwise hit the telemetry bandwidth budget and measure throttling
+    scheduler = SerialScheduler(
+        _FakeVESCHandle(FakeSerialPort(fake)), budgets={Priority.TELEMETRY: None}  # type: ignore[arg-type]
+    )
+    scheduler.start()
+    left = VESCMotorController(scheduler, TELEMETRY_FIELDS)
+    right = CanVESC(scheduler, RIGHT_MOTOR_ID, TELEMETRY_FIELDS)
+    return scheduler, left, right
+
+
+def run_benchmarks(min_time: float):
+    results = {}
+
+    def bench(name, func):
+        results[name] = time_per_call(func, min_time=min_time)
+        print(f"  {name:<40} {results[name]['ns_per_call']:>10.0f} ns")
+
+    stream_length = 10_000
+    stream = axis_events(stream_length)
+    joystick = make_joystick(stream)
+    position = [0]
+
+    def update_state():
+        # Rewind once the synthetic stream runs out
+        position[0] += 1
+        if position[0] == stream_length:
+            position[0] = 0
+            joystick.joystickFile.seek(0)
+        joystick.updateState()
+
+    bench("gamepad.updateState", update_state)
+
+    batch_events = Gamepad.BATCH_SIZE // joystick.eventSize
+
+    def update_state_batch():
+        # A full batch of axis events per call, rewinding like above
+        if joystick.joystickFile.tell() + Gamepad.BATCH_SIZE > len(stream):
+            joystick.joystickFile.seek(0)
+        joystick.updateStateBatch()
+
+    bench(f"gamepad.updateStateBatch ({batch_events} events)", update_state_batch)
+    joystick.joystickFile.seek(0)
+    position[0] = 0
+    bench("gamepad.axis", lambda: joystick.axis("Y"))
+    bench("gamepad.isPressed", lambda: joystick.isPressed("T1"))
+
+    smoother = InputSmoother(smoothing_factor=0.3, max_accel_per_sec=4.0)
+    bench("InputSmoother.smooth_inputs", lambda: smoother.smooth_inputs(0.6, -0.2))
+    bench("arcade_drive_ik", lambda: arcade_drive_ik(0.6, -0.2, 0.3))
+    bench("map_range", lambda: map_range(0.6, -1, 1, -20000, 20000))
+    controller = MotorController()
+    bench("MotorController.speed_to_rpm", lambda: controller.speed_to_rpm(0.6))
+    trimmed = MotorController()
+    trimmed.trim = WheelTrim(gain=0.97, offset=-0.01)
+    bench("MotorController.speed_to_rpm (trimmed)", lambda: trimmed.speed_to_rpm(0.6))
+    trim = WheelTrim()
+    bench("WheelTrim.observe", lambda: trim.observe(12000, 11650))
+    bench("pyvesc.encode SetRPM over CAN", lambda: encode(SetRPM(12000, can_id=RIGHT_MOTOR_ID)))
+    bench("voltage_to_percentage", lambda: voltage_to_percentage(48.3))
+
+    scheduler, left, right = make_motors()
+    couch = Couch()
+    couch.use_controller(joystick)
+    couch.speed_mode = "standard"
+    couch.trim.attach(left, right)
+    bench("Couch.control_tick (fake VESC)", lambda: couch.control_tick(joystick, left, right))
+    scheduler.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Control-loop stage benchmarks")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to spend timing each stage")
+    parser.add_argument("--output", help="where to write the JSON results")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    print("Control loop stages:")
+    results = run_benchmarks(args.min_time)
+    # Compare before saving in case the baseline is this revision's own file
+    ok = compare(results, args.compare, args.threshold) if args.compare else True
+    path = save_results("control_loop", results, args.output)
+    print(f"\nWrote {path}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
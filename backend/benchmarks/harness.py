@@ -0,0 +1,84 @@
+"""Tiny timing harness shared by the benchmark scripts.
+
+Results are written as JSON keyed by benchmark name, so two runs (e.g. from
+different commits) can be compared with --compare.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def time_per_call(func: Callable[[], object], min_time: float = 0.2, repeats: int = 5) -> Dict[str, float]:
+    """Times func and returns the best per-call cost over several repeats, in nanoseconds."""
+    # Find an iteration count that takes about min_time
+    iterations = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9 / 10 or iterations >= 10_000_000:
+            break
+        iterations *= 10
+    iterations = max(1, int(iterations * (min_time * 1e9) / max(elapsed, 1)))
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            func()
+        best = min(best, (time.perf_counter_ns() - start) / iterations)
+    return {"ns_per_call": best, "iterations": iterations}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(suite: str, results: Dict[str, Dict[str, float]], path: Optional[str] = None) -> str:
+    revision = git_revision()
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{suite}-{revision}.json")
+    document = {
+        "suite": suite,
+        "revision": revision,
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+    return path
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline_path: str, threshold: float) -> bool:
+    """Prints the change against a baseline file. Returns False if anything regressed by more than threshold."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    ok = True
+    print(f"\nCompared to {baseline_path}:")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"  {name:<40} (new)")
+            continue
+        before = baseline[name]["ns_per_call"]
+        change = (result["ns_per_call"] - before) / before
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"  {name:<40} {change * 100:+7.1f}%{flag}")
+    return ok
@@ -0,0 +1,94 @@
+"""Cold import cost of the backend entry points, measured with `python -X importtime`.
+
+Each module is imported in a fresh interpreter several times and the fastest
+run counts, which filters out disk cache and scheduling noise. The slowest
+imports underneath are listed so a regression points at its cause. Every
+module has a budget, and the script exits non-zero when one is exceeded, so
+CI can run it as a check.
+
+Run from backend/:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --compare benchmarks/results/import_time-<rev>.json
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from benchmarks.harness import compare, save_results
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds on a desktop CPU, with headroom over the current cost for noisy CI machines
+# but under what these cost when tkinter, http.server, multiprocessing or the controller
+# mappings were imported eagerly. Pass --scale for slower hardware like the Pi.
+BUDGETS_MS = {
+    "main": 80.0,
+    "couch": 110.0,
+    "control_process": 60.0,
+}
+
+
+def import_profile(module: str) -> List[Tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every import `import module` triggers, in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    profile = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile.append((name.strip(), int(self_us), int(cumulative_us)))
+    return profile
+
+
+def measure(module: str, runs: int) -> Tuple[int, List[Tuple[str, int, int]]]:
+    """Best cumulative import time of module over several runs, and that run's profile."""
+    best_us, best_profile = None, []
+    for _ in range(runs):
+        profile = import_profile(module)
+        # The module itself is reported last, after everything it imported
+        total_us = next(cumulative for name, _, cumulative in reversed(profile) if name == module)
+        if best_us is None or total_us < best_us:
+            best_us, best_profile = total_us, profile
+    return best_us, best_profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget check for the backend entry points")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list per module")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply the budgets, e.g. 4 when running on the Pi")
+    parser.add_argument("--output", help="where to write the JSON results")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = {}
+    ok = True
+    print("Import time (best of %d):" % args.runs)
+    for module, budget_ms in BUDGETS_MS.items():
+        total_us, profile = measure(module, args.runs)
+        budget_ms *= args.scale
+        over = total_us / 1000 > budget_ms
+        ok = ok and not over
+        print(f"  {module:<20} {total_us / 1000:8.1f} ms  (budget {budget_ms:.0f} ms){'  OVER BUDGET' if over else ''}")
+        for name, self_us, _ in sorted(profile, key=lambda entry: entry[1], reverse=True)[:args.top]:
+            print(f"      {name:<30} {self_us / 1000:6.1f} ms self")
+        results[f"import {module}"] = {"ns_per_call": total_us * 1000, "iterations": args.runs}
+
+    # Compare before saving in case the baseline is this revision's own file
+    if args.compare:
+        ok = compare(results, args.compare, args.threshold) and ok
+    path = save_results("import_time", results, args.output)
+    print(f"\nWrote {path}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
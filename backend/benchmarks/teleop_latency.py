@@ -0,0 +1,78 @@
+"""Input-to-command latency of UDP teleop, against a local stand-in sender.
+
+A sender thread streams teleop packets to a TeleopReceiver on localhost while
+the real control tick drives the fake VESC at the couch's tick rate. For every
+packet the control loop acted on, this measures the time from the sender
+stamping it to the tick that commanded the motors with it having finished, and
+the part of that spent before the receiver had it. Packets superseded before a
+tick read them are counted separately.
+
+Run from backend/: python -m benchmarks.teleop_latency
+"""
+import argparse
+import math
+import threading
+import time
+
+from couch import POLL_INTERVAL, Couch
+from teleop import BUTTON_NAMES, TeleopReceiver, TeleopSender
+
+from benchmarks.control_loop import make_motors
+from benchmarks.tick_jitter import summarize
+
+
+def send_stream(sender: TeleopSender, rate: float, stop_event: threading.Event):
+    buttons = 1 << BUTTON_NAMES.index("CHILL")
+    i = 0
+    while not stop_event.is_set():
+        sender.send(0.3 * math.sin(i / 20), -0.3 * math.cos(i / 20), buttons)
+        i += 1
+        stop_event.wait(1.0 / rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rate", type=float, default=50.0, help="packets per second")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="control loop tick interval")
+    args = parser.parse_args()
+
+    receiver = TeleopReceiver("127.0.0.1", 0)
+    receiver.start()
+    sender = TeleopSender("127.0.0.1", receiver.port)
+    stop_event = threading.Event()
+    sending = threading.Thread(target=send_stream, args=(sender, args.rate, stop_event), daemon=True)
+    sending.start()
+
+    scheduler, left, right = make_motors()
+    couch = Couch()
+    couch.use_controller(receiver)
+    total, network = [], []
+    last_sequence = None
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        state = receiver.state
+        couch.control_tick(receiver, left, right)
+        done_ns = time.monotonic_ns()
+        received_at, sequence, _, _, _, sent_ns = state
+        if received_at > 0 and sequence != last_sequence:
+            total.append((done_ns - sent_ns) / 1e9)
+            network.append(received_at - sent_ns / 1e9)
+            last_sequence = sequence
+        time.sleep(args.interval)
+
+    stop_event.set()
+    sending.join()
+    sender.close()
+    receiver.stop()
+    scheduler.stop()
+
+    print(f"Teleop at {args.rate:.0f} packets/s, ticks every {args.interval * 1000:.0f} ms:")
+    print(f"  send to receive:  {summarize(network)}")
+    print(f"  send to command:  {summarize(total)}")
+    print(f"  packets acted on: {len(total)} of {receiver.packets}, "
+          f"out of order {receiver.out_of_order}, malformed {receiver.malformed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Compares control-loop tick jitter in single-process and multi-process modes.
+
+A synthetic control loop (the real smoothing and IK code, no hardware) runs
+at the couch's tick rate while a CPU-bound thread stands in for Tk redraws.
+In single-process mode they share one interpreter and its GIL. In
+multi-process mode the loop runs on a pinned thread of its own process, as
+main.py --multiprocess does.
+
+Run from backend/: python -m benchmarks.tick_jitter
+"""
+import argparse
+import math
+import multiprocessing
+import threading
+import time
+from typing import List, Optional
+
+from control_process import isolate_thread
+from couch import POLL_INTERVAL
+from drive_modes import arcade_drive_ik
+from mathutils import InputSmoother
+
+
+def run_control_loop(ticks: int, interval: float) -> List[float]:
+    """Runs the synthetic loop and returns how late each tick started, in seconds."""
+    smoother = InputSmoother(smoothing_factor=0.3, max_accel_per_sec=4.0)
+    lateness = []
+    next_tick = time.perf_counter()
+    for i in range(ticks):
+        now = time.perf_counter()
+        lateness.append(now - next_tick)
+        speed, rotation = smoother.smooth_inputs(math.sin(i / 10), math.cos(i / 10))
+        arcade_drive_ik(speed, rotation, 0.3)
+        next_tick += interval
+        time.sleep(max(0.0, next_tick - time.perf_counter()))
+    return lateness
+
+
+def ui_load(stop_event, burst_iterations: int = 200_000, frame_interval: float = 0.016):
+    """Holds the GIL in bursts, roughly like a Tk redraw of the dashboard dials."""
+    while not stop_event.is_set():
+        total = 0.0
+        for i in range(burst_iterations):
+            total += math.sin(i)
+        time.sleep(frame_interval)
+
+
+def _child(ticks: int, interval: float, cpu: Optional[int], results):
+    isolate_thread(cpu=cpu)
+    results.put(run_control_loop(ticks, interval))
+
+
+def measure(mode: str, ticks: int, interval: float, cpu: Optional[int]) -> List[float]:
+    stop_event = threading.Event()
+    load = threading.Thread(target=ui_load, args=(stop_event,), daemon=True)
+    load.start()
+    try:
+        if mode == "single":
+            return run_control_loop(ticks, interval)
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        process = context.Process(target=_child, args=(ticks, interval, cpu, results))
+        process.start()
+        lateness = results.get()
+        process.join()
+        return lateness
+    finally:
+        stop_event.set()
+        load.join()
+
+
+def summarize(lateness: List[float]) -> str:
+    ordered = sorted(lateness)
+    p50 = ordered[len(ordered) // 2]
+    p99 = ordered[int(len(ordered) * 0.99)]
+    return f"p50 {p50 * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms  max {ordered[-1] * 1000:6.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=400)
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--cpu", type=int, default=None, help="core for the control process")
+    args = parser.parse_args()
+
+    for mode in ("single", "multi"):
+        lateness = measure(mode, args.ticks, args.interval, args.cpu)
+        print(f"{mode:>6}-process tick lateness: {summarize(lateness)}")
+
+
+if __name__ == "__main__":
+    main()
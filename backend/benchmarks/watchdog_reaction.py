@@ -0,0 +1,98 @@
+"""How long the watchdog takes to stop the motors after the control loop stops ticking.
+
+A pty stands in for the VESC port. Each trial kicks the watchdog like a
+running control loop, then stops and waits for stop frames addressed to
+both motors to come out of the fake VESC. The reaction is measured from the
+last kick, so it includes the watchdog timeout. The script exits non-zero
+if any trip takes longer than the timeout plus the budget, or if a trip
+misses a motor, so CI can run it as a check.
+
+Run from backend/:
+    python -m benchmarks.watchdog_reaction
+"""
+import argparse
+import os
+import pty
+import select
+import sys
+import time
+import tty
+from typing import List
+
+from detect_motor_controllers import LEFT_MOTOR_ID, RIGHT_MOTOR_ID
+from fake_vesc import FakeVESC
+from motor_watchdog import WATCHDOG_TIMEOUT, Watchdog
+
+from benchmarks.harness import save_results
+
+# Milliseconds past the timeout: a few poll intervals plus scheduling noise on a loaded machine
+BUDGET_MS = 50.0
+# Give up on a trial that never trips
+TRIAL_TIMEOUT = 2.0
+
+
+def measure(trials: int) -> List[float]:
+    """Seconds from the last kick to the stop frames reaching both motors, per trial."""
+    master, slave = pty.openpty()
+    # The control side opens the port with pyserial, which leaves it raw
+    tty.setraw(master)
+    fake = FakeVESC(controller_id=LEFT_MOTOR_ID, can_ids=(RIGHT_MOTOR_ID,))
+    watchdog = Watchdog(os.ttyname(slave), can_ids=(RIGHT_MOTOR_ID,))
+    watchdog.start()
+    reactions = []
+    try:
+        time.sleep(1)  # Let the spawned process start up
+        for _ in range(trials):
+            for _ in range(20):
+                watchdog.kick()
+                time.sleep(0.01)
+            # Drop anything left over from the previous trip
+            while select.select([master], [], [], 0)[0]:
+                os.read(master, 1024)
+            for motor in fake.motors.values():
+                motor.commands.clear()
+            last_tick = time.monotonic()
+            deadline = last_tick + TRIAL_TIMEOUT
+            # Simulate the control loop hanging and wait for the stop frames
+            while not all(motor.commands for motor in fake.motors.values()):
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Watchdog did not stop both motors")
+                if select.select([master], [], [], 0.1)[0]:
+                    fake.receive(os.read(master, 1024))
+            reactions.append(time.monotonic() - last_tick)
+    finally:
+        watchdog.stop()
+        os.close(master)
+        os.close(slave)
+    return reactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watchdog reaction time check against a fake VESC on a pty")
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the budget, e.g. 4 when running on the Pi")
+    parser.add_argument("--output", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    budget = WATCHDOG_TIMEOUT + BUDGET_MS * args.scale / 1000
+    try:
+        reactions = sorted(measure(args.trials))
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    median, worst = reactions[len(reactions) // 2], reactions[-1]
+    over = worst > budget
+    print(f"Watchdog timeout {WATCHDOG_TIMEOUT * 1000:.0f} ms, over {len(reactions)} trips:")
+    print(f"  reaction median {median * 1000:.1f} ms, max {worst * 1000:.1f} ms"
+          f"  (budget {budget * 1000:.0f} ms){'  OVER BUDGET' if over else ''}")
+    path = save_results("watchdog_reaction", {
+        "reaction median": {"ns_per_call": median * 1e9, "iterations": len(reactions)},
+        "reaction max": {"ns_per_call": worst * 1e9, "iterations": len(reactions)},
+    }, args.output)
+    print(f"\nWrote {path}")
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
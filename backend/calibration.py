@@ -0,0 +1,221 @@
+"""Per-axis stick calibration, learned while driving and kept between runs.
+
+A worn stick rests a little off center and may not reach the ends of its
+travel. Each axis keeps a running center and min/max, and maps raw joydev
+values with two precomputed affine segments, one on each side of the
+center. The result is exactly 0 at rest and +/-1 at the ends, so the
+deadband only has to cover jitter, not the offset.
+
+The center is only learned while the couch is parked, from runs of samples
+that stay within REST_WINDOW of the current estimate and barely move. The
+window is narrower than the deadband and a hand on the stick wobbles more
+than a stick at rest, so holding the stick slightly forward, parked or not,
+can never be learned as the new center and make the couch creep. min/max
+only ever widen online. `python calibration.py sweep` measures the center
+and full range from scratch.
+
+Learning costs O(1) per axis event. Saving happens off the control loop.
+"""
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, Optional, Union
+
+from logging_setup import fields
+
+CALIBRATION_PATH = os.path.join(os.path.expanduser("~"), ".config", "couch", "stick_calibration.json")
+MAX_RAW = 32767
+# Samples this close to the center estimate can be the stick at rest, about 2.4% of travel.
+# Keep it inside the deadband (tuning.ControlParams.deadband), or a learned center could leave rest past it.
+REST_WINDOW = 800
+# The center moves once per run of this many rest samples, towards their mean,
+# and only if their standard deviation is below REST_SPREAD
+REST_SAMPLES = 32
+REST_SPREAD = 150.0
+# Slowest center update once enough rest runs have been seen
+CENTER_ALPHA = 0.05
+# A saved center counts as this many samples, so it only drifts slowly from there
+SAVED_CENTER_WEIGHT = int(1 / CENTER_ALPHA)
+SAVE_INTERVAL = 30.0
+
+logger = logging.getLogger(__name__)
+
+AxisName = Union[str, int]
+
+
+class AxisCalibration:
+    """Maps one axis's raw values to [-1, 1], learning as it goes. Call it with each raw value."""
+
+    def __init__(self, stick: "StickCalibration", center: float = 0.0,
+                 minimum: float = -MAX_RAW, maximum: float = MAX_RAW, samples: int = 0):
+        self.stick = stick
+        self.center = center
+        self.minimum = minimum
+        self.maximum = maximum
+        # Runs of rest samples seen, which weigh the center estimate
+        self.samples = samples
+        self._rest_count = 0
+        self._rest_sum = 0.0
+        self._rest_sum_sq = 0.0
+        self._update_map()
+
+    def _update_map(self):
+        self._negative_scale = 1.0 / max(self.center - self.minimum, 1.0)
+        self._positive_scale = 1.0 / max(self.maximum - self.center, 1.0)
+
+    def __call__(self, raw: int) -> float:
+        if raw < self.minimum:
+            self.minimum = raw
+            self._update_map()
+            self.stick.changed = True
+        elif raw > self.maximum:
+            self.maximum = raw
+            self._update_map()
+            self.stick.changed = True
+        offset = raw - self.center
+        window = self.stick.rest_window
+        if self.stick.learning_center and -window < offset < window:
+            self._rest_count += 1
+            self._rest_sum += offset
+            self._rest_sum_sq += offset * offset
+            if self._rest_count >= self.stick.rest_samples:
+                self._learn_center()
+                offset = raw - self.center
+        elif self._rest_count:
+            self._rest_count = 0
+            self._rest_sum = self._rest_sum_sq = 0.0
+        value = offset * (self._positive_scale if offset > 0 else self._negative_scale)
+        if value > 1.0:
+            return 1.0
+        if value < -1.0:
+            return -1.0
+        return value
+
+    def _learn_center(self):
+        count = self._rest_count
+        mean = self._rest_sum / count
+        variance = self._rest_sum_sq / count - mean * mean
+        self._rest_count = 0
+        self._rest_sum = self._rest_sum_sq = 0.0
+        if variance > REST_SPREAD * REST_SPREAD:
+            return
+        # A plain mean over the first runs, then an exponential average
+        self.samples += 1
+        self.center += mean * max(1.0 / self.samples, CENTER_ALPHA)
+        self._update_map()
+        self.stick.changed = True
+
+    def to_json(self) -> dict:
+        return {"center": round(self.center, 1), "minimum": self.minimum, "maximum": self.maximum}
+
+
+class StickCalibration:
+    """The calibrated axes of one gamepad, stored under its joydev name."""
+
+    def __init__(self, device: str, path: str = CALIBRATION_PATH):
+        self.device = device
+        self.path = path
+        self.axes: Dict[AxisName, AxisCalibration] = {}
+        # Set by the couch while parked, read by every axis
+        self.learning_center = False
+        self.rest_window = REST_WINDOW
+        self.rest_samples = REST_SAMPLES
+        self.changed = False
+        self._last_save = time.monotonic()
+
+    @classmethod
+    def load(cls, device: str, axis_names: Iterable[AxisName], path: str = CALIBRATION_PATH) -> "StickCalibration":
+        calibration = cls(device, path)
+        saved = _read(path).get(device, {})
+        for name in axis_names:
+            entry = saved.get(str(name))
+            if entry:
+                calibration.axes[name] = AxisCalibration(
+                    calibration, float(entry["center"]), float(entry["minimum"]), float(entry["maximum"]),
+                    samples=SAVED_CENTER_WEIGHT,
+                )
+            else:
+                calibration.axes[name] = AxisCalibration(calibration)
+        return calibration
+
+    def attach(self, joystick):
+        """Makes the gamepad report these axes through the calibration."""
+        for name, axis in self.axes.items():
+            joystick.setAxisTransform(name, axis)
+
+    def save(self):
+        document = _read(self.path)
+        document[self.device] = {str(name): axis.to_json() for name, axis in self.axes.items()}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(document, f, indent=2)
+        os.replace(temporary, self.path)
+        self.changed = False
+        self._last_save = time.monotonic()
+
+    def save_if_changed(self, min_interval: float = SAVE_INTERVAL):
+        if not self.changed or time.monotonic() - self._last_save < min_interval:
+            return
+        try:
+            self.save()
+        except OSError as e:
+            logger.warning("Could not save stick calibration", extra=fields(path=self.path, error=e))
+
+
+def _read(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable stick calibration", extra=fields(path=path, error=e))
+        return {}
+
+
+def sweep(seconds: float, path: str = CALIBRATION_PATH, joystick_number: int = 0) -> Optional[StickCalibration]:
+    """Measures center and full range from scratch: leave the stick alone, then circle it at full travel."""
+    import Gamepad.Gamepad as Gamepad
+
+    from couch import DRIVE_AXES
+
+    mapping, (name, _, _) = Gamepad.identify(joystick_number)
+    joystick = mapping(joystick_number)
+    axes = next(((x, y) for x, y in DRIVE_AXES if x in joystick.axisIndex and y in joystick.axisIndex), (0, 1))
+    calibration = StickCalibration(name, path)
+    calibration.axes = {axis: AxisCalibration(calibration, minimum=0.0, maximum=0.0) for axis in axes}
+    # Collapsed to the center, so min/max widen to whatever the stick actually reaches
+    calibration.learning_center = True
+    # The stick is known to be left alone here, so it may rest anywhere and every sample counts
+    calibration.rest_window = MAX_RAW
+    calibration.rest_samples = 1
+    calibration.attach(joystick)
+    joystick.startBackgroundUpdates()
+    time.sleep(1.0)
+    calibration.learning_center = False
+    print(f"Center learned for {name}. Circle the stick at full travel for {seconds:.0f} s...")
+    time.sleep(seconds)
+    joystick.disconnect()
+    for axis_name, axis in calibration.axes.items():
+        print(f"  {axis_name}: center {axis.center:+.0f}, range {axis.minimum:+.0f} .. {axis.maximum:+.0f}")
+    calibration.save()
+    return calibration
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stick calibration")
+    parser.add_argument("--path", default=CALIBRATION_PATH)
+    subparsers = parser.add_subparsers(dest="cmd", required=True)
+    subparsers.add_parser("show", help="print the saved calibration")
+    sweep_parser = subparsers.add_parser("sweep", help="recalibrate center and range of the connected gamepad")
+    sweep_parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.cmd == "show":
+        print(json.dumps(_read(args.path), indent=2))
+    else:
+        sweep(args.seconds, args.path)
@@ -0,0 +1,101 @@
+"""Runs the couch control loop in its own process, away from the Tk UI and anything else holding the GIL.
+
+The control process publishes dashboard telemetry through a shared-memory
+ring, which the UI process polls. Only the control thread and the serial
+worker it waits on are pinned and made real-time. The metrics, tuning and
+teleop servers, the gamepad reader and the loggers in the same process keep
+the default policy, so they can't delay a tick.
+"""
+import logging
+import os
+from typing import TYPE_CHECKING, Optional
+
+from logging_setup import fields, setup_logging
+
+if TYPE_CHECKING:
+    from telemetry_ring import TelemetryReader
+
+# The Pi 4 has four cores, leave core 0 to the kernel, UI and everything else
+CONTROL_CPU = 3
+# Below the motor watchdog so it can still preempt a runaway control loop
+CONTROL_PRIORITY = 40
+
+logger = logging.getLogger(__name__)
+
+
+def isolate_thread(thread_id: int = 0, cpu: Optional[int] = CONTROL_CPU, priority: int = CONTROL_PRIORITY):
+    """Pins one thread to a core and gives it real-time priority, where the OS allows it.
+
+    thread_id is a native thread id, 0 for the calling thread. On Linux both
+    settings are per thread, and only threads it starts afterwards inherit them.
+    """
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        if cpu in os.sched_getaffinity(0):
+            os.sched_setaffinity(thread_id, {cpu})
+        else:
+            logger.warning("CPU not available, control thread not pinned", extra=fields(cpu=cpu))
+    try:
+        os.sched_setscheduler(thread_id, os.SCHED_FIFO, os.sched_param(priority))
+    except (AttributeError, OSError) as e:
+        logger.warning("Running control thread without real-time priority", extra=fields(error=e, thread=thread_id))
+
+
+def _run_control(ring_name: str, stop_event, cpu: Optional[int], record_dir: Optional[str],
+                 startup_origin: Optional[float], teleop_port: Optional[int]):
+    # Imported here so the UI process never pays for the control-side imports
+    from couch import Couch
+    from mode_registry import load_modes
+    from startup import StartupTimeline
+    from telemetry_recorder import TelemetryRecorder
+    from telemetry_ring import TelemetryRing, TelemetryWriter
+
+    setup_logging()
+    timeline = StartupTimeline(startup_origin)
+    timeline.mark("control_process_started")
+    ring = TelemetryRing(ring_name)
+    modes = load_modes()
+    recorder = TelemetryRecorder.in_directory(record_dir, modes.names) if record_dir else None
+    couch = Couch(TelemetryWriter(ring), recorder, modes, timeline, teleop_port,
+                  isolate=lambda thread_id: isolate_thread(thread_id, cpu))
+    couch.start()
+    try:
+        stop_event.wait()
+    except KeyboardInterrupt:
+        pass
+    couch.stop()
+    ring.close()
+
+
+class ControlProcess:
+    """Owns the telemetry ring and the process running Couch."""
+
+    def __init__(self, cpu: Optional[int] = CONTROL_CPU, record_dir: Optional[str] = None,
+                 startup_origin: Optional[float] = None, teleop_port: Optional[int] = None):
+        """startup_origin is the parent's StartupTimeline origin, so both processes report one timeline."""
+        # Deferred so single-process runs of main.py never import multiprocessing or shared memory
+        import multiprocessing
+
+        from telemetry_ring import TelemetryRing
+
+        self.cpu = cpu
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = self._context.Event()
+        self.ring = TelemetryRing(create=True)
+        # Not a daemon: the control process starts the motor watchdog process itself
+        self._process = self._context.Process(
+            target=_run_control, args=(self.ring.name, self._stop_event, cpu, record_dir, startup_origin, teleop_port),
+            name="couch-control",
+        )
+
+    def start(self):
+        self._process.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._process.join()
+        self.ring.close()
+
+    def reader(self) -> "TelemetryReader":
+        from telemetry_ring import TelemetryReader
+
+        return TelemetryReader(self.ring)
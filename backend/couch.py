@@ -1,175 +1,646 @@
 import time
 import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable
 
 import Gamepad.Gamepad as Gamepad
-import Gamepad.Controllers as Controllers
-from detect_motor_controllers import get_motor_controllers
+from arbitration import (AUTHORITY_KILL, AUTHORITY_PASSENGER, DRIVER_JOYSTICK, PASSENGER_JOYSTICK, Arbiter,
+                         first_available)
+from detect_motor_controllers import get_motor_controllers, RIGHT_MOTOR_ID
+from motor_controller import MotorController
+from motor_watchdog import Watchdog
 
 from battery import voltage_to_percentage
-from drive_modes import SpeedMode, arcade_drive_ik, get_speed_multiplier
+from calibration import StickCalibration
+from drive_modes import SpeedMode, arcade_drive_ik
+from gamepad_reader import GamepadReader
+from input_source import InputSource
 from mathutils import InputSmoother
+from motion_profile import MotionProfiler
+from odometry import Odometry, erpm_to_mph
+from logging_setup import fields, rate_limited, setup_logging
+from metrics import METRICS_LOG_INTERVAL, CouchMetrics, Counter, MetricsServer
+from mode_registry import BEHAVIOR_COAST, BEHAVIOR_STOP, ModeRegistry, load_modes
+from serial_scheduler import Priority
+from startup import STOP_CHECK_INTERVAL, DirectoryWatcher, StartupTimeline
+from teleop import TeleopReceiver
+from power import PowerMeter
+from thermal import ThermalLimiter
+from trim import DriveTrim
+from tuning import ParamStore, Revision, TuningServer
 
-from screen_ui import ScreenUI, ScreenUIUpdate
+from ui_types import ScreenUIUpdate, UIManager
+
+if TYPE_CHECKING:
+    from telemetry_recorder import TelemetryRecorder
 
 VERTICAL_JOYSTICK_AXIS = 1
 HORIZONTAL_JOYSTICK_AXIS = 0
+# (horizontal, vertical) stick axes by mapping naming convention. The first pair the connected
+# controller has is used, falling back to the raw axis indices above.
+DRIVE_AXES = (("X", "Y"), ("LEFT-X", "LEFT-Y"), ("LAS -X", "LAS -Y"), ("AS -X", "AS -Y"))
+# The gamepad's trigger, or the teleop horn button
+HORN_BUTTONS = ("TRIGGER", "HORN")
+# Between attempts to open a gamepad whose device node is still settling
+GAMEPAD_RETRY_INTERVAL = 0.5
 POLL_INTERVAL = 0.05  # 20Hz polling for more responsive input reading
+GAMEPAD_DIRECTORY = "/dev/input"
+# Mapping for gamepads identify() doesn't recognise: the AV8R the couch was built around.
+# Looked up by name when first needed, so importing couch doesn't load every mapping.
+DEFAULT_MAPPING = "Joystick"
+
+# The only GetValues fields the control loop reads. Requesting just these keeps
+# each telemetry reply to a fraction of the full message.
+TELEMETRY_FIELDS = ("rpm", "avg_motor_current", "avg_input_current", "v_in", "temp_fet", "temp_motor", "tachometer")
 
-IPM_IN_MPH = 1056
-POLE_PAIRS = 6
-MOTOR_PULLEY = 16
-WHEEL_PULLEY = 72
+logger = logging.getLogger(__name__)
 
 class Couch:
-    def __init__(self, ui_manager: "ScreenUI | None" = None):
+    def __init__(self, ui_manager: "UIManager | None" = None, recorder: "TelemetryRecorder | None" = None,
+                 modes: "ModeRegistry | None" = None, timeline: "StartupTimeline | None" = None,
+                 teleop_port: "int | None" = None, isolate: "Callable[[int], None] | None" = None):
+        """isolate, if given, is called with the native ids of the control thread and its serial worker to make them real-time."""
         self.ui_manager = ui_manager
+        self.recorder = recorder
+        self.modes = modes or load_modes()
+        # The control loop tracks the mode by its index into the registry's arrays
+        self.mode_index = self.modes.initial_index
         self.speed = 0
-        self.left_power = 0
-        self.right_power = 0
         self.left_rpm = 0
         self.right_rpm = 0
         self.voltage = 0
         self.temperature = 0
-        self.speed_mode: SpeedMode = "park"
-        
+
+        # Smoothing, turning sensitivity, deadband and top RPM, retunable over the tuning socket
+        self.tuning = ParamStore()
+        self.tuning_server = None
+        params = self.tuning.current.params
         # Input smoothing to prevent oscillation from physical feedback
         # Lower smoothing_factor = more responsive (0.3 is a good balance)
         # Lower max_accel_per_sec = smoother acceleration changes
         self.input_smoother = InputSmoother(
-            smoothing_factor=0.3,  # Light smoothing to maintain responsiveness
-            max_accel_per_sec=4.0   # Allow reasonably quick acceleration changes
+            smoothing_factor=params.smoothing_factor,
+            max_accel_per_sec=params.max_accel_per_sec,
         )
-        
         # Rotation sensitivity - makes turning less aggressive than forward/backward
-        self.rotation_sensitivity = 0.3  # 70% less sensitive turning
+        self.rotation_sensitivity = params.rotation_sensitivity
+        self.deadband = params.deadband
+        # The revision the control loop is running with. Motor max_rpm is applied on the first tick.
+        self.applied_revision: "Revision | None" = None
+
+        # Per-mode acceleration, deceleration and jerk limits on each wheel
+        self.motion_profiler = MotionProfiler()
+
+        # Scales the wheel outputs down as the controllers or motors get hot
+        self.thermal = ThermalLimiter()
+        self.power = PowerMeter()
+        # Pose and trip distance from the wheel tachometers
+        self.odometry = Odometry.calibrated()
+        # Per-wheel RPM correction, learned while driving straight
+        self.trim = DriveTrim.load()
+
+        # Controls of the connected gamepad, set by use_controller() before the first tick
+        self.horizontal_axis, self.vertical_axis = DRIVE_AXES[0]
+        self.horn_button: "str | None" = HORN_BUTTONS[0]
+        self.controller_buttons: "frozenset[str] | None" = None
+        self.mode_bindings = self.modes.bindings
+        # Learned center and range of the drive axes, per gamepad
+        self.calibration: "StickCalibration | None" = None
+        # Reads the driver's and the passenger's gamepads on one thread
+        self.reader = GamepadReader()
+        # Set to run the next control tick right away instead of after POLL_INTERVAL
+        self.wake = threading.Event()
+        # Passenger kill switch and takeover
+        self.arbiter = Arbiter(self.wake)
+        # Driving over UDP, used when no gamepad is plugged in
+        self.teleop_port = teleop_port
+        self.teleop: "TeleopReceiver | None" = None
+        self.isolate = isolate
+
+        self.metrics = CouchMetrics()
+        self.timeline = timeline or StartupTimeline()
+        self.metrics.registry.register(self.timeline)
+        self.metrics_server = None
+        self.last_tick_seconds = 0.0
+        self.metrics.registry.add_collector(self.collect_gamepad_metrics)
+
+    @property
+    def speed_mode(self) -> SpeedMode:
+        return self.modes.names[self.mode_index]
+
+    @speed_mode.setter
+    def speed_mode(self, name: SpeedMode):
+        self.mode_index = self.modes.index(name)
 
     def start(self):
-        print("Starting couch")
+        logger.info("Starting couch")
         self.stop_event = threading.Event()
+        self.reader.start()
+        if self.teleop_port is not None:
+            try:
+                self.teleop = TeleopReceiver(port=self.teleop_port)
+                self.teleop.start()
+                self.register_teleop_metrics(self.teleop)
+            except OSError as e:
+                logger.warning("Could not start teleop receiver", extra=fields(error=e, port=self.teleop_port))
 
         # Use a separate thread for joystick and motor control
         self.control_thread = threading.Thread(target=self.joystick_motor_control, daemon=True)
         self.ui_thread = threading.Thread(target=self.update_ui_periodically, daemon=True)
+        self.metrics_thread = threading.Thread(target=self.log_metrics_periodically, daemon=True)
+        self.passenger_thread = threading.Thread(target=self.connect_passenger_gamepads, daemon=True)
         self.control_thread.start()
         self.ui_thread.start()
-        print("Started couch")
+        self.metrics_thread.start()
+        self.passenger_thread.start()
+
+        try:
+            self.metrics_server = MetricsServer(self.metrics.registry)
+            self.metrics_server.start()
+        except OSError as e:
+            logger.warning("Could not start metrics endpoint", extra=fields(error=e))
+        try:
+            self.tuning_server = TuningServer(self.tuning)
+            self.tuning_server.start()
+        except OSError as e:
+            logger.warning("Could not start tuning socket", extra=fields(error=e))
+        logger.info("Started couch")
 
     def stop(self):
-        print("Stopping couch")
+        logger.info("Stopping couch")
         self.stop_event.set()
+        self.wake.set()
         self.control_thread.join()
-        print("Stopped control thread")
+        logger.info("Stopped control thread")
         self.ui_thread.join()
-        print("Stopped UI thread")
-        print("Stopped couch")
+        logger.info("Stopped UI thread")
+        self.metrics_thread.join()
+        self.passenger_thread.join()
+        self.reader.stop()
+        if self.teleop:
+            self.teleop.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.tuning_server:
+            self.tuning_server.stop()
+        if self.recorder:
+            self.recorder.close()
+            logger.info("Saved ride telemetry", extra=fields(path=self.recorder.path))
+        logger.info("Stopped couch")
 
     def update_ui_periodically(self):
         stop_event = self.stop_event
         while not stop_event.is_set():
             battery_percentage = voltage_to_percentage(self.voltage)
-            wattage = self.left_power + self.right_power
+            power = self.power
+            odometry = self.odometry
             try:
                 if self.ui_manager:
+                    frame_start = time.perf_counter()
                     self.ui_manager.update(ScreenUIUpdate(
                         speed_mph=self.speed,
-                        power_watts=wattage,
+                        power_watts=power.average_watts,
                         battery_pct=battery_percentage,
                         speed_mode=self.speed_mode,
+                        voltage=self.voltage,
+                        wh_consumed=power.wh_consumed,
+                        wh_regenerated=power.wh_regenerated,
+                        thermal_limit=self.thermal.output_limit,
+                        seconds_to_derate=self.thermal.seconds_to_derate,
+                        x_m=odometry.x,
+                        y_m=odometry.y,
+                        heading_rad=odometry.heading,
+                        trip_miles=odometry.trip_miles,
+                        modes_version=self.modes.mtime,
                     ))
+                    self.metrics.ui_frame_seconds.observe(time.perf_counter() - frame_start)
             except Exception as e:
-                print(f"Error sending data to UI: {e}")
+                self.metrics.ui_errors.inc()
+                logger.warning("Error sending data to UI", extra=rate_limited(error=e))
             time.sleep(0.2)
 
+    def log_metrics_periodically(self):
+        while not self.stop_event.wait(METRICS_LOG_INTERVAL):
+            logger.info("metrics %s", self.metrics.compact_line())
+            # Off the control thread, and throttled further inside
+            self.save_calibration()
+            self.trim.save_if_changed()
+
+    def save_calibration(self, min_interval: "float | None" = None):
+        calibration = self.calibration
+        if calibration is not None:
+            if min_interval is None:
+                calibration.save_if_changed()
+            else:
+                calibration.save_if_changed(min_interval)
+
+    def connect_gamepad(self) -> Gamepad.Gamepad:
+        """Opens the gamepad with the mapping that matches its reported name and layout."""
+        mapping, (name, axes, buttons) = Gamepad.identify(DRIVER_JOYSTICK,
+                                                          default=Gamepad.getController(DEFAULT_MAPPING))
+        joystick = mapping(DRIVER_JOYSTICK)
+        self.use_controller(joystick)
+        # Attached before background updates start, so the initial rest position is learned too
+        self.calibration = StickCalibration.load(name, (self.horizontal_axis, self.vertical_axis))
+        self.calibration.attach(joystick)
+        logger.info("Gamepad connected", extra=fields(name=name, mapping=mapping.__name__, axes=axes, buttons=buttons))
+        return joystick
+
+    def connect_input(self) -> "InputSource | None":
+        """Starts reading the driver's gamepad if one is plugged in, otherwise drives from teleop if it is receiving."""
+        if Gamepad.available(DRIVER_JOYSTICK):
+            joystick = self.connect_gamepad()
+            self.reader.add(joystick)
+            return joystick
+        teleop = self.teleop
+        if teleop is not None and teleop.isConnected():
+            self.use_controller(teleop)
+            self.calibration = None
+            logger.info("Driving from teleop", extra=fields(sender=teleop.sender))
+            return teleop
+        return None
+
+    def reconnect_input(self) -> "InputSource | None":
+        """Waits for a gamepad, which may be a different controller, or teleop, and starts reading it."""
+        while self.wait_for_input():
+            try:
+                source = self.connect_input()
+            except OSError as e:
+                logger.warning("Could not open gamepad, retrying", extra=rate_limited(error=e))
+                self.stop_event.wait(GAMEPAD_RETRY_INTERVAL)
+                continue
+            if source is not None:
+                return source
+        return None
+
+    def release_input(self, source: InputSource):
+        """Stops reading a source connect_input returned."""
+        if not isinstance(source, Gamepad.Gamepad):
+            return
+        self.reader.remove(source)
+        source.disconnect()
+        self.save_calibration(min_interval=0)
+
+    def connect_passenger_gamepads(self):
+        """Connects the passenger's gamepad whenever one is plugged in, until the couch stops."""
+        stop_event = self.stop_event
+        arbiter = self.arbiter
+        with DirectoryWatcher(GAMEPAD_DIRECTORY) as watcher:
+            while watcher.wait_until(lambda: Gamepad.available(PASSENGER_JOYSTICK), stop_event):
+                try:
+                    mapping, (name, _, _) = Gamepad.identify(PASSENGER_JOYSTICK,
+                                                             default=Gamepad.getController(DEFAULT_MAPPING))
+                    passenger = mapping(PASSENGER_JOYSTICK)
+                except OSError as e:
+                    logger.warning("Could not open passenger gamepad, retrying", extra=rate_limited(error=e))
+                    stop_event.wait(GAMEPAD_RETRY_INTERVAL)
+                    continue
+                self.reader.add(passenger)
+                if passenger.isConnected():
+                    arbiter.attach_passenger(passenger, drive_axes(passenger))
+                    while passenger.isConnected() and not stop_event.wait(STOP_CHECK_INTERVAL):
+                        pass
+                    arbiter.detach_passenger()
+                self.reader.remove(passenger)
+                passenger.disconnect()
+
+    def use_controller(self, joystick: InputSource):
+        """Looks up which of the connected gamepad's axes and buttons drive the couch."""
+        self.horizontal_axis, self.vertical_axis = drive_axes(joystick)
+        self.controller_buttons = frozenset(joystick.buttonIndex)
+        self.horn_button = first_available(HORN_BUTTONS, self.controller_buttons)
+        self.bind_mode_buttons()
+
+    def bind_mode_buttons(self):
+        """Keeps the speed mode buttons the connected gamepad actually has."""
+        buttons = self.controller_buttons
+        self.mode_bindings = tuple(
+            (button, index) for button, index in self.modes.bindings if buttons is None or button in buttons
+        )
+
+    def input_available(self) -> bool:
+        teleop = self.teleop
+        return Gamepad.available(DRIVER_JOYSTICK) or (teleop is not None and teleop.isConnected())
+
+    def wait_for_input(self) -> bool:
+        """Blocks until a gamepad is plugged in or teleop packets arrive. Returns False if the couch is stopped first."""
+        if self.input_available():
+            return True
+        logger.info("Please connect your gamepad")
+        with DirectoryWatcher(GAMEPAD_DIRECTORY) as watcher:
+            # Rechecked at least every STOP_CHECK_INTERVAL, which is how teleop is noticed
+            return watcher.wait_until(self.input_available, self.stop_event)
+
     def joystick_motor_control(self):
         stop_event = self.stop_event
-        # Waits for the joystick to be connected
-        while not Gamepad.available() and not stop_event.is_set():
-            print("Please connect your gamepad")
-            time.sleep(1)
-        joystick = Controllers.Joystick()  # Initializes the joystick as a generic gamepad
-        print("Gamepad connected")
+        timeline = self.timeline
+        # VESC discovery doesn't need the gamepad, so it runs while we wait for one
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="vesc-discovery") as executor:
+            discovery = executor.submit(get_motor_controllers, TELEMETRY_FIELDS, stop_event)
+
+            def discovered(future):
+                if not future.exception() and future.result() is not None:
+                    timeline.mark("vescs_connected")
+
+            discovery.add_done_callback(discovered)
+
+            #pygame.mixer.init()
 
-        #pygame.mixer.init()
+            source = self.reconnect_input()
+            if source is not None:
+                timeline.mark("teleop_connected" if source is self.teleop else "gamepad_ready")
 
-        joystick.startBackgroundUpdates()
+            # Waits for the motor controllers to be connected
+            motors = discovery.result()
+        if source is None or motors is None:
+            # Stopped while still starting up
+            if source is not None:
+                self.release_input(source)
+            for motor in motors or ():
+                motor.stop()
+            return
+        left_motor, right_motor = motors
+        # Fresh controllers start at the default max_rpm, so reapply the tuned parameters
+        self.applied_revision = None
+        self.trim.attach(left_motor, right_motor)
 
-        # Waits for the motor controllers to be connected
-        left_motor, right_motor = get_motor_controllers()
+        # Stops the motors from another process if this loop hangs
+        watchdog = Watchdog(left_motor.scheduler.serial_port.port, can_ids=(RIGHT_MOTOR_ID,))
+        watchdog.start()
+        self.register_motor_metrics(left_motor, right_motor)
+        if self.isolate is not None:
+            # Only once everything above is running, so the discovery pool, the other couch
+            # threads and the watchdog process keep the default policy and core
+            for thread_id in {threading.get_native_id(), left_motor.scheduler.thread_id, right_motor.scheduler.thread_id}:
+                if thread_id is not None:
+                    self.isolate(thread_id)
 
         # Main loop
+        metrics = self.metrics
+        timeline.mark("drivable")
+        logger.info("Startup timeline %s", timeline.summary())
         try:
-            while joystick.isConnected() and not stop_event.is_set():
-                # Get raw joystick inputs
-                joystick_vertical = -joystick.axis('Y')
-                joystick_horizontal = joystick.axis('X')
-                
-                # Apply input smoothing to prevent oscillation from physical feedback
-                smooth_vertical, smooth_horizontal = self.input_smoother.smooth_inputs(
-                    joystick_vertical, joystick_horizontal
-                )
-                
-                ik_left, ik_right = arcade_drive_ik(smooth_vertical, smooth_horizontal, self.rotation_sensitivity)
-                ik_left *= get_speed_multiplier(self.speed_mode)
-                ik_right *= get_speed_multiplier(self.speed_mode)
+            while True:
+                teleop = source is self.teleop
+                while source.isConnected() and not stop_event.is_set():
+                    tick_start = time.perf_counter()
+                    self.control_tick(source, left_motor, right_motor)
+                    watchdog.kick()
+                    self.last_tick_seconds = time.perf_counter() - tick_start
+                    metrics.tick_seconds.observe(self.last_tick_seconds)
+                    metrics.ticks.inc()
+                    if teleop and Gamepad.available(DRIVER_JOYSTICK):
+                        # A gamepad on the couch outranks teleop
+                        break
 
-                try:
-                    measurements_left = left_motor.get_measurements()
-                    measurements_right = right_motor.get_measurements()
-
-                    if measurements_left and measurements_right:
-                        self.left_rpm = measurements_left.rpm
-                        self.right_rpm = measurements_right.rpm
-                        self.left_power = measurements_left.avg_motor_current * 10
-                        self.right_power = measurements_right.avg_motor_current * 10
-                        self.voltage = measurements_left.v_in
-                        self.temperature = measurements_left.temp_fet if measurements_left.temp_fet > measurements_right.temp_fet else measurements_right.temp_fet
-                    else:
-                        self.left_rpm = 0
-                        self.right_rpm = 0
-                except Exception as e:
-                    print(f"Error getting motor measurements: {e}")
-                    self.left_rpm = 0
-                    self.right_rpm = 0
-
-                avg_erpm = (self.left_rpm + self.right_rpm) / 2
-                motor_rpm = avg_erpm / POLE_PAIRS
-                wheel_rpm = motor_rpm * (MOTOR_PULLEY / WHEEL_PULLEY)
-                wheel_mph = wheel_rpm * 8 * 3.14 / IPM_IN_MPH
-
-                self.speed = wheel_mph
-
-                if joystick.isPressed('T1'):
-                    self.speed_mode = "park"
-                elif joystick.isPressed('T2'):
-                    self.speed_mode = "neutral"
-                elif joystick.isPressed('T3') or joystick.isPressed('T4'):
-                    self.speed_mode = "chill"
-                elif joystick.isPressed('T5') or joystick.isPressed('T6'):
-                    self.speed_mode = "standard"
-                elif joystick.isPressed('T7') or joystick.isPressed('T8'):
-                    self.speed_mode = "sport"
-                
-                if self.speed_mode == "neutral":
-                    left_motor.set_current(0)
-                    right_motor.set_current(0)
-                else:
-                    left_motor.set_rpm(ik_left)
-                    right_motor.set_rpm(ik_right)
-
-                if joystick.isPressed('TRIGGER'):
-                    # TODO: Horn
-                    pass
-                
-                # Control loop timing
-                time.sleep(POLL_INTERVAL)
+                    # Control loop timing. A kill switch press cuts the wait short.
+                    self.wake.wait(POLL_INTERVAL)
+                    self.wake.clear()
+                if stop_event.is_set():
+                    break
 
+                # Lost the input. Stop, and the watchdog keeps the motors stopped until one is back.
+                logger.warning("Teleop disconnected" if teleop else "Gamepad disconnected")
+                left_motor.stop()
+                right_motor.stop()
+                self.release_input(source)
+                source = self.reconnect_input()
+                if source is None:
+                    break
         finally:
+            watchdog.stop()
+            left_motor.stop()
+            right_motor.stop()
             del left_motor
             del right_motor
-            joystick.disconnect()
+            if source is not None:
+                self.release_input(source)
+            self.save_calibration(min_interval=0)
+            self.trim.save_if_changed(min_interval=0)
+
+    def collect_gamepad_metrics(self):
+        """Driver and passenger gamepad events, counted by the reader so reconnects don't reset them."""
+        metrics = self.metrics
+        metrics.gamepad_events.value = self.reader.events
+        metrics.gamepad_events_coalesced.value = self.reader.coalesced
+
+    def register_motor_metrics(self, left_motor: MotorController, right_motor: MotorController):
+        """Exposes the command shaper and serial scheduler counters alongside the loop metrics."""
+        registry = self.metrics.registry
+        skipped = [
+            registry.register(Counter("couch_frames_skipped_total", "Motor commands deduplicated away",
+                                      labels={"controller": name}))
+            for name in ("left", "right")
+        ]
+        scheduler = left_motor.scheduler
+        misses = {
+            priority: registry.register(Counter("couch_serial_deadline_misses_total",
+                                                "Serial frames sent later than their class deadline",
+                                                labels={"class": priority.name.lower()}))
+            for priority in Priority
+        }
+
+        def collect():
+            skipped[0].value = left_motor.shaper.frames_skipped
+            skipped[1].value = right_motor.shaper.frames_skipped
+            for priority, counter in misses.items():
+                counter.value = scheduler.stats[priority].deadline_misses
+
+        registry.add_collector(collect)
+
+    def register_teleop_metrics(self, teleop: TeleopReceiver):
+        registry = self.metrics.registry
+        packets = {
+            result: registry.register(Counter("couch_teleop_packets_total", "Teleop packets received",
+                                              labels={"result": result}))
+            for result in ("accepted", "out_of_order", "malformed", "other_sender")
+        }
+
+        def collect():
+            packets["accepted"].value = teleop.packets
+            packets["out_of_order"].value = teleop.out_of_order
+            packets["malformed"].value = teleop.malformed
+            packets["other_sender"].value = teleop.ignored
+
+        registry.add_collector(collect)
+
+    def apply_params(self, revision: Revision, left_motor: MotorController, right_motor: MotorController):
+        """Switches the control loop to a new parameter revision. Runs between ticks, so it is atomic to the loop.
+
+        control_tick holds back revisions that need parking until the couch is parked.
+        """
+        params = revision.params
+        self.input_smoother.smoothing_factor = params.smoothing_factor
+        self.input_smoother.max_accel_per_sec = params.max_accel_per_sec
+        self.rotation_sensitivity = params.rotation_sensitivity
+        self.deadband = params.deadband
+        left_motor.max_rpm = right_motor.max_rpm = params.max_rpm
+        self.applied_revision = revision
+        logger.info("Applied control parameters", extra=fields(version=revision.version))
+
+    def reload_modes_if_changed(self):
+        """Switches to an edited speed_modes.toml. Only called while stopped."""
+        modes = self.modes.reload_if_changed()
+        if modes is None:
+            return
+        current = modes.get(self.speed_mode)
+        self.modes = modes
+        self.mode_index = current.index if current else modes.initial_index
+        self.bind_mode_buttons()
+        recorder = self.recorder
+        if recorder is not None and recorder.speed_modes != modes.names:
+            # The recorded speed_mode indices are only meaningful against the header's list
+            try:
+                self.recorder = recorder.next_segment(modes.names)
+            except OSError as e:
+                logger.warning("Could not start a new recording segment, stopped recording",
+                               extra=fields(path=recorder.path, error=e))
+                recorder.close()
+                self.recorder = None
+
+    def record_tick(self, measurements_left, measurements_right):
+        """Appends this tick's measurements to the ride recording, in telemetry_recorder.RECORD_FIELDS order."""
+        self.recorder.record(
+            time.time(),
+            self.last_tick_seconds,
+            self.mode_index,
+            self.speed,
+            measurements_left.rpm,
+            measurements_right.rpm,
+            measurements_left.avg_motor_current,
+            measurements_right.avg_motor_current,
+            measurements_left.avg_input_current,
+            measurements_right.avg_input_current,
+            measurements_left.v_in,
+            measurements_left.temp_fet,
+            measurements_right.temp_fet,
+        )
+
+    def control_tick(self, joystick: InputSource, left_motor: MotorController, right_motor: MotorController):
+        """Runs one iteration of the control loop: read inputs and telemetry, then command the motors."""
+        modes = self.modes
+        revision = self.tuning.current
+        applied = self.applied_revision
+        if revision is not applied and (applied is None or modes.behaviors[self.mode_index] == BEHAVIOR_STOP
+                                        or not applied.params.needs_parking(revision.params)):
+            self.apply_params(revision, left_motor, right_motor)
+
+        arbiter = self.arbiter
+        authority = arbiter.authority(modes.behaviors[self.mode_index] == BEHAVIOR_STOP)
+        passenger = arbiter.passenger
+        if authority == AUTHORITY_PASSENGER and passenger is not None:
+            horizontal_axis, vertical_axis = arbiter.passenger_axes
+            stick = passenger
+        else:
+            horizontal_axis, vertical_axis = self.horizontal_axis, self.vertical_axis
+            stick = joystick
+
+        # Get raw joystick inputs
+        joystick_vertical = -stick.axis(vertical_axis)
+        joystick_horizontal = stick.axis(horizontal_axis)
+
+        # Apply input smoothing to prevent oscillation from physical feedback
+        smooth_vertical, smooth_horizontal = self.input_smoother.smooth_inputs(
+            joystick_vertical, joystick_horizontal
+        )
+
+        mode = self.mode_index
+        ik_left, ik_right = arcade_drive_ik(smooth_vertical, smooth_horizontal, self.rotation_sensitivity,
+                                            modes.curves[mode], self.deadband)
+        multiplier = modes.multipliers[mode]
+        ik_left *= multiplier
+        ik_right *= multiplier
+
+        metrics = self.metrics
+        measurements_left = measurements_right = None
+        try:
+            request_start = time.perf_counter()
+            measurements_left = left_motor.get_measurements()
+            request_end = time.perf_counter()
+            measurements_right = right_motor.get_measurements()
+            metrics.serial_rtt_left.observe(request_end - request_start)
+            metrics.serial_rtt_right.observe(time.perf_counter() - request_end)
+
+            if measurements_left and measurements_right:
+                self.left_rpm = measurements_left.rpm
+                self.right_rpm = measurements_right.rpm
+                self.power.update(measurements_left, measurements_right)
+                self.voltage = measurements_left.v_in
+                self.temperature = measurements_left.temp_fet if measurements_left.temp_fet > measurements_right.temp_fet else measurements_right.temp_fet
+                self.thermal.update(measurements_left, measurements_right)
+                self.odometry.update(int(measurements_left.tachometer), int(measurements_right.tachometer))
+                # Before this tick's commands go out, so the motors still hold the ones these RPMs answer
+                self.trim.learn(left_motor, right_motor, measurements_left.rpm, measurements_right.rpm)
+            else:
+                self.left_rpm = 0
+                self.right_rpm = 0
+        except Exception as e:
+            metrics.measurement_errors.inc()
+            logger.warning("Error getting motor measurements", extra=rate_limited(error=e))
+            self.left_rpm = 0
+            self.right_rpm = 0
+
+        self.speed = erpm_to_mph((self.left_rpm + self.right_rpm) / 2, self.odometry.wheel_diameter)
+
+        for button, index in self.mode_bindings:
+            if joystick.isPressed(button):
+                self.mode_index = mode = index
+                break
+
+        behavior = modes.behaviors[mode]
+        calibration = self.calibration
+        if calibration is not None:
+            # The stick's rest position is only learned while parked
+            calibration.learning_center = behavior == BEHAVIOR_STOP
+        if authority == AUTHORITY_KILL:
+            # Cut motor current like the neutral mode, whatever mode is selected
+            behavior = BEHAVIOR_COAST
+        if behavior == BEHAVIOR_STOP:
+            # Stops right away rather than ramping down
+            ik_left = ik_right = 0.0
+            self.motion_profiler.reset()
+            self.reload_modes_if_changed()
+        elif behavior == BEHAVIOR_COAST:
+            # Pick up from however fast the wheels are coasting when a drive mode is selected again
+            self.motion_profiler.reset(self.left_rpm / left_motor.max_rpm,
+                                       self.right_rpm / right_motor.max_rpm)
+        else:
+            ik_left, ik_right = self.motion_profiler.update(ik_left, ik_right, modes.limits[mode])
+        ik_left, ik_right = self.thermal.limit(ik_left, ik_right)
+
+        if behavior == BEHAVIOR_COAST:
+            left_motor.set_current(0)
+            right_motor.set_current(0)
+        else:
+            left_motor.set_rpm(ik_left)
+            right_motor.set_rpm(ik_right)
+        metrics.control_authority.value = authority
+        if authority == AUTHORITY_KILL:
+            reaction = arbiter.kill_acted_on()
+            if reaction is not None:
+                metrics.kills.inc()
+                metrics.kill_reaction_seconds.observe(reaction)
+
+        if self.recorder and measurements_left and measurements_right:
+            self.record_tick(measurements_left, measurements_right)
+
+        if self.horn_button and joystick.isPressed(self.horn_button):
+            # TODO: Horn
+            pass
+
+
+def drive_axes(joystick: InputSource):
+    """The (horizontal, vertical) axes that steer the couch on a gamepad."""
+    axes = joystick.axisIndex
+    return next(
+        ((x, y) for x, y in DRIVE_AXES if x in axes and y in axes),
+        (HORIZONTAL_JOYSTICK_AXIS, VERTICAL_JOYSTICK_AXIS),
+    )
 
 
 if __name__ == "__main__":
+    setup_logging()
     main = Couch()
     main.start()
     try:
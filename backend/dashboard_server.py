@@ -0,0 +1,175 @@
+"""Feeds the Electron/React dashboard in frontend/ over a WebSocket.
+
+The frontend connects to ws://localhost:8000/ws/dashboard and expects JSON
+messages matching DashboardDataSchema in useDashboardWebSocket.ts. Only the
+server-to-client half of the WebSocket protocol is implemented, which is all
+the dashboard uses.
+
+update() never touches the network. It stores the newest message and wakes
+the per-client sender threads, so a slow or stuck client just skips frames.
+"""
+import base64
+import hashlib
+import json
+import logging
+import socketserver
+import struct
+import threading
+from typing import Dict, Optional
+
+from logging_setup import fields
+from mode_registry import BEHAVIOR_COAST, BEHAVIOR_STOP, ModeRegistry, load_modes
+from ui_types import ScreenUIUpdate
+
+DASHBOARD_HOST = "127.0.0.1"
+DASHBOARD_PORT = 8000
+DASHBOARD_PATH = "/ws/dashboard"
+# Idle clients get a ping this often so dead connections are noticed
+PING_INTERVAL = 5.0
+SEND_TIMEOUT = 2.0
+
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_OPCODE_TEXT = 0x1
+_OPCODE_PING = 0x9
+
+# Frontend GEAR_MODES in home-page.tsx. Its SPEED_MODES are the drive modes, in config order.
+GEAR_PARK, GEAR_REVERSE, GEAR_NEUTRAL, GEAR_DRIVE = range(4)
+# Rolling backwards faster than this shows as reverse
+REVERSE_MPH = -0.5
+
+logger = logging.getLogger(__name__)
+
+
+def dashboard_message(update: ScreenUIUpdate, modes: ModeRegistry) -> Dict[str, float]:
+    """Maps a ScreenUIUpdate onto the frontend's dashboard schema."""
+    mode = modes.get(update.speed_mode)
+    behavior = None if mode is None else mode.behavior
+    drive_names = [drive_mode.name for drive_mode in modes.drive_modes()]
+    if behavior == BEHAVIOR_STOP:
+        gear = GEAR_PARK
+    elif behavior == BEHAVIOR_COAST:
+        gear = GEAR_NEUTRAL
+    elif update.speed_mph < REVERSE_MPH:
+        gear = GEAR_REVERSE
+    else:
+        gear = GEAR_DRIVE
+    return {
+        "speed": round(abs(update.speed_mph)),
+        "battery": round(update.battery_pct),
+        "wattage": round(update.power_watts),
+        # No pack capacity to project range from yet
+        "range": 0,
+        "voltage": round(update.voltage, 1),
+        "speedMode": drive_names.index(update.speed_mode) if update.speed_mode in drive_names else 0,
+        "gear": gear,
+        # Odometry pose for the couch visualization, meters and radians
+        "x": round(update.x_m, 3),
+        "y": round(update.y_m, 3),
+        "heading": round(update.heading_rad, 4),
+        "trip": round(update.trip_miles, 2),
+    }
+
+
+def encode_frame(payload: bytes, opcode: int = _OPCODE_TEXT) -> bytes:
+    """A single unmasked, final WebSocket frame, as servers send them."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def accept_key(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest()).decode()
+
+
+class DashboardServer:
+    """Serves dashboard updates to any number of WebSocket clients. Quacks like ScreenUI."""
+
+    def __init__(self, host: str = DASHBOARD_HOST, port: int = DASHBOARD_PORT,
+                 modes: Optional[ModeRegistry] = None):
+        self.modes = modes or load_modes()
+        self._condition = threading.Condition()
+        self._message = b""
+        self._version = 0
+        self._stopped = False
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(handler):
+                if not server._handshake(handler):
+                    return
+                handler.connection.settimeout(SEND_TIMEOUT)
+                logger.info("Dashboard connected", extra=fields(client=handler.client_address[0]))
+                try:
+                    server._send_updates(handler.connection)
+                except OSError:
+                    pass
+                logger.info("Dashboard disconnected", extra=fields(client=handler.client_address[0]))
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler, bind_and_activate=False)
+        self.server.allow_reuse_address = True
+        self.server.daemon_threads = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def update(self, update: ScreenUIUpdate) -> None:
+        modes = self.modes.for_version(update.modes_version)
+        if modes is not None:
+            self.modes = modes
+        message = encode_frame(json.dumps(dashboard_message(update, self.modes)).encode())
+        with self._condition:
+            self._message = message
+            self._version += 1
+            self._condition.notify_all()
+
+    def _handshake(self, handler: socketserver.StreamRequestHandler) -> bool:
+        request_line = handler.rfile.readline(1024).decode("latin-1").split()
+        headers = {}
+        while True:
+            line = handler.rfile.readline(4096).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        key = headers.get("sec-websocket-key")
+        if len(request_line) < 2 or request_line[1] != DASHBOARD_PATH or not key:
+            handler.wfile.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+            return False
+        handler.wfile.write(
+            b"HTTP/1.1 101 Switching Protocols\r\n"
+            b"Upgrade: websocket\r\n"
+            b"Connection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + accept_key(key).encode() + b"\r\n\r\n"
+        )
+        return True
+
+    def _send_updates(self, connection):
+        sent_version = 0
+        while True:
+            with self._condition:
+                if self._version == sent_version and not self._stopped:
+                    self._condition.wait(PING_INTERVAL)
+                if self._stopped:
+                    return
+                message, version = self._message, self._version
+            if version != sent_version:
+                connection.sendall(message)
+                sent_version = version
+            else:
+                connection.sendall(encode_frame(b"", _OPCODE_PING))
@@ -1,58 +1,52 @@
-import sys
 import glob
-from typing import Tuple
-import serial
+import logging
+from typing import Optional, Sequence, Tuple
 from pyvesc import VESC
-import time
+import threading
 from motor_controller import VESCMotorController, CanVESC, MotorController
+from serial_scheduler import SerialScheduler
+from logging_setup import fields, rate_limited
+from startup import DirectoryWatcher
 
 LEFT_MOTOR_ID = 42
 RIGHT_MOTOR_ID = 78
+VESC_PORT_PATTERN = "/dev/ttyACM*"
+DISCOVERY_RETRY_INTERVAL = 1.0
 
+logger = logging.getLogger(__name__)
 
-def get_serial_ports():
-    """ Lists serial port names
-
-        :raises EnvironmentError:
-            On unsupported or unknown platforms
-        :returns:
-            A list of the serial ports available on the system
-    """
-    if sys.platform.startswith('win'):
-        ports = ['COM%s' % (i + 1) for i in range(256)]
-    elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
-        # this excludes your current terminal "/dev/tty"
-        ports = glob.glob('/dev/tty[A-Za-z]*')
-    elif sys.platform.startswith('darwin'):
-        ports = glob.glob('/dev/tty.*')
-    else:
-        raise EnvironmentError('Unsupported platform')
-    result = []
-    for port in ports:
-        try:
-            s = serial.Serial(port)
-            s.close()
-            result.append(port)
-        except (OSError, serial.SerialException):
-            pass
-    return result
 
+def get_motor_controllers(telemetry_fields: Optional[Sequence[str]] = None,
+                          stop_event: Optional[threading.Event] = None
+                          ) -> Optional[Tuple[MotorController, MotorController]]:
+    """Waits for the left VESC to show up on USB and returns the left and right motor controllers.
 
-def get_motor_controllers() -> Tuple[MotorController, MotorController]:
+    telemetry_fields limits what get_measurements returns on both controllers, see VESCMotorController.
+    Returns None if stop_event is set before the VESC is found.
+    """
     left_vesc = None
-    while left_vesc is None:
-        for port in get_serial_ports():
-            if port.startswith("/dev/ttyACM"):
-                print(f"Connecting to {port}")
+    with DirectoryWatcher("/dev") as watcher:
+        while left_vesc is None:
+            # Only USB CDC ports can be a VESC, no need to open every tty on the system
+            for port in sorted(glob.glob(VESC_PORT_PATTERN)):
+                logger.info("Connecting to VESC", extra=fields(port=port))
                 try:
-                    vesc = VESC(serial_port=port)
+                    # The scheduler runs the heartbeat once it owns the port
+                    vesc = VESC(serial_port=port, start_heartbeat=False)
                     byte = vesc.get_measurements().__dict__['app_controller_id']
                     vesc_id = int.from_bytes(byte, byteorder='big', signed=True)
                     if vesc_id == LEFT_MOTOR_ID:
-                        left_vesc = VESCMotorController(vesc)
+                        scheduler = SerialScheduler(vesc)
+                        scheduler.start()
+                        left_vesc = VESCMotorController(scheduler, telemetry_fields)
+                        break
                 except:
-                    print("Error connecting to VESC, retrying")
-        print("No VESCs found, retrying")
-        time.sleep(1)
-    right_vesc = CanVESC(parent_vesc=left_vesc.motor, can_id=RIGHT_MOTOR_ID)
+                    logger.warning("Error connecting to VESC, retrying", extra=rate_limited(port=port))
+            if left_vesc is None:
+                logger.info("No VESCs found, retrying", extra=rate_limited())
+                if stop_event is not None and stop_event.is_set():
+                    return None
+                # Retry as soon as a port appears, or after a while for a VESC that was still booting
+                watcher.wait_for_change(DISCOVERY_RETRY_INTERVAL)
+    right_vesc = CanVESC(scheduler=left_vesc.scheduler, can_id=RIGHT_MOTOR_ID, telemetry_fields=telemetry_fields)
     return left_vesc, right_vesc
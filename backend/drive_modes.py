@@ -1,17 +1,8 @@
-from typing import Tuple, Literal, Dict, List
+from typing import Tuple
 import mathutils
 
-SpeedMode = Literal["park", "neutral", "chill", "standard", "sport"]
-
-SPEED_MODES: List[SpeedMode] = ["park", "neutral", "chill", "standard", "sport"]
-
-SPEED_MODES_TO_MULTIPLIER: Dict[SpeedMode, float] = {
-    "park": 0,
-    "neutral": 0,
-    "chill": 0.5,
-    "standard": 0.75,
-    "sport": 1,
-}
+# The name of a mode defined in speed_modes.toml, see mode_registry
+SpeedMode = str
 
 def curvture_drive_ik(speed: float, rotation: float) -> Tuple[float, float]:
     """Curvature drive inverse kinematics for a differential drive platform.
@@ -29,7 +20,8 @@ def curvture_drive_ik(speed: float, rotation: float) -> Tuple[float, float]:
     return mathutils.desaturate_wheel_speeds(left_speed, right_speed)
 
 
-def arcade_drive_ik(speed: float, rotation: float, rotation_sensitivity: float = 1) -> Tuple[float, float]:
+def arcade_drive_ik(speed: float, rotation: float, rotation_sensitivity: float = 1, curve: float = 2,
+                    deadband: float = 0.05) -> Tuple[float, float]:
     """Arcade drive inverse kinematics for a differential drive platform.
 
     Args:
@@ -37,17 +29,16 @@ def arcade_drive_ik(speed: float, rotation: float, rotation_sensitivity: float =
         rotation: The normalized curvature [-1.0..1.0]. Counterclockwise is positive.
         rotation_sensitivity: Multiplier for rotation input to reduce turning sensitivity [0.0..1.0].
                              Lower values = gentler turning.
+        curve: Response exponent for the speed input. 1 is linear, 2 squares it.
+        deadband: Stick deadzone applied to both inputs.
 
     Returns:
         Wheel speeds [-1.0..1.0].
     """
-    speed, rotation = mathutils.scale_and_deadzone_inputs(speed, rotation)
+    speed, rotation = mathutils.scale_and_deadzone_inputs(speed, rotation, deadband=deadband, curve=curve)
     # Scale down rotation to make turning less aggressive
     rotation *= rotation_sensitivity
     left_speed = speed + rotation
     right_speed = speed - rotation
     return mathutils.desaturate_wheel_speeds(left_speed, right_speed)
 
-
-def get_speed_multiplier(speed_mode: SpeedMode) -> float:
-    return SPEED_MODES_TO_MULTIPLIER[speed_mode]
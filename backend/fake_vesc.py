@@ -0,0 +1,133 @@
+"""A fake VESC that speaks enough of the serial protocol to exercise the couch without hardware.
+
+FakeSerialPort quacks like a pyserial Serial, so it can be handed to the
+SerialScheduler in place of a real port.
+"""
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+import vesc_protocol as proto
+
+
+class FakeMotor:
+    """State of one simulated VESC, either on the USB port or behind CAN."""
+
+    def __init__(self, **values: float):
+        self.values: Dict[str, float] = {
+            "temp_fet": 30.0,
+            "temp_motor": 30.0,
+            "v_in": 50.0,
+            "app_controller_id": 0,
+        }
+        self.values.update(values)
+        self.commands: List[Tuple[float, str, float]] = []
+        self.alive_count = 0
+
+    @property
+    def last_command(self) -> Optional[Tuple[float, str, float]]:
+        return self.commands[-1] if self.commands else None
+
+
+class FakeVESC:
+    """Protocol engine: takes raw bytes from the host and returns the bytes the VESC would reply with."""
+
+    def __init__(self, controller_id: int, can_ids: Tuple[int, ...] = ()):
+        self.controller_id = controller_id
+        self.motors: Dict[Optional[int], FakeMotor] = {None: FakeMotor(app_controller_id=controller_id)}
+        for can_id in can_ids:
+            self.motors[can_id] = FakeMotor(app_controller_id=can_id)
+        self._rx = bytearray()
+        self.bad_packets = 0
+
+    def motor(self, can_id: Optional[int] = None) -> FakeMotor:
+        return self.motors[can_id]
+
+    def receive(self, data: bytes) -> bytes:
+        self._rx.extend(data)
+        reply = bytearray()
+        while True:
+            payload, consumed = proto.unframe(bytes(self._rx))
+            del self._rx[:consumed]
+            if payload is None:
+                break
+            reply.extend(self._handle(payload))
+        return bytes(reply)
+
+    def _handle(self, payload: bytes, can_id: Optional[int] = None) -> bytes:
+        command = payload[0]
+        if command == proto.COMM_FORWARD_CAN:
+            return self._handle(payload[2:], payload[1])
+        motor = self.motors.get(can_id)
+        if motor is None:
+            # Nobody on the bus with that id, the real thing stays silent too
+            return b""
+        now = time.monotonic()
+        if command == proto.COMM_SET_CURRENT:
+            (current,) = struct.unpack_from(">i", payload, 1)
+            motor.commands.append((now, "current", current / 1000))
+        elif command == proto.COMM_SET_RPM:
+            (rpm,) = struct.unpack_from(">i", payload, 1)
+            motor.commands.append((now, "rpm", rpm))
+        elif command == proto.COMM_ALIVE:
+            motor.alive_count += 1
+        elif command == proto.COMM_GET_VALUES_SELECTIVE:
+            (mask,) = struct.unpack_from(">I", payload, 1)
+            fields = [name for name, bit in proto.FIELD_BITS.items() if mask & (1 << bit)]
+            return proto.GetValuesSelective(fields).encode_reply(motor.values)
+        else:
+            self.bad_packets += 1
+        return b""
+
+
+class FakeSerialPort:
+    """In-memory stand-in for serial.Serial backed by a FakeVESC."""
+
+    def __init__(self, vesc: FakeVESC, reply_delay: float = 0.0):
+        self.vesc = vesc
+        self.reply_delay = reply_delay
+        self.port = "fake"
+        self._pending: List[Tuple[float, bytes]] = []
+        self._buffer = bytearray()
+
+    def _deliver(self):
+        now = time.monotonic()
+        while self._pending and self._pending[0][0] <= now:
+            self._buffer.extend(self._pending.pop(0)[1])
+
+    @property
+    def in_waiting(self) -> int:
+        self._deliver()
+        return len(self._buffer)
+
+    def write(self, data: bytes) -> int:
+        reply = self.vesc.receive(data)
+        if reply:
+            self._pending.append((time.monotonic() + self.reply_delay, reply))
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        self._deliver()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def reset_input_buffer(self):
+        self._pending.clear()
+        self._buffer.clear()
+
+    def close(self):
+        pass
+
+
+if __name__ == "__main__":
+    # Poll the selective telemetry the couch uses against a fake left/right pair
+    vesc = FakeVESC(controller_id=42, can_ids=(78,))
+    vesc.motor(78).values.update(rpm=1200, avg_motor_current=3.5)
+    port = FakeSerialPort(vesc)
+    full = proto.framed_size(70)
+    for can_id in (None, 78):
+        request = proto.GetValuesSelective(["rpm", "avg_motor_current", "v_in", "temp_fet"], can_id=can_id)
+        port.write(request.request)
+        values, _ = request.decode(port.read(port.in_waiting))
+        print(f"can_id={can_id}: {values} ({request.reply_length} byte reply vs ~{full} for GetValues)")
@@ -0,0 +1,99 @@
+"""One thread reading every connected gamepad.
+
+Instead of a Gamepad update thread per device, the reader waits on all of
+their joystick fds with select() and hands each readable one a single
+updateStateBatch() call. Events from the driver's and the passenger's
+gamepads are handled in the order they arrive, by the same thread, so a
+button callback on one device never races the other's state updates.
+
+events and coalesced count every device's events for the whole run, so they
+keep growing across reconnects, unlike each Gamepad's own counters.
+"""
+import logging
+import os
+import select
+import threading
+from typing import Dict
+
+import Gamepad.Gamepad as Gamepad
+from logging_setup import fields
+
+logger = logging.getLogger(__name__)
+
+
+class GamepadReader:
+    """Keeps the state of several gamepads updated from one background thread."""
+
+    def __init__(self):
+        self._gamepads: Dict[int, Gamepad.Gamepad] = {}
+        self._lock = threading.Lock()
+        # Written to wake select() when the set of gamepads changes or the reader stops
+        self._wake_read, self._wake_write = os.pipe()
+        self._running = False
+        self._thread = None
+        # Events read and axis events superseded within a batch, over all gamepads
+        self.events = 0
+        self.coalesced = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="gamepad-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+    def add(self, gamepad: Gamepad.Gamepad, wait_for_ready: bool = True):
+        """Starts reading a gamepad. Like startBackgroundUpdates, by default waits for its initial state."""
+        with self._lock:
+            self._gamepads[gamepad.joystickFile.fileno()] = gamepad
+        self._wake()
+        if wait_for_ready:
+            # Also set when the gamepad disconnects before it is ready
+            gamepad.readyEvent.wait()
+
+    def remove(self, gamepad: Gamepad.Gamepad):
+        with self._lock:
+            for fd, known in list(self._gamepads.items()):
+                if known is gamepad:
+                    del self._gamepads[fd]
+        self._wake()
+
+    def _wake(self):
+        try:
+            os.write(self._wake_write, b"\0")
+        except OSError:
+            # Already stopped
+            pass
+
+    def _run(self):
+        while self._running:
+            with self._lock:
+                gamepads = dict(self._gamepads)
+            try:
+                readable, _, _ = select.select([self._wake_read, *gamepads], [], [])
+            except (OSError, ValueError):
+                # A gamepad was removed and closed while we waited, the next pass leaves it out
+                continue
+            for fd in readable:
+                if fd == self._wake_read:
+                    os.read(self._wake_read, 4096)
+                    continue
+                gamepad = gamepads[fd]
+                events, coalesced = gamepad.eventCount, gamepad.coalescedCount
+                try:
+                    gamepad.updateStateBatch()
+                    self.events += gamepad.eventCount - events
+                    self.coalesced += gamepad.coalescedCount - coalesced
+                except IOError as e:
+                    # The owner notices through isConnected()
+                    logger.info("Stopped reading gamepad", extra=fields(joystick=gamepad.joystickNumber, error=e))
+                    gamepad.readyEvent.set()
+                    with self._lock:
+                        self._gamepads.pop(fd, None)
@@ -0,0 +1,20 @@
+from typing import Dict, Protocol, Union
+
+Control = Union[str, int]
+
+
+class InputSource(Protocol):
+    """Anything the control loop can drive from: a local Gamepad or the UDP teleop receiver.
+
+    This is the subset of the Gamepad API the couch uses, so every Gamepad mapping is an
+    InputSource as it is. Axes read like a joystick, -1.0 to +1.0 with Y negative forward.
+    """
+
+    axisIndex: Dict[str, int]
+    buttonIndex: Dict[str, int]
+
+    def axis(self, axisName: Control) -> float: ...
+
+    def isPressed(self, buttonName: Control) -> bool: ...
+
+    def isConnected(self) -> bool: ...
@@ -0,0 +1,124 @@
+"""Non-blocking logging for the control path.
+
+Log calls only drop a record on a bounded in-memory queue. A background
+listener thread does the formatting and the actual write, so a slow terminal
+or journald pipe can never stall the control loop. If the queue is full the
+record is dropped and counted rather than blocking. dropped_records() reads
+the count, which the couch exports as couch_log_records_dropped_total.
+
+Structured fields are passed with extra=fields(...) and rendered as
+key=value pairs after the message.
+
+Call sites that can fire every tick or every retry, like a failing
+telemetry read, pass extra=rate_limited(...) instead. Those go out at most
+once per interval per logger and message template, and the next one that
+does go out says how many were suppressed. Everything else, state changes
+like a kill switch press included, is always emitted.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from typing import Any, Dict, Optional, Tuple
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+LOG_QUEUE_SIZE = 10000
+RATE_LIMIT_INTERVAL = 10.0
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: "Optional[DroppingQueueHandler]" = None
+
+
+def fields(**values: Any) -> Dict[str, Dict[str, Any]]:
+    """Structured fields for a log call: logger.info("...", extra=fields(port=port))."""
+    return {"fields": values}
+
+
+def rate_limited(**values: Any) -> Dict[str, Any]:
+    """Like fields(), for a log call that can repeat every tick: logger.warning("...", extra=rate_limited(error=e))."""
+    return {"fields": values, "rate_limited": True}
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets each rate_limited (logger, message template) through at most once per interval."""
+
+    def __init__(self, interval: float = RATE_LIMIT_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self._last_emitted: Dict[Tuple[str, str], float] = {}
+        self._suppressed: Dict[Tuple[str, str], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "rate_limited", False):
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        last = self._last_emitted.get(key)
+        if last is not None and now - last < self.interval:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+        self._last_emitted[key] = now
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        extra = getattr(record, "fields", None)
+        if extra:
+            message += " " + " ".join(f"{key}={value}" for key, value in extra.items())
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            message += f" (suppressed {suppressed} similar)"
+        return message
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never formats or blocks in the calling thread."""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread instead
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def dropped_records() -> int:
+    """Log records dropped on a full queue since setup_logging(), 0 if it wasn't called."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def setup_logging(level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """Routes all logging through the background writer. Safe to call more than once."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(LOG_QUEUE_SIZE)
+    _queue_handler = queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(StructuredFormatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers[:] = [queue_handler]
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -1,22 +1,95 @@
-import tkinter as tk
-from couch import Couch
-from screen_ui import ScreenUI
+import argparse
+import logging
+from typing import TYPE_CHECKING, Optional
+from control_process import CONTROL_CPU, ControlProcess
+from logging_setup import fields, setup_logging
+from startup import StartupTimeline
+from ui_types import MultiUIManager, UIManager
+
+if TYPE_CHECKING:
+    import tkinter as tk
 import os
 os.environ['DISPLAY'] = ':0'
 
+UI_POLL_INTERVAL_MS = 50
+
+logger = logging.getLogger(__name__)
+
+
+def start_single_process(ui: UIManager, record_dir: Optional[str], timeline: StartupTimeline,
+                         teleop_port: Optional[int]):
+    from couch import Couch
+    from mode_registry import load_modes
+    from telemetry_recorder import TelemetryRecorder
+
+    modes = load_modes()
+    recorder = TelemetryRecorder.in_directory(record_dir, modes.names) if record_dir else None
+    couch = Couch(ui, recorder, modes, timeline, teleop_port)
+    couch.start()
+    return couch
+
+
+def poll_control_process(root: "tk.Tk", ui: UIManager, control: ControlProcess):
+    reader = control.reader()
+
+    def poll_telemetry():
+        update = reader.latest()
+        if update is not None:
+            ui.update(update)
+        root.after(UI_POLL_INTERVAL_MS, poll_telemetry)
+
+    poll_telemetry()
+
 
 def main():
+    timeline = StartupTimeline()
+    parser = argparse.ArgumentParser(description="Moonshot Couch")
+    parser.add_argument(
+        "--multiprocess", action="store_true",
+        help="run the control loop in its own process, on a pinned, real-time thread, instead of a thread here",
+    )
+    parser.add_argument("--cpu", type=int, default=CONTROL_CPU, help="core to pin the control thread to")
+    parser.add_argument("--record", metavar="DIR", help="record per-tick ride telemetry into this directory")
+    parser.add_argument("--teleop-port", type=int, metavar="PORT",
+                        help="accept UDP teleop on this port (9200 by convention) when no gamepad is plugged in")
+    args = parser.parse_args()
+    setup_logging()
+    timeline.mark("imports_done")
+
+    # The control side starts first, so gamepad and VESC discovery overlap with building the screen.
+    # Updates sent before the screen exists go nowhere.
+    ui = MultiUIManager([])
+    if args.multiprocess:
+        control = ControlProcess(cpu=args.cpu, record_dir=args.record, startup_origin=timeline.origin,
+                                 teleop_port=args.teleop_port)
+        control.start()
+    else:
+        control = start_single_process(ui, args.record, timeline, args.teleop_port)
+
+    # Tk, the screen and the dashboard server are imported only now, after the control side is on its way
+    import tkinter as tk
+    from dashboard_server import DashboardServer
+    from screen_ui import ScreenUI
+
     root = tk.Tk()
-    ui = ScreenUI(root)
-    couch = Couch(ui)
-    couch.start()
-    print("Running main loop")
+    ui.managers.append(ScreenUI(root))
+    try:
+        dashboard = DashboardServer()
+        dashboard.start()
+        ui.managers.append(dashboard)
+    except OSError as e:
+        logger.warning("Could not start dashboard server", extra=fields(error=e))
+    if args.multiprocess:
+        poll_control_process(root, ui, control)
+    timeline.mark("ui_ready")
+
+    logger.info("Running main loop")
     try:
         root.mainloop()
     except KeyboardInterrupt:
         pass
-    print("Main loop ended")
-    couch.stop()
+    logger.info("Main loop ended")
+    control.stop()
 
 
 if __name__ == "__main__":
@@ -19,7 +19,7 @@ def deadzone(x: float, min_val: float) -> float:
     return x
 
 
-def scale_and_deadzone_inputs(speed: float, rotation: float, square_rotation: bool = True, deadband: float = 0.05, use_hysteresis: bool = True) -> Tuple[float, float]:
+def scale_and_deadzone_inputs(speed: float, rotation: float, square_rotation: bool = True, deadband: float = 0.05, use_hysteresis: bool = True, curve: float = 2) -> Tuple[float, float]:
     """Apply deadzone and scaling to the inputs.
 
     Args:
@@ -28,6 +28,7 @@ def scale_and_deadzone_inputs(speed: float, rotation: float, square_rotation: bo
         square_rotation: Whether to square the rotation input to decrease sensitivity.
         deadband: The deadzone to apply to the inputs.
         use_hysteresis: Whether to use hysteresis to prevent oscillation around deadband.
+        curve: Response exponent applied to the speed input. 2 squares it.
 
     Returns:
         Tuple of scaled speed and rotation.
@@ -39,7 +40,7 @@ def scale_and_deadzone_inputs(speed: float, rotation: float, square_rotation: bo
         speed = deadzone(speed, deadband)
         rotation = deadzone(rotation, deadband)
     
-    speed = square(speed)
+    speed = square(speed) if curve == 2 else apply_curve(speed, curve)
     if square_rotation:
         rotation = square(rotation)
     return speed, rotation
@@ -151,6 +152,16 @@ def square(value: float) -> float:
     return abs(value) * value
 
 
+def apply_curve(value: float, exponent: float) -> float:
+    """
+    Raises the magnitude of value to the given power while keeping the sign the same
+    :param value: value in [-1.0..1.0]
+    :param exponent: response exponent, 1 is linear
+    :return: the shaped value, with the same sign as the input
+    """
+    return abs(value) ** exponent * (1 if value >= 0 else -1)
+
+
 class InputSmoother:
     """
     Smooths joystick inputs using exponential moving average and acceleration limiting
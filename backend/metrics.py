@@ -0,0 +1,221 @@
+"""Lightweight runtime metrics for the couch, exposed in Prometheus text format.
+
+Metric objects are created once up front. Updating them on the hot path is a
+plain attribute increment or a bisect into a preallocated bucket list, with
+no dicts, strings or lists built per call.
+"""
+import bisect
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from logging_setup import dropped_records, rate_limited
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9100
+METRICS_LOG_INTERVAL = 10.0
+
+# Buckets in seconds, covering sub-millisecond stages up to a badly stalled tick
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_labels(labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.help = help
+        self.label_str = _format_labels(labels)
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def samples(self) -> List[Tuple[str, float]]:
+        return [(f"{self.name}{self.label_str}", self.value)]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DURATION_BUCKETS,
+                 labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.label_str = _format_labels(labels)
+        self.bounds = tuple(buckets)
+        # One slot per bound plus +Inf
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket containing the q-th quantile. Good enough for a log line."""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def samples(self) -> List[Tuple[str, float]]:
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            labels = dict(self.labels, le="+Inf" if bound == float("inf") else repr(bound))
+            samples.append((f"{self.name}_bucket{_format_labels(labels)}", cumulative))
+        samples.append((f"{self.name}_sum{self.label_str}", self.sum))
+        samples.append((f"{self.name}_count{self.label_str}", self.count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Registers a callback that refreshes gauges right before they are rendered."""
+        self._collectors.append(collector)
+
+    def collect(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning("Error collecting metrics", extra=rate_limited(error=e))
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        self.collect()
+        lines = []
+        described = set()
+        for metric in self._metrics:
+            if metric.name not in described:
+                described.add(metric.name)
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class CouchMetrics:
+    """The metrics the couch control loop keeps."""
+
+    def __init__(self):
+        self.registry = registry = MetricsRegistry()
+        self.ticks = registry.register(Counter("couch_ticks_total", "Control loop iterations"))
+        self.tick_seconds = registry.register(Histogram("couch_tick_seconds", "Control loop iteration duration"))
+        self.serial_rtt_left = registry.register(Histogram(
+            "couch_serial_rtt_seconds", "Telemetry request round trip per controller", labels={"controller": "left"}))
+        self.serial_rtt_right = registry.register(Histogram(
+            "couch_serial_rtt_seconds", "Telemetry request round trip per controller", labels={"controller": "right"}))
+        self.measurement_errors = registry.register(Counter(
+            "couch_exceptions_total", "Exceptions caught in the control path", labels={"stage": "measurements"}))
+        self.ui_errors = registry.register(Counter(
+            "couch_exceptions_total", "Exceptions caught in the control path", labels={"stage": "ui"}))
+        self.gamepad_events = registry.register(Counter("couch_gamepad_events_total", "Joystick events read"))
+        self.gamepad_events_coalesced = registry.register(
+            Counter("couch_gamepad_events_coalesced_total", "Joystick axis events superseded within a read batch")
+        )
+        self.control_authority = registry.register(Gauge(
+            "couch_control_authority", "Who controls the couch: 0 driver, 1 passenger takeover, 2 kill switch"))
+        self.kills = registry.register(Counter("couch_kills_total", "Kill switch presses acted on"))
+        self.kill_reaction_seconds = registry.register(Histogram(
+            "couch_kill_reaction_seconds", "Time from a kill switch press being read to the neutral command"))
+        self.ui_frame_seconds = registry.register(Histogram("couch_ui_frame_seconds", "Time to push one frame to the UI"))
+        self.log_records_dropped = registry.register(
+            Counter("couch_log_records_dropped_total", "Log records dropped because the log queue was full")
+        )
+        registry.add_collector(self._collect_log_drops)
+
+        self._last_report = time.monotonic()
+        self._last_ticks = 0
+        self._last_events = 0
+
+    def _collect_log_drops(self):
+        self.log_records_dropped.value = dropped_records()
+
+    def compact_line(self) -> str:
+        """One-line summary of the activity since the previous call, for the log."""
+        self.registry.collect()
+        now = time.monotonic()
+        elapsed = max(now - self._last_report, 1e-9)
+        tick_rate = (self.ticks.value - self._last_ticks) / elapsed
+        event_rate = (self.gamepad_events.value - self._last_events) / elapsed
+        self._last_report = now
+        self._last_ticks = self.ticks.value
+        self._last_events = self.gamepad_events.value
+        return (
+            f"tick_hz={tick_rate:.1f} tick_p99<={self.tick_seconds.quantile(0.99) * 1000:g}ms"
+            f" rtt_l_p99<={self.serial_rtt_left.quantile(0.99) * 1000:g}ms"
+            f" rtt_r_p99<={self.serial_rtt_right.quantile(0.99) * 1000:g}ms"
+            f" errors={self.measurement_errors.value + self.ui_errors.value}"
+            f" gamepad_hz={event_rate:.0f} ui_p99<={self.ui_frame_seconds.quantile(0.99) * 1000:g}ms"
+        )
+
+
+class MetricsServer:
+    """Serves a registry at http://host:port/metrics from a daemon thread."""
+
+    def __init__(self, registry: MetricsRegistry, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.registry = registry
+        # http.server pulls in email and html, so it is only imported once the endpoint is started
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path != "/metrics":
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
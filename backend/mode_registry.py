@@ -0,0 +1,203 @@
+"""Speed modes loaded from speed_modes.toml and compiled into index-addressed arrays.
+
+The control loop keeps the current mode as an integer and reads its
+multiplier, curve and motion limits straight out of tuples, so the hot path
+never does a string-keyed lookup. Names are only used at the edges: the UI,
+recordings and the config file.
+
+A ModeRegistry is immutable. reload_if_changed() hands back a new one when
+the file has been edited, and callers decide when it is safe to switch to
+it (Couch only does while parked). The file's mtime is the registry's
+version: the dashboard updates carry the version the control loop is
+running, and the screen and web dashboard follow it with for_version()
+rather than picking up edits on their own.
+"""
+import logging
+import os
+import re
+import time
+import tomllib
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from logging_setup import fields, rate_limited
+from motion_profile import MotionLimits
+
+MODES_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "speed_modes.toml")
+# How often reload_if_changed() and for_version() actually look at the file
+RELOAD_CHECK_INTERVAL = 1.0
+
+BEHAVIOR_STOP = 0
+BEHAVIOR_COAST = 1
+BEHAVIOR_DRIVE = 2
+BEHAVIORS = {"stop": BEHAVIOR_STOP, "coast": BEHAVIOR_COAST, "drive": BEHAVIOR_DRIVE}
+
+# Names travel through the shared-memory telemetry ring in a fixed 16 byte field
+MAX_NAME_LENGTH = 16
+DEFAULT_CURVE = 2.0
+DEFAULT_COLOR = "#00DFA2"
+# Hex colors only, which both Tk and the web dashboard understand
+COLOR_PATTERN = re.compile(r"#(?:[0-9A-Fa-f]{3}){1,2}")
+# Stop and coast modes ignore the motion profile, this only keeps the arrays dense
+_NO_PROFILE = MotionLimits(accel=0.0, decel=0.0, jerk=0.0)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModeDefinition:
+    index: int
+    name: str
+    label: str
+    color: str
+    behavior: int
+    multiplier: float
+    curve: float
+    limits: MotionLimits
+    buttons: Tuple[str, ...]
+
+
+class ModeRegistry:
+    def __init__(self, modes: Tuple[ModeDefinition, ...], path: Optional[str] = None, mtime: float = 0.0):
+        self.modes = modes
+        self.path = path
+        self.mtime = mtime
+        self._next_check = time.monotonic() + RELOAD_CHECK_INTERVAL
+
+        # Parallel arrays for the control loop, indexed by mode
+        self.names: Tuple[str, ...] = tuple(mode.name for mode in modes)
+        self.behaviors: Tuple[int, ...] = tuple(mode.behavior for mode in modes)
+        self.multipliers: Tuple[float, ...] = tuple(mode.multiplier for mode in modes)
+        self.curves: Tuple[float, ...] = tuple(mode.curve for mode in modes)
+        self.limits: Tuple[MotionLimits, ...] = tuple(mode.limits for mode in modes)
+        # (button, mode index) in priority order
+        self.bindings: Tuple[Tuple[str, int], ...] = tuple(
+            (button, mode.index) for mode in modes for button in mode.buttons
+        )
+        self._indices = {name: i for i, name in enumerate(self.names)}
+        self.initial_index = self.behaviors.index(BEHAVIOR_STOP)
+
+    def __len__(self) -> int:
+        return len(self.modes)
+
+    def index(self, name: str) -> int:
+        return self._indices[name]
+
+    def get(self, name: str) -> Optional[ModeDefinition]:
+        index = self._indices.get(name)
+        return None if index is None else self.modes[index]
+
+    def drive_modes(self) -> Tuple[ModeDefinition, ...]:
+        return tuple(mode for mode in self.modes if mode.behavior == BEHAVIOR_DRIVE)
+
+    def reload_if_changed(self) -> "Optional[ModeRegistry]":
+        """Returns a freshly loaded registry if the config file changed, otherwise None.
+
+        Cheap enough to call every tick: the file is only checked once per
+        RELOAD_CHECK_INTERVAL. A broken edit is logged and ignored.
+        """
+        if self.path is None:
+            return None
+        now = time.monotonic()
+        if now < self._next_check:
+            return None
+        self._next_check = now + RELOAD_CHECK_INTERVAL
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            logger.warning("Cannot read speed mode config", extra=rate_limited(path=self.path, error=e))
+            return None
+        if mtime == self.mtime:
+            return None
+        try:
+            registry = load_modes(self.path)
+        except (OSError, ValueError) as e:
+            # Don't retry the same broken file every second
+            self.mtime = mtime
+            logger.warning("Ignoring invalid speed mode config", extra=fields(path=self.path, error=e))
+            return None
+        logger.info("Reloaded speed modes", extra=fields(path=self.path, modes=",".join(registry.names)))
+        return registry
+
+    def for_version(self, version: Optional[float]) -> "Optional[ModeRegistry]":
+        """Returns the registry the control loop reports running as version, if it differs from this one.
+
+        None if this one already is, or if the file has been edited again
+        since the control loop loaded it. In that case the control loop will
+        announce a newer version once it switches. Checks the file at most
+        once per RELOAD_CHECK_INTERVAL.
+        """
+        if version is None or version == self.mtime or self.path is None:
+            return None
+        now = time.monotonic()
+        if now < self._next_check:
+            return None
+        self._next_check = now + RELOAD_CHECK_INTERVAL
+        try:
+            registry = load_modes(self.path)
+        except (OSError, ValueError) as e:
+            logger.warning("Cannot load the control loop's speed modes", extra=rate_limited(path=self.path, error=e))
+            return None
+        return registry if registry.mtime == version else None
+
+
+def _compile(index: int, entry: dict) -> ModeDefinition:
+    try:
+        name = entry["name"]
+        behavior = BEHAVIORS[entry.get("behavior", "drive")]
+        if behavior == BEHAVIOR_DRIVE:
+            limits = MotionLimits(accel=float(entry["accel"]), decel=float(entry["decel"]), jerk=float(entry["jerk"]))
+        else:
+            limits = _NO_PROFILE
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Speed mode {index} is missing or has an invalid {e}") from None
+    if behavior == BEHAVIOR_DRIVE and min(limits.accel, limits.decel, limits.jerk) <= 0:
+        raise ValueError(f"Speed mode {name!r} needs positive accel, decel and jerk")
+    multiplier = float(entry.get("multiplier", 0.0))
+    if not 0.0 <= multiplier <= 1.0:
+        raise ValueError(f"Speed mode {name!r} needs a multiplier between 0 and 1")
+    curve = float(entry.get("curve", DEFAULT_CURVE))
+    # 0 would drive a centered stick at full speed, and below that it divides by zero
+    if not curve > 0:
+        raise ValueError(f"Speed mode {name!r} needs a positive curve")
+    color = entry.get("color", DEFAULT_COLOR)
+    # Tk raises on a color it doesn't know, from inside the screen's event loop
+    if not isinstance(color, str) or not COLOR_PATTERN.fullmatch(color):
+        raise ValueError(f"Speed mode {name!r} needs color to be a hex color like \"#00DFA2\"")
+    buttons = entry.get("buttons", [])
+    # A bare string would otherwise bind one button per character
+    if not isinstance(buttons, list) or not all(isinstance(button, str) for button in buttons):
+        raise ValueError(f"Speed mode {name!r} needs buttons to be a list of names")
+    return ModeDefinition(
+        index=index,
+        name=name,
+        label=entry.get("label", name.capitalize()),
+        color=color,
+        behavior=behavior,
+        multiplier=multiplier,
+        curve=curve,
+        limits=limits,
+        buttons=tuple(buttons),
+    )
+
+
+def load_modes(path: str = MODES_CONFIG) -> ModeRegistry:
+    """Parses and validates a speed mode config. Raises ValueError if it is unusable."""
+    mtime = os.stat(path).st_mtime
+    with open(path, "rb") as f:
+        try:
+            config = tomllib.load(f)
+        except tomllib.TOMLDecodeError as e:
+            raise ValueError(str(e)) from None
+    modes = tuple(_compile(i, entry) for i, entry in enumerate(config.get("mode", [])))
+    names = [mode.name for mode in modes]
+    if len(set(names)) != len(names):
+        raise ValueError("Speed mode names must be unique")
+    if any(len(name.encode()) > MAX_NAME_LENGTH for name in names):
+        raise ValueError(f"Speed mode names are limited to {MAX_NAME_LENGTH} bytes")
+    if not any(mode.behavior == BEHAVIOR_STOP for mode in modes):
+        raise ValueError("At least one speed mode needs behavior = \"stop\"")
+    # Recordings store the mode index in one byte
+    if len(modes) > 255:
+        raise ValueError("Too many speed modes")
+    return ModeRegistry(modes, path, mtime)
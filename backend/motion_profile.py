@@ -0,0 +1,144 @@
+"""Jerk-limited S-curve ramps for the wheel commands, with limits per speed mode.
+
+Each wheel follows its commanded speed through a profile with separate
+acceleration, deceleration and jerk limits. The acceleration itself ramps at
+the jerk limit, which gives the S-shaped velocity curve, and it starts
+easing off early enough, counted in whole ticks, to land on the target with
+at most one jerk step of acceleration left, so no tick ever changes the
+acceleration by more than the jerk limit allows. Every tick does the same
+constant amount of work regardless of how far away the target is.
+
+Speeds are in the normalized [-1.0..1.0] wheel units that set_rpm takes,
+after the speed-mode multiplier, so chill's limits are relative to the
+couch's real top speed, not to chill's. The limits for each mode live in
+speed_modes.toml.
+
+Run `python motion_profile.py` to print step responses, or add --csv for
+data to plot.
+"""
+import math
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class MotionLimits:
+    accel: float  # per second, while speeding up
+    decel: float  # per second, while slowing down
+    jerk: float  # per second squared
+
+
+
+class SCurveProfile:
+    """Velocity and acceleration state of one wheel."""
+
+    def __init__(self):
+        self.velocity = 0.0
+        self.acceleration = 0.0
+
+    def reset(self, velocity: float = 0.0):
+        """Jumps to a known speed, e.g. whatever the wheel is doing after coasting in neutral."""
+        self.velocity = velocity
+        self.acceleration = 0.0
+
+    def update(self, target: float, limits: MotionLimits, dt: float) -> float:
+        velocity = self.velocity
+        error = target - velocity
+        if error == 0.0 and self.acceleration == 0.0:
+            return velocity
+
+        # Moving away from standstill uses the accel limit, anything else is braking
+        speeding_up = abs(target) > abs(velocity) and target * velocity >= 0
+        limit = limits.accel if speeding_up else limits.decel
+        # The fastest acceleration that can still be eased off, one jerk-limited step per
+        # tick, before reaching the target: n steps, where the ramp down n, n - 1, ..., 1
+        # covers n (n + 1) / 2 steps of dt each without passing |error|
+        max_step = limits.jerk * dt
+        steps = math.floor((math.sqrt(1.0 + 8.0 * abs(error) / (dt * max_step)) - 1.0) / 2.0)
+        reachable = max(1, steps) * max_step
+        desired = math.copysign(min(limit, reachable), error)
+
+        acceleration = self.acceleration
+        if desired > acceleration + max_step:
+            acceleration += max_step
+        elif desired < acceleration - max_step:
+            acceleration -= max_step
+        else:
+            acceleration = desired
+
+        velocity += acceleration * dt
+        if (target - velocity) * error <= 0:
+            # Reached or crossed the target this tick. The plan above leaves at most one step of
+            # acceleration here. More only if the target jumped, and that is eased off a step per tick.
+            velocity = target
+            previous = self.acceleration
+            acceleration = 0.0 if abs(previous) <= max_step else previous - math.copysign(max_step, previous)
+        self.velocity = velocity
+        self.acceleration = acceleration
+        return velocity
+
+
+class MotionProfiler:
+    """Profiles both wheels with the limits of the current speed mode."""
+
+    def __init__(self):
+        self.left = SCurveProfile()
+        self.right = SCurveProfile()
+        self._last_time = time.monotonic()
+
+    def reset(self, left: float = 0.0, right: float = 0.0):
+        self.left.reset(left)
+        self.right.reset(right)
+        self._last_time = time.monotonic()
+
+    def update(self, left: float, right: float, limits: MotionLimits,
+               dt: Optional[float] = None) -> Tuple[float, float]:
+        now = time.monotonic()
+        if dt is None:
+            dt = min(now - self._last_time, 0.25)
+        self._last_time = now
+        return self.left.update(left, limits, dt), self.right.update(right, limits, dt)
+
+
+def simulate(targets: Sequence[float], limits: MotionLimits, dt: float,
+             initial: float = 0.0) -> List[Tuple[float, float, float]]:
+    """Batch mode: runs a profile over a sequence of per-tick targets and returns (time, velocity, acceleration)."""
+    profile = SCurveProfile()
+    profile.reset(initial)
+    samples = []
+    for tick, target in enumerate(targets):
+        velocity = profile.update(target, limits, dt)
+        samples.append(((tick + 1) * dt, velocity, profile.acceleration))
+    return samples
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from mode_registry import load_modes
+
+    parser = argparse.ArgumentParser(description="Step responses of the per-mode motion profiles")
+    parser.add_argument("--csv", action="store_true", help="print every sample as CSV for plotting")
+    parser.add_argument("--dt", type=float, default=0.05, help="tick length in seconds")
+    args = parser.parse_args()
+
+    # Full stick from standstill for 6 s, then release
+    ticks = int(6 / args.dt)
+    if args.csv:
+        print("mode,time,velocity,acceleration")
+    for mode in load_modes().drive_modes():
+        limits = mode.limits
+        # Full stick scaled by the mode's multiplier, as the couch sees it
+        top = mode.multiplier
+        samples = simulate([top] * ticks + [0.0] * ticks, limits, args.dt)
+        if args.csv:
+            for t, velocity, acceleration in samples:
+                print(f"{mode.name},{t:.3f},{velocity:.5f},{acceleration:.5f}")
+            continue
+        reached = next(t for t, velocity, _ in samples if velocity >= top)
+        stopped = next(t for t, velocity, _ in samples[ticks:] if velocity <= 0) - ticks * args.dt
+        peak_jerk = max(abs(b[2] - a[2]) for a, b in zip([(0.0, 0.0, 0.0)] + samples, samples)) / args.dt
+        print(f"{mode.name:>8}: 0 -> {top:.2f} in {reached:.2f} s, back to 0 in {stopped:.2f} s,"
+              f" peak jerk {peak_jerk:.2f}/s^2 (limit {limits.jerk})")
+        assert peak_jerk <= limits.jerk * (1 + 1e-9), f"{mode.name} exceeds its jerk limit"
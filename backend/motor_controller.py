@@ -1,21 +1,112 @@
-from pyvesc import VESC, encode, encode_request  # pyright: ignore[reportMissingImports]
-from pyvesc.VESC.messages import SetCurrent, SetRPM, GetValues  # pyright: ignore[reportMissingImports]
+import time
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from pyvesc import encode, encode_request  # pyright: ignore[reportMissingImports]
+from pyvesc.VESC.messages import SetCurrent, SetDutyCycle, SetRPM, GetValues  # pyright: ignore[reportMissingImports]
 from mathutils import map_range
+from serial_scheduler import Priority, SerialScheduler
+from vesc_protocol import GetValuesSelective
+
+if TYPE_CHECKING:
+    from trim import WheelTrim
+
+# Commands are quantized before deduplication so sensor noise in the stick
+# doesn't defeat it. 20 eRPM is well below anything you can feel on the couch.
+RPM_QUANTUM = 20
+CURRENT_QUANTUM = 1
+
+# Resend an unchanged command at least this often. The VESC app timeout
+# (default 1 s) stops the motor if no command arrives, and the CAN-forwarded
+# controller doesn't see the parent's heartbeat, so stay well inside it.
+KEEPALIVE_INTERVAL = 0.25
+
+
+class CommandShaper:
+    """Drops motor commands that repeat the last value sent, resending them only as keepalives."""
+
+    def __init__(self, keepalive_interval: float = KEEPALIVE_INTERVAL):
+        self.keepalive_interval = keepalive_interval
+        self.frames_sent = 0
+        self.frames_skipped = 0
+
+        self._last_kind = None
+        self._last_value = None
+        self._last_sent_time = 0.0
+
+    def should_send(self, kind: str, value: int) -> bool:
+        """Returns True if a command of this kind and quantized value needs to go out now."""
+        now = time.monotonic()
+        if (
+            kind == self._last_kind
+            and value == self._last_value
+            and now - self._last_sent_time < self.keepalive_interval
+        ):
+            self.frames_skipped += 1
+            return False
+        self._last_kind = kind
+        self._last_value = value
+        self._last_sent_time = now
+        self.frames_sent += 1
+        return True
+
+    def reset(self):
+        """Forces the next command out regardless of what was sent before."""
+        self._last_kind = None
+        self._last_value = None
+
+
+def quantize(value: int, quantum: int) -> int:
+    return int(round(value / quantum)) * quantum
 
 
 class MotorController:
     """Sets the speed of the motor, from -1 to 1."""
 
+    scheduler: SerialScheduler
+
+    def __init__(self):
+        self.shaper = CommandShaper()
+        # Full-scale ERPM. Starts at the class default and can be retuned while running.
+        self.max_rpm = VESCMotorController.MAX_RPM
+        # Learned correction for this wheel's RPM tracking, see trim.py
+        self.trim: Optional["WheelTrim"] = None
+        # The last RPM command, as a speed and as the ERPM sent, or None after a current command
+        self.last_speed: Optional[float] = None
+        self.last_rpm = 0
+
     def speed_to_rpm(self, speed: float):
-        return int(map_range(speed, -1, 1, -VESCMotorController.MAX_RPM, VESCMotorController.MAX_RPM))
+        rpm = map_range(speed, -1, 1, -self.max_rpm, self.max_rpm)
+        trim = self.trim
+        if trim is not None:
+            rpm = max(-self.max_rpm, min(self.max_rpm, trim.correct(rpm)))
+        return int(rpm)
 
     def speed_to_current(self, speed: float):
         return int(map_range(speed, -1, 1, -VESCMotorController.MAX_CURRENT, VESCMotorController.MAX_CURRENT))
-    
+
     def set_rpm(self, speed: float):
-        raise NotImplementedError
+        rpm = quantize(self.speed_to_rpm(speed), RPM_QUANTUM)
+        self.last_speed = speed
+        self.last_rpm = rpm
+        if self.shaper.should_send("rpm", rpm):
+            self._send_rpm(rpm)
 
     def set_current(self, speed: float):
+        current = quantize(self.speed_to_current(speed), CURRENT_QUANTUM)
+        self.last_speed = None
+        if self.shaper.should_send("current", current):
+            self._send_current(current)
+
+    def stop(self):
+        """Cuts motor current immediately, ahead of any queued commands or telemetry."""
+        self.shaper.reset()
+        self.last_speed = None
+        self._send_current(0, Priority.SAFETY_STOP)
+
+    def _send_rpm(self, rpm: int):
+        raise NotImplementedError
+
+    def _send_current(self, current: int, priority: Priority = Priority.COMMAND):
         raise NotImplementedError
 
     def get_measurements(self):
@@ -26,52 +117,74 @@ class VESCMotorController(MotorController):
     MAX_RPM = 20000
     MAX_CURRENT = 20
 
-    def __init__(self, motor: VESC):
-        self.motor = motor
+    def __init__(self, scheduler: SerialScheduler, telemetry_fields: Optional[Sequence[str]] = None):
+        """
+        Args:
+            scheduler: Scheduler owning the serial port this VESC is on.
+            telemetry_fields: GetValues fields get_measurements should return. When given, only
+                those are requested with COMM_GET_VALUES_SELECTIVE. Otherwise all of them are.
+        """
+        super().__init__()
+        self.scheduler = scheduler
+        scheduler.failure_callbacks.append(self.shaper.reset)
+        self.motor = scheduler.vesc
+        self._selective = GetValuesSelective(telemetry_fields) if telemetry_fields else None
+        msg = GetValues()
+        self._get_values_msg = encode_request(msg)
+        self._get_values_msg_expected_length = msg._full_msg_size
 
-    def set_rpm(self, speed: float):
-        rpm = self.speed_to_rpm(speed)
-        self.motor.set_rpm(rpm)
+    def _send_rpm(self, rpm: int):
+        self.scheduler.send(encode(SetRPM(rpm)))
 
-    def set_current(self, speed: float):
-        current = self.speed_to_current(speed)
-        self.motor.set_current(current)
+    def _send_current(self, current: int, priority: Priority = Priority.COMMAND):
+        self.scheduler.send(encode(SetCurrent(current)), priority)
 
     def get_measurements(self):
-        return self.motor.get_measurements()
-    
+        if self._selective is not None:
+            return self.scheduler.request(
+                self._selective.request, self._selective.reply_length, decoder=self._selective.decode
+            )
+        return self.scheduler.request(self._get_values_msg, self._get_values_msg_expected_length)
+
     def set_duty_cycle(self, duty_cycle: float):
-        self.motor.set_duty_cycle(duty_cycle)    
+        self.shaper.reset()
+        self.last_speed = None
+        self.scheduler.send(encode(SetDutyCycle(duty_cycle)))
 
     def __del__(self):
         # Stop the heartbeat to prevent the motor from spinning
-        self.motor.stop_heartbeat()
+        self.scheduler.stop_heartbeat()
 
 
 class CanVESC(MotorController):
-    def __init__(self, parent_vesc: VESC, can_id: int):
-        self.parent_vesc = parent_vesc
+    def __init__(self, scheduler: SerialScheduler, can_id: int, telemetry_fields: Optional[Sequence[str]] = None):
+        super().__init__()
+        self.scheduler = scheduler
+        scheduler.failure_callbacks.append(self.shaper.reset)
         self.can_id = can_id
+        self._selective = GetValuesSelective(telemetry_fields, can_id=can_id) if telemetry_fields else None
         msg = GetValues(can_id=can_id)
         self._get_values_msg = encode_request(msg)
         self._get_values_msg_expected_length = msg._full_msg_size
 
-    def set_rpm(self, speed: float):
-        rpm = self.speed_to_rpm(speed)
+    def _send_rpm(self, rpm: int):
         packet = encode(SetRPM(rpm, can_id=self.can_id))
-        self.parent_vesc.write(packet)
+        self.scheduler.send(packet)
 
-    def set_current(self, speed: float):
-        current = self.speed_to_current(speed)
+    def _send_current(self, current: int, priority: Priority = Priority.COMMAND):
         packet = encode(SetCurrent(current, can_id=self.can_id))
-        self.parent_vesc.write(packet)
+        self.scheduler.send(packet, priority)
 
     def set_duty_cycle(self, duty_cycle: float):
         raise NotImplementedError
 
     def get_measurements(self):
-        return self.parent_vesc.write(self._get_values_msg, num_read_bytes=self._get_values_msg_expected_length)
+        if self._selective is not None:
+            return self.scheduler.request(
+                self._selective.request, self._selective.reply_length, decoder=self._selective.decode
+            )
+        return self.scheduler.request(self._get_values_msg, self._get_values_msg_expected_length)
 
     def __del__(self):
         # Stop the heartbeat to prevent the motor from spinning
-        self.parent_vesc.stop_heartbeat()
+        self.scheduler.stop_heartbeat()
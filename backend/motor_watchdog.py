@@ -0,0 +1,120 @@
+"""Failsafe that stops the motors if the control loop stops ticking.
+
+The watchdog runs in its own process, so a control thread stuck in a serial
+read or starved of the GIL can't hold it up. It opens its own file descriptor
+to the VESC port and watches a tick counter in shared memory. If the counter
+stops moving for longer than the timeout, it writes SetCurrent(0) to every
+motor, and keeps doing so until the control loop ticks again.
+
+Each stop frame is a single small write, which the tty layer won't interleave
+with the control process's own writes. The port's settings are left alone:
+pyserial already made it raw, and changing them would flush a reply the
+control process is in the middle of reading.
+
+`python -m benchmarks.watchdog_reaction` checks the reaction time against a fake VESC.
+"""
+import ctypes
+import multiprocessing
+import os
+import time
+from typing import Optional, Sequence
+
+from vesc_protocol import encode_set_current
+
+WATCHDOG_TIMEOUT = 0.25
+WATCHDOG_POLL_INTERVAL = 0.01
+# While tripped, repeat the stop this often in case a stale command slips in
+WATCHDOG_REPEAT_INTERVAL = 0.1
+WATCHDOG_PRIORITY = 50
+
+
+def _raise_priority():
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(WATCHDOG_PRIORITY))
+    except (AttributeError, OSError):
+        # Not Linux or not allowed to use real-time scheduling, do the best we can
+        try:
+            os.nice(-10)
+        except OSError:
+            pass
+
+
+def _watch(port_path: str, can_ids: Sequence[int], ticks, stop_event, trip_count, last_reaction,
+           timeout: float, poll_interval: float):
+    _raise_priority()
+    fd = os.open(port_path, os.O_RDWR | os.O_NOCTTY)
+    stop_frames = [encode_set_current(0)] + [encode_set_current(0, can_id) for can_id in can_ids]
+
+    last_ticks = ticks.value
+    last_change = time.monotonic()
+    tripped = False
+    next_repeat = 0.0
+    try:
+        while not stop_event.wait(poll_interval):
+            now = time.monotonic()
+            current_ticks = ticks.value
+            if current_ticks != last_ticks:
+                last_ticks = current_ticks
+                last_change = now
+                tripped = False
+                continue
+            # Not armed until the control loop has ticked at least once
+            if current_ticks == 0 or now - last_change < timeout:
+                continue
+            if not tripped or now >= next_repeat:
+                for stop_frame in stop_frames:
+                    os.write(fd, stop_frame)
+                if not tripped:
+                    tripped = True
+                    trip_count.value += 1
+                    last_reaction.value = time.monotonic() - last_change
+                next_repeat = now + WATCHDOG_REPEAT_INTERVAL
+    finally:
+        os.close(fd)
+
+
+class Watchdog:
+    """Handle used by the control loop: start it once the port is known, then kick it every tick."""
+
+    def __init__(self, port_path: str, can_ids: Sequence[int] = (), timeout: float = WATCHDOG_TIMEOUT,
+                 poll_interval: float = WATCHDOG_POLL_INTERVAL):
+        self.port_path = port_path
+        self.can_ids = tuple(can_ids)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+        # Spawn rather than fork, the parent has serial and UI threads running
+        self._context = multiprocessing.get_context("spawn")
+        self._ticks = self._context.Value(ctypes.c_uint64, 0, lock=False)
+        self._trip_count = self._context.Value(ctypes.c_uint32, 0, lock=False)
+        self._last_reaction = self._context.Value(ctypes.c_double, 0.0, lock=False)
+        self._stop_event = self._context.Event()
+        self._process: Optional[multiprocessing.process.BaseProcess] = None
+
+    def start(self):
+        self._process = self._context.Process(
+            target=_watch,
+            args=(self.port_path, self.can_ids, self._ticks, self._stop_event, self._trip_count,
+                  self._last_reaction, self.timeout, self.poll_interval),
+            daemon=True,
+        )
+        self._process.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._process is not None:
+            self._process.join(timeout=1)
+
+    def kick(self):
+        """Marks a completed control-loop tick. Only the control thread calls this, so no lock is needed."""
+        self._ticks.value += 1
+
+    @property
+    def trip_count(self) -> int:
+        return self._trip_count.value
+
+    @property
+    def last_reaction(self) -> float:
+        """Seconds from the last tick to the first stop frame of the most recent trip."""
+        return self._last_reaction.value
+
@@ -0,0 +1,176 @@
+"""Wheel odometry: where the couch is, which way it faces and how far it went.
+
+Each VESC counts commutation steps in its tachometer, six per electrical
+revolution, signed by direction. Every tick the change in both wheels'
+counts is turned into wheel travel and integrated as a differential drive:
+the mean of the two is the distance moved along the heading, their
+difference over the track width the turn. That is a handful of float
+operations per tick whatever the trip length.
+
+The counters are 32-bit and wrap, so deltas are taken modulo 2**32. A jump
+several times larger than a wheel at the RPM ceiling could make in the time
+since the last read means a controller rebooted and started counting from
+zero again, and is skipped rather than integrated. Because the limit grows
+with the gap, travel during a stretch of failed telemetry still counts.
+
+Wheel diameter and track width are calibrated with `python odometry.py`
+(see --help) and kept in ~/.config/couch/odometry.json. Until then the
+nominal values below are used.
+"""
+import json
+import logging
+import math
+import os
+import time
+from typing import Optional, Tuple
+
+from logging_setup import fields
+from tuning import MAX_RPM_CEILING
+
+# Drivetrain
+POLE_PAIRS = 6
+MOTOR_PULLEY = 16
+WHEEL_PULLEY = 72
+TACHOMETER_STEPS_PER_EREV = 6
+WHEEL_DIAMETER_M = 8 * 0.0254
+# Between the centers of the two drive wheels' contact patches
+TRACK_WIDTH_M = 0.74
+
+METERS_PER_MILE = 1609.344
+SECONDS_PER_HOUR = 3600.0
+# Wheel mph per motor ERPM, at the nominal wheel diameter
+MPH_PER_ERPM = (MOTOR_PULLEY / WHEEL_PULLEY) / POLE_PAIRS * math.pi * WHEEL_DIAMETER_M \
+    * 60 / METERS_PER_MILE
+
+# Tachometer steps per second of a wheel at the highest max_rpm tuning allows
+STEPS_PER_SECOND_AT_CEILING = MAX_RPM_CEILING / 60 * TACHOMETER_STEPS_PER_EREV
+# A delta counts as a reboot beyond this many times what the ceiling allows since the last read,
+# taking reads closer together than MIN_JUMP_WINDOW as that far apart so tick jitter can't trip it
+JUMP_MARGIN = 4.0
+MIN_JUMP_WINDOW = 0.1
+
+ODOMETRY_PATH = os.path.join(os.path.expanduser("~"), ".config", "couch", "odometry.json")
+
+logger = logging.getLogger(__name__)
+
+
+def erpm_to_mph(erpm: float, wheel_diameter: float = WHEEL_DIAMETER_M) -> float:
+    return erpm * MPH_PER_ERPM * (wheel_diameter / WHEEL_DIAMETER_M)
+
+
+def tachometer_delta(now: int, last: int) -> int:
+    """Signed steps from last to now, across a 32-bit wrap."""
+    return (now - last + 0x80000000) % 0x100000000 - 0x80000000
+
+
+def load_geometry(path: str = ODOMETRY_PATH) -> Tuple[float, float]:
+    """(wheel diameter, track width) in meters, calibrated or nominal."""
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+        return float(saved["wheel_diameter_m"]), float(saved["track_width_m"])
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning("Ignoring unreadable odometry calibration", extra=fields(path=path, error=e))
+    return WHEEL_DIAMETER_M, TRACK_WIDTH_M
+
+
+def save_geometry(wheel_diameter: float, track_width: float, path: str = ODOMETRY_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump({"wheel_diameter_m": wheel_diameter, "track_width_m": track_width}, f, indent=2)
+    os.replace(temporary, path)
+
+
+class Odometry:
+    """Pose (x, y in meters, heading in radians, counterclockwise) and trip distance from tachometer counts.
+
+    Starts at the origin facing +x. Forward counts are positive on both wheels.
+    """
+
+    def __init__(self, wheel_diameter: float = WHEEL_DIAMETER_M, track_width: float = TRACK_WIDTH_M):
+        self.wheel_diameter = wheel_diameter
+        self.track_width = track_width
+        self.meters_per_step = math.pi * wheel_diameter * (MOTOR_PULLEY / WHEEL_PULLEY) \
+            / (POLE_PAIRS * TACHOMETER_STEPS_PER_EREV)
+        self.x = 0.0
+        self.y = 0.0
+        self.heading = 0.0
+        self.trip_meters = 0.0
+        self._last: Optional[Tuple[int, int]] = None
+        self._last_time = 0.0
+
+    @classmethod
+    def calibrated(cls, path: str = ODOMETRY_PATH) -> "Odometry":
+        return cls(*load_geometry(path))
+
+    @property
+    def trip_miles(self) -> float:
+        return self.trip_meters / METERS_PER_MILE
+
+    def reset(self):
+        """Back to the origin with a new trip. The next update only sets the reference counts."""
+        self.x = self.y = self.heading = self.trip_meters = 0.0
+        self._last = None
+
+    def update(self, left_tachometer: int, right_tachometer: int, now: Optional[float] = None):
+        """Integrates the counts read at now, on time.monotonic(), which defaults to the current time."""
+        if now is None:
+            now = time.monotonic()
+        last, last_time = self._last, self._last_time
+        self._last = (left_tachometer, right_tachometer)
+        self._last_time = now
+        if last is None:
+            return
+        left_steps = tachometer_delta(left_tachometer, last[0])
+        right_steps = tachometer_delta(right_tachometer, last[1])
+        max_steps = STEPS_PER_SECOND_AT_CEILING * JUMP_MARGIN * max(now - last_time, MIN_JUMP_WINDOW)
+        if abs(left_steps) > max_steps or abs(right_steps) > max_steps:
+            logger.warning("Tachometer jumped, skipping", extra=fields(left=left_steps, right=right_steps))
+            return
+        left = left_steps * self.meters_per_step
+        right = right_steps * self.meters_per_step
+        distance = (left + right) * 0.5
+        turn = (right - left) / self.track_width
+        # Moving along the mean heading over the tick is exact for a constant-curvature arc to second order
+        middle = self.heading + turn * 0.5
+        self.x += distance * math.cos(middle)
+        self.y += distance * math.sin(middle)
+        heading = self.heading + turn
+        if heading > math.pi:
+            heading -= 2 * math.pi
+        elif heading <= -math.pi:
+            heading += 2 * math.pi
+        self.heading = heading
+        self.trip_meters += abs(distance)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Odometry calibration. Reset the trip, drive, then tell it what really happened.")
+    parser.add_argument("--path", default=ODOMETRY_PATH)
+    subparsers = parser.add_subparsers(dest="cmd", required=True)
+    subparsers.add_parser("show", help="print the wheel diameter and track width in use")
+    diameter_parser = subparsers.add_parser(
+        "diameter", help="scale the wheel diameter from a straight run: odometer trip vs tape-measured distance")
+    diameter_parser.add_argument("reported", type=float, help="meters the odometry reported")
+    diameter_parser.add_argument("measured", type=float, help="meters actually driven")
+    track_parser = subparsers.add_parser(
+        "track", help="scale the track width from spinning in place: reported vs actual turns")
+    track_parser.add_argument("reported", type=float, help="turns the odometry heading reported")
+    track_parser.add_argument("actual", type=float, help="turns the couch actually made")
+    args = parser.parse_args()
+
+    wheel_diameter, track_width = load_geometry(args.path)
+    if args.cmd == "diameter":
+        wheel_diameter *= args.measured / args.reported
+        save_geometry(wheel_diameter, track_width, args.path)
+    elif args.cmd == "track":
+        # A wider track turns less per step of wheel difference
+        track_width *= args.reported / args.actual
+        save_geometry(wheel_diameter, track_width, args.path)
+    print(f"wheel diameter {wheel_diameter * 1000:.1f} mm, track width {track_width * 1000:.0f} mm")
@@ -0,0 +1,110 @@
+"""Electrical power and energy accounting from the motor controllers' telemetry.
+
+Power is battery side: v_in times avg_input_current, signed, so it goes
+negative while regenerative braking pushes current back into the pack.
+"""
+import time
+from typing import Optional
+
+# Long enough to steady the dial, short enough to still feel live
+POWER_WINDOW_SECONDS = 1.0
+# Slots in the rolling window ring. Covers the window at the control loop's tick rate with room to spare.
+POWER_WINDOW_SLOTS = 64
+
+
+def electrical_power(measurements) -> float:
+    """Signed battery-side power in watts for one controller. Negative while regenerating."""
+    return measurements.v_in * measurements.avg_input_current
+
+
+class RollingPower:
+    """Time-weighted average power over the last window_seconds, with O(1) updates.
+
+    Samples go into a fixed ring along with running sums of energy and time.
+    The oldest samples are dropped from the sums as they age out of the window.
+    """
+
+    def __init__(self, window_seconds: float = POWER_WINDOW_SECONDS, slots: int = POWER_WINDOW_SLOTS):
+        self.window_seconds = window_seconds
+        self.slots = slots
+        self._energy = [0.0] * slots  # watt-seconds per sample
+        self._duration = [0.0] * slots
+        self._head = 0  # next slot to write
+        self._count = 0
+        self._energy_sum = 0.0
+        self._duration_sum = 0.0
+
+    def add(self, watts: float, dt: float):
+        if self._count == self.slots:
+            self._drop_oldest()
+        slot = self._head
+        self._energy[slot] = watts * dt
+        self._duration[slot] = dt
+        self._energy_sum += watts * dt
+        self._duration_sum += dt
+        self._head = (slot + 1) % self.slots
+        self._count += 1
+        # Each sample is dropped at most once, so this stays amortized O(1)
+        while self._count > 1 and self._duration_sum - self._duration[self._oldest()] >= self.window_seconds:
+            self._drop_oldest()
+        if self._count == 1:
+            # Resync the running sums so float error cannot accumulate forever
+            self._energy_sum = self._energy[slot]
+            self._duration_sum = dt
+
+    def _oldest(self) -> int:
+        return (self._head - self._count) % self.slots
+
+    def _drop_oldest(self):
+        oldest = self._oldest()
+        self._energy_sum -= self._energy[oldest]
+        self._duration_sum -= self._duration[oldest]
+        self._count -= 1
+
+    @property
+    def watts(self) -> float:
+        if self._duration_sum <= 0:
+            return 0.0
+        return self._energy_sum / self._duration_sum
+
+
+class PowerMeter:
+    """Tracks instantaneous and averaged pack power and the energy used and recovered this session."""
+
+    def __init__(self, window_seconds: float = POWER_WINDOW_SECONDS):
+        self.rolling = RollingPower(window_seconds)
+        self.left_watts = 0.0
+        self.right_watts = 0.0
+        self.wh_consumed = 0.0
+        self.wh_regenerated = 0.0
+        self._last_time = time.monotonic()
+
+    @property
+    def watts(self) -> float:
+        return self.left_watts + self.right_watts
+
+    @property
+    def average_watts(self) -> float:
+        return self.rolling.watts
+
+    @property
+    def wh_net(self) -> float:
+        return self.wh_consumed - self.wh_regenerated
+
+    def update(self, measurements_left, measurements_right, dt: Optional[float] = None):
+        """Feeds one tick of measurements (anything with v_in and avg_input_current)."""
+        now = time.monotonic()
+        if dt is None:
+            # Longer gaps mean telemetry was lost, don't integrate across them
+            dt = min(now - self._last_time, 1.0)
+        self._last_time = now
+
+        self.left_watts = electrical_power(measurements_left)
+        self.right_watts = electrical_power(measurements_right)
+        watts = self.left_watts + self.right_watts
+        watt_hours = watts * dt / 3600
+        if watt_hours >= 0:
+            self.wh_consumed += watt_hours
+        else:
+            self.wh_regenerated -= watt_hours
+        self.rolling.add(watts, dt)
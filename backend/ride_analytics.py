@@ -0,0 +1,165 @@
+"""Offline analysis of ride recordings made with main.py --record, or archives made from them.
+
+Recordings are memory-mapped as NumPy structured arrays of column blocks and
+every statistic is a vectorized pass over just the columns it needs, so a day
+of 100 Hz telemetry is summarized in a fraction of a second.
+
+Usage, from backend/:
+    python ride_analytics.py recordings/ride-*.couchrec
+    python ride_analytics.py --json recordings/ride-20250101-120000.coucharc
+"""
+import argparse
+import json
+import os
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+
+from telemetry_archive import MAGIC as ARCHIVE_MAGIC, TelemetryArchive
+from telemetry_recorder import BLOCK_COUNT_FORMAT, read_header
+
+# Same as VESCMotorController.MAX_CURRENT, duplicated so the tool runs without pyvesc
+CURRENT_LIMIT = 20.0
+# A motor counts as saturated once it is within this fraction of the limit
+SATURATION_FRACTION = 0.95
+# Gaps longer than this between records are treated as the couch being off, not driving
+MAX_GAP_SECONDS = 1.0
+JITTER_PERCENTILES = (50, 90, 99, 99.9)
+# Jitter is histogrammed at this resolution, which is much cheaper than sorting millions of ticks
+JITTER_RESOLUTION = 0.0001
+
+
+class Recording:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            header, offset = read_header(f)
+        self.path = path
+        self.speed_modes: List[str] = header["speed_modes"]
+        per_block = header["records_per_block"]
+        dtype = np.dtype([("count", BLOCK_COUNT_FORMAT)]
+                         + [(name, "<" + fmt, (per_block,)) for name, fmt in header["fields"]])
+        # Ignores a trailing partial block left by a crash mid-write
+        blocks = (os.path.getsize(path) - offset) // dtype.itemsize
+        if blocks:
+            self.blocks = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(blocks,))
+            self.size = int((blocks - 1) * per_block + self.blocks["count"][-1])
+        else:
+            self.blocks = np.zeros(0, dtype=dtype)
+            self.size = 0
+
+    def column(self, name: str) -> np.ndarray:
+        return self.blocks[name].reshape(-1)[:self.size]
+
+
+def load_recording(path: str) -> Union[Recording, TelemetryArchive]:
+    """Opens either a live recording or a compressed archive, both of which hand out whole columns."""
+    with open(path, "rb") as f:
+        magic = f.read(len(ARCHIVE_MAGIC))
+    if magic == ARCHIVE_MAGIC:
+        return TelemetryArchive(path)
+    return Recording(path)
+
+
+def count_events(active: np.ndarray) -> int:
+    """Number of separate runs of True values."""
+    if active.size == 0:
+        return 0
+    return int(active[0]) + int(np.count_nonzero(active[1:] & ~active[:-1]))
+
+
+def analyze(recording: Union[Recording, TelemetryArchive]) -> Dict:
+    time_column = recording.column("time")
+    if time_column.size < 2:
+        return {"path": recording.path, "records": int(time_column.size)}
+
+    dt = np.diff(time_column)
+    gaps = (dt < 0) | (dt > MAX_GAP_SECONDS)
+    period = dt[~gaps]
+    dt[gaps] = 0
+
+    # Each interval is attributed to the state at its start
+    speed = recording.column("speed_mph")[:-1]
+    miles = float(np.abs(speed) @ dt) / 3600
+
+    watts = recording.column("v_in")[:-1] * (
+        recording.column("left_input_current")[:-1] + recording.column("right_input_current")[:-1]
+    )
+    watt_hours = float(watts @ dt) / 3600
+
+    modes = recording.column("speed_mode")[:-1]
+    seconds_per_mode = np.bincount(modes, weights=dt, minlength=len(recording.speed_modes))
+
+    threshold = SATURATION_FRACTION * CURRENT_LIMIT
+    saturated = (
+        (np.abs(recording.column("left_motor_current")) >= threshold)
+        | (np.abs(recording.column("right_motor_current")) >= threshold)
+    )
+
+    return {
+        "path": recording.path,
+        "records": int(time_column.size),
+        "duration_s": float(dt.sum()),
+        "miles": miles,
+        "watt_hours": watt_hours,
+        "wh_per_mile": watt_hours / miles if miles > 0 else None,
+        "seconds_per_mode": {_mode_name(recording.speed_modes, i): float(s) for i, s in enumerate(seconds_per_mode)},
+        "peak_temp_fet": float(max(recording.column("left_temp_fet").max(), recording.column("right_temp_fet").max())),
+        "saturation_events": count_events(saturated),
+        "saturated_s": float(dt.sum(where=saturated[:-1])),
+        "tick_ms": _percentiles(recording.column("tick_seconds")),
+        "tick_period_ms": _percentiles(period),
+    }
+
+
+def _mode_name(speed_modes: Sequence[str], index: int) -> str:
+    # Recordings made before segments were split on a mode reload can index past the header's list
+    return speed_modes[index] if index < len(speed_modes) else f"mode {index}"
+
+
+def _percentiles(seconds: np.ndarray) -> Dict[str, float]:
+    """Percentiles of a duration column, to within JITTER_RESOLUTION."""
+    if seconds.size == 0:
+        return {}
+    histogram = np.bincount((seconds / JITTER_RESOLUTION).astype(np.int64))
+    cumulative = np.cumsum(histogram)
+    ranks = np.asarray(JITTER_PERCENTILES) / 100 * seconds.size
+    bins = np.searchsorted(cumulative, ranks)
+    longest = float(seconds.max())
+    stats = {f"p{p:g}": min((b + 1) * JITTER_RESOLUTION, longest) * 1000 for p, b in zip(JITTER_PERCENTILES, bins)}
+    stats["max"] = longest * 1000
+    return stats
+
+
+def format_report(result: Dict) -> str:
+    lines = [f"{result['path']}: {result['records']} records"]
+    if "duration_s" not in result:
+        return lines[0]
+    wh_per_mile = result["wh_per_mile"]
+    lines.append(f"  duration       {result['duration_s'] / 60:.1f} min")
+    lines.append(f"  distance       {result['miles']:.2f} mi")
+    lines.append(f"  energy         {result['watt_hours']:.1f} Wh"
+                 + (f" ({wh_per_mile:.1f} Wh/mi)" if wh_per_mile is not None else ""))
+    lines.append("  time per mode  " + ", ".join(
+        f"{name} {seconds / 60:.1f} min" for name, seconds in result["seconds_per_mode"].items()))
+    lines.append(f"  peak temp_fet  {result['peak_temp_fet']:.1f} C")
+    lines.append(f"  current limit  {result['saturation_events']} events, {result['saturated_s']:.1f} s saturated")
+    for key, label in (("tick_ms", "tick duration"), ("tick_period_ms", "tick period")):
+        lines.append(f"  {label:<14} " + " ".join(f"{k}={v:.2f}ms" for k, v in result[key].items()))
+    return "\n".join(lines)
+
+
+def main(argv: Sequence[str] = None):
+    parser = argparse.ArgumentParser(description="Summarize recorded couch rides")
+    parser.add_argument("recordings", nargs="+", help="recordings written by main.py --record, or their archives")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = [analyze(load_recording(path)) for path in args.recordings]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print("\n\n".join(format_report(result) for result in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import tkinter as tk
-from typing import Tuple, Dict
-from dataclasses import dataclass
-from drive_modes import SpeedMode, SPEED_MODES
+from typing import Optional, Tuple, Dict
+from drive_modes import SpeedMode
+from mode_registry import ModeRegistry, load_modes
+from ui_types import ScreenUIUpdate
 
 class Colors:
     RED = "#FF0060"
@@ -13,13 +14,6 @@ class Colors:
     BLACK = "#111827"
 
 
-@dataclass
-class ScreenUIUpdate:
-    speed_mph: float
-    power_watts: float
-    battery_pct: float
-    speed_mode: "SpeedMode"
-
 class DialWidget:
     """
     Minimalist dial with a clean Tesla-like aesthetic.
@@ -40,6 +34,7 @@ class DialWidget:
         bg: str = "white",
         fg: str = "black",
         accent: str = Colors.BLUE,
+        negative_accent: Optional[str] = None,
     ) -> None:
         self.root = root
         self.center_x, self.center_y = center
@@ -52,6 +47,9 @@ class DialWidget:
         self.bg = bg
         self.fg = fg
         self.accent = accent
+        # Signed dials fill the arc by magnitude and switch to negative_accent below zero
+        self.negative_accent = negative_accent
+        self._arc_color = accent
 
         size = (radius * 2) + 20
         self.canvas = tk.Canvas(
@@ -118,9 +116,13 @@ class DialWidget:
         )
 
     def _clamp(self, value: float) -> float:
+        if self.negative_accent:
+            return max(-self.max_value, min(self.max_value, value))
         return max(self.min_value, min(self.max_value, value))
 
     def _value_to_extent(self, value: float) -> float:
+        if self.negative_accent:
+            value = abs(value)
         if self.max_value == self.min_value:
             return 0
         ratio = (value - self.min_value) / (self.max_value - self.min_value)
@@ -144,6 +146,11 @@ class DialWidget:
 
         extent = self._value_to_extent(self._display_value)
         self.canvas.itemconfig(self._value_arc, extent=extent)
+        if self.negative_accent:
+            color = self.negative_accent if self._display_value < 0 else self.accent
+            if color != self._arc_color:
+                self._arc_color = color
+                self.canvas.itemconfig(self._value_arc, outline=color)
 
         # Update number display
         if self.unit.lower() == "mph":
@@ -164,9 +171,8 @@ class ModeIndicator:
     """Inline mode indicator with a pill highlight for the active mode."""
 
     def __init__(
-        self, root: tk.Misc, x: int, y: int, bg: str = "white", fg: str = "black"
+        self, root: tk.Misc, x: int, y: int, modes: ModeRegistry, bg: str = "white", fg: str = "black"
     ) -> None:
-        self.selected_mode: SpeedMode = "park"
         self.root = root
         self.frame = tk.Frame(root, bg=bg)
         self.frame.place(x=x, y=y)
@@ -174,54 +180,87 @@ class ModeIndicator:
         self.fg = fg
         self.accent = Colors.BLACK
         self.dim = Colors.GRAY
-        self.labels: Dict[SpeedMode, str] = {
-            "park": "Park",
-            "neutral": "Neutral",
-            "chill": "Chill",
-            "standard": "Standard",
-            "sport": "Sport",
-        }
-        self.active_colors: Dict[SpeedMode, str] = {
-            "park": Colors.RED,
-            "neutral": Colors.YELLOW,
-            "chill": Colors.GREEN,
-            "standard": Colors.GREEN,
-            "sport": Colors.GREEN,
-        }
         self._label_widgets: Dict[SpeedMode, tk.Label] = {}
-
-        for idx, mode in enumerate(SPEED_MODES):
-            label = self.labels[mode]
+        self.set_modes(modes)
+
+    def set_modes(self, modes: ModeRegistry) -> None:
+        """Rebuilds the pills from a (re)loaded speed mode registry."""
+        self.modes = modes
+        for lbl in self._label_widgets.values():
+            lbl.destroy()
+        self._label_widgets = {}
+        for mode in modes.modes:
             lbl = tk.Label(
                 self.frame,
-                text=label,
+                text=mode.label,
                 bg=self.bg,
                 fg=self.dim,
                 font=("Helvetica", 16),
                 padx=10,
             )
-            lbl.grid(row=0, column=idx, padx=6)
-            self._label_widgets[mode] = lbl
+            lbl.grid(row=0, column=mode.index, padx=6)
+            self._label_widgets[mode.name] = lbl
+        self.selected_mode: Optional[SpeedMode] = None
 
     def set_mode(self, mode: "SpeedMode") -> None:
         prev_mode = self.selected_mode
-        self._label_widgets[mode].config(bg=self.active_colors[mode], fg=self.accent)
+        definition = self.modes.get(mode)
+        if definition is None:
+            # The control side is ahead of us on a config reload
+            return
+        self._label_widgets[mode].config(bg=definition.color, fg=self.accent)
         if prev_mode != mode:
-            self._label_widgets[prev_mode].config(bg=self.bg, fg=self.dim)
+            if prev_mode is not None:
+                self._label_widgets[prev_mode].config(bg=self.bg, fg=self.dim)
             self.selected_mode = mode
 
 
+class ThermalIndicator:
+    """Warns when the thermal limiter is about to derate, or already is. Hidden otherwise."""
+
+    # Only worth warning about a derate the rider could actually hit this ride
+    WARN_SECONDS = 300
+
+    def __init__(self, root: tk.Misc, x: int, y: int, bg: str = "white") -> None:
+        self.label = tk.Label(root, text="", bg=bg, fg=Colors.BLACK, font=("Helvetica", 14, "bold"), padx=8)
+        self.label.place(x=x, y=y)
+        self.bg = bg
+        self._text = ""
+
+    def set_state(self, thermal_limit: float, seconds_to_derate: Optional[float]) -> None:
+        if thermal_limit < 1.0:
+            text, color = f"Hot: power limited to {thermal_limit * 100:.0f}%", Colors.RED
+        elif seconds_to_derate is not None and seconds_to_derate < self.WARN_SECONDS:
+            minutes, seconds = divmod(int(seconds_to_derate), 60)
+            text, color = f"Power limit in {minutes}:{seconds:02d}", Colors.YELLOW
+        else:
+            text, color = "", self.bg
+        # Skip the Tk call when nothing changed, this runs on every UI update
+        if text != self._text:
+            self._text = text
+            self.label.config(text=text, bg=color)
+
+
 class ScreenUI:
     """
     Clean, minimalist dashboard:
     - Center dial: Speed (mph)
-    - Left dial: Power (W)
+    - Left dial: Power (W), blue while regenerating
     - Right dial: Battery (%)
     - Top-right: Mode indicator (N, Chill, Sport, Ludicrous)
+
+    update() may be called from any thread. It only hands the latest update over,
+    and the Tk thread applies it, so widgets are never touched from the control side.
     """
 
-    def __init__(self, root: tk.Tk) -> None:
+    # How often the Tk thread applies the latest update
+    APPLY_INTERVAL_MS = 50
+
+    def __init__(self, root: tk.Tk, modes: Optional[ModeRegistry] = None) -> None:
         self.root = root
+        self.modes = modes or load_modes()
+        # Latest update not yet applied, swapped whole between threads
+        self._pending: Optional[ScreenUIUpdate] = None
         self.root.title("Moonshot Couch")
         try:
             self.root.attributes("-fullscreen", True)
@@ -244,8 +283,10 @@ class ScreenUI:
         )
         self.header.place(x=20, y=16)
 
+        self.thermal = ThermalIndicator(root, x=20, y=52, bg=self.bg)
+
         # Mode indicator (top-right)
-        self.mode = ModeIndicator(root, x=800 - 20 - 520, y=16, bg=self.bg, fg=self.fg)
+        self.mode = ModeIndicator(root, x=800 - 20 - 520, y=16, modes=self.modes, bg=self.bg, fg=self.fg)
 
         # Dials
         self.dial_speed = DialWidget(
@@ -268,6 +309,7 @@ class ScreenUI:
             min_value=0,
             max_value=1200,
             accent=Colors.GREEN,
+            negative_accent=Colors.BLUE,  # regenerative braking
         )
 
         self.dial_battery = DialWidget(
@@ -281,18 +323,35 @@ class ScreenUI:
             accent=Colors.BLUE,
         )
 
+        self.root.after(self.APPLY_INTERVAL_MS, self._apply_pending)
+
     def update(
         self, update: ScreenUIUpdate
     ) -> None:
+        self._pending = update
+
+    def _apply_pending(self) -> None:
+        update, self._pending = self._pending, None
+        if update is not None:
+            self._apply(update)
+        self.root.after(self.APPLY_INTERVAL_MS, self._apply_pending)
+
+    def _apply(self, update: ScreenUIUpdate) -> None:
         # Clamp incoming values and update targets
         speed_mph = max(0.0, min(25.0, float(update.speed_mph)))
-        power_watts = max(0.0, min(1200.0, float(update.power_watts)))
+        power_watts = max(-1200.0, min(1200.0, float(update.power_watts)))
         battery_pct = max(0.0, min(100.0, float(update.battery_pct)))
 
         self.dial_speed.set_target(speed_mph)
         self.dial_power.set_target(power_watts)
         self.dial_battery.set_target(battery_pct)
+        # Shows the modes the control loop is running, which only switches to an edited file while parked
+        modes = self.modes.for_version(update.modes_version)
+        if modes is not None:
+            self.modes = modes
+            self.mode.set_modes(modes)
         self.mode.set_mode(update.speed_mode)
+        self.thermal.set_state(update.thermal_limit, update.seconds_to_derate)
 
 
 if __name__ == "__main__":
@@ -302,9 +361,9 @@ if __name__ == "__main__":
     def demo_tick(v: float = 0.0) -> None:
         ui.update(ScreenUIUpdate(
             speed_mph=v % 25,
-            power_watts=(v * 50) % 1200,
+            power_watts=(v * 50) % 1800 - 600,
             battery_pct=100 - (v % 100),
-            speed_mode=SPEED_MODES[int(v) % len(SPEED_MODES)],
+            speed_mode=ui.modes.names[int(v) % len(ui.modes)],
         ))
         root.after(100, lambda: demo_tick(v + 1))
 
@@ -0,0 +1,326 @@
+"""Prioritized access to the shared VESC serial link.
+
+Both motors share one USB-CDC port: the left VESC directly and the right one
+forwarded over CAN. Every frame goes through a single worker thread that owns
+the port, so a slow telemetry reply can no longer hold up a brake command.
+
+A write or read that raises fails that frame and everything queued behind it
+with SerialLinkError, and the worker carries on with whatever comes next.
+Safety stops are the exception: they stay queued and are retried, and the
+failure callbacks tell the motors' command shapers to resend their next
+command instead of deduplicating it against a frame that never went out.
+request() gives up after request_timeout, so a stalled link surfaces as an
+error in the caller instead of a hang.
+"""
+import collections
+import logging
+import threading
+import time
+from enum import IntEnum
+from typing import Callable, Deque, Dict, List, Optional
+
+from pyvesc import VESC, encode, decode  # pyright: ignore[reportMissingImports]
+from pyvesc.VESC.messages import Alive  # pyright: ignore[reportMissingImports]
+
+from logging_setup import rate_limited
+
+
+class Priority(IntEnum):
+    """Traffic classes, most urgent first. Lower classes only go out when higher ones are idle."""
+    SAFETY_STOP = 0
+    COMMAND = 1
+    TELEMETRY = 2
+    CONFIG = 3
+
+
+# How long a frame may sit in the queue before it counts as a deadline miss.
+DEFAULT_DEADLINES: Dict[Priority, float] = {
+    Priority.SAFETY_STOP: 0.005,
+    Priority.COMMAND: 0.02,
+    Priority.TELEMETRY: 0.1,
+    Priority.CONFIG: 1.0,
+}
+
+# Bytes per second each class may use. None means unlimited. 115200 baud is
+# roughly 11.5 kB/s, so telemetry can't starve config and commands entirely.
+DEFAULT_BUDGETS: Dict[Priority, Optional[float]] = {
+    Priority.SAFETY_STOP: None,
+    Priority.COMMAND: 4000,
+    Priority.TELEMETRY: 6000,
+    Priority.CONFIG: 1000,
+}
+
+HEARTBEAT_INTERVAL = 0.1  # Same rate pyvesc's own heartbeat thread uses
+READ_TIMEOUT = 0.05
+READ_POLL_INTERVAL = 0.0005
+# Longest request() waits for its reply, queueing included
+REQUEST_TIMEOUT = 0.5
+# Tries at one safety stop before it is given up on
+SAFETY_STOP_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+
+class SerialLinkError(Exception):
+    """A frame could not be exchanged with the VESC."""
+
+
+class _Transaction:
+    __slots__ = ("priority", "packet", "num_read_bytes", "decoder", "submitted", "done", "response", "error",
+                 "attempts")
+
+    def __init__(self, priority: Priority, packet: bytes, num_read_bytes: Optional[int] = None,
+                 decoder: Optional[Callable] = None):
+        self.priority = priority
+        self.packet = packet
+        self.num_read_bytes = num_read_bytes
+        self.decoder = decoder
+        self.submitted = time.monotonic()
+        self.done = threading.Event() if num_read_bytes is not None else None
+        self.response = None
+        self.error: Optional[BaseException] = None
+        self.attempts = 0
+
+
+class ClassStats:
+    """Counters for one priority class."""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.deadline_misses = 0
+        self.read_timeouts = 0
+        self.errors = 0
+        self.max_latency = 0.0
+
+
+class _TokenBucket:
+    def __init__(self, rate: Optional[float]):
+        self.rate = rate
+        # Allow a burst of a quarter second worth of traffic
+        self.capacity = rate * 0.25 if rate is not None else 0.0
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+
+    def refill(self, now: float):
+        if self.rate is None:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def has_budget(self) -> bool:
+        return self.rate is None or self.tokens > 0
+
+    def consume(self, num_bytes: int):
+        if self.rate is not None:
+            self.tokens -= num_bytes
+
+    def time_until_budget(self) -> float:
+        if self.rate is None or self.tokens > 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class SerialScheduler:
+    """Serializes all traffic on a VESC serial port with strict priority classes.
+
+    Fire-and-forget commands are also written while waiting on a telemetry
+    reply, so a command is delayed by at most one read poll interval.
+    """
+
+    def __init__(
+        self,
+        vesc: VESC,
+        deadlines: Optional[Dict[Priority, float]] = None,
+        budgets: Optional[Dict[Priority, Optional[float]]] = None,
+        read_timeout: float = READ_TIMEOUT,
+        request_timeout: float = REQUEST_TIMEOUT,
+    ):
+        self.vesc = vesc
+        self.serial_port = vesc.serial_port
+        self.read_timeout = read_timeout
+        self.request_timeout = request_timeout
+        self.deadlines = {**DEFAULT_DEADLINES, **(deadlines or {})}
+        budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+
+        self._queues: List[Deque[_Transaction]] = [collections.deque() for _ in Priority]
+        self._buckets = [_TokenBucket(budgets[p]) for p in Priority]
+        self.stats = [ClassStats() for _ in Priority]
+
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._heartbeat_enabled = True
+        self._alive_msg = encode(Alive())
+        self._next_heartbeat = 0.0
+        # Called from the worker thread after a failed exchange
+        self.failure_callbacks: List[Callable[[], None]] = []
+
+    def start(self):
+        # The scheduler takes over the heartbeat so it's serialized with everything else
+        self.vesc.stop_heartbeat()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def thread_id(self) -> Optional[int]:
+        """Native id of the worker thread, so its scheduling can match the thread it serves."""
+        return self._thread.native_id if self._thread is not None else None
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def stop_heartbeat(self):
+        self._heartbeat_enabled = False
+
+    def send(self, packet: bytes, priority: Priority = Priority.COMMAND):
+        """Queues a frame that expects no reply and returns immediately."""
+        with self._cond:
+            self._queues[priority].append(_Transaction(priority, packet))
+            self._cond.notify()
+
+    def request(self, packet: bytes, num_read_bytes: int, priority: Priority = Priority.TELEMETRY,
+                decoder: Callable = decode):
+        """Queues a frame, waits for its reply and returns the decoded message, or None on a read timeout.
+
+        Raises SerialLinkError if the exchange failed or no reply came within request_timeout.
+        """
+        transaction = _Transaction(priority, packet, num_read_bytes, decoder)
+        with self._cond:
+            if not self._running:
+                return None
+            self._queues[priority].append(transaction)
+            self._cond.notify()
+        assert transaction.done is not None
+        if not transaction.done.wait(self.request_timeout):
+            raise SerialLinkError(f"No reply within {self.request_timeout} s")
+        if transaction.error is not None:
+            raise SerialLinkError(str(transaction.error)) from transaction.error
+        return transaction.response
+
+    def deadline_misses(self) -> Dict[str, int]:
+        return {p.name: self.stats[p].deadline_misses for p in Priority}
+
+    def _next_transaction(self, now: float):
+        """Returns the next transaction to run, or how long to wait before trying again."""
+        wait = HEARTBEAT_INTERVAL
+        for priority in Priority:
+            queue = self._queues[priority]
+            if not queue:
+                continue
+            bucket = self._buckets[priority]
+            bucket.refill(now)
+            if bucket.has_budget():
+                return queue.popleft(), 0.0
+            wait = min(wait, bucket.time_until_budget())
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    break
+                now = time.monotonic()
+                if self._heartbeat_enabled and now >= self._next_heartbeat:
+                    self._next_heartbeat = now + HEARTBEAT_INTERVAL
+                    self._queues[Priority.COMMAND].append(_Transaction(Priority.COMMAND, self._alive_msg))
+                transaction, wait = self._next_transaction(now)
+                if transaction is None:
+                    if self._heartbeat_enabled:
+                        wait = min(wait, max(0.0, self._next_heartbeat - now))
+                    self._cond.wait(wait)
+                    continue
+            try:
+                self._execute(transaction)
+            except Exception as e:
+                logger.warning("Serial exchange failed", extra=rate_limited(priority=transaction.priority.name, error=e))
+                self.stats[transaction.priority].errors += 1
+                self._recover(transaction, e)
+
+        # Release anyone still waiting on a reply
+        for queue in self._queues:
+            for transaction in queue:
+                if transaction.done is not None:
+                    transaction.done.set()
+            queue.clear()
+
+    def _recover(self, failed: _Transaction, error: BaseException):
+        """Fails what was queued for the broken link, except safety stops, which are retried."""
+        retry = failed.priority == Priority.SAFETY_STOP and failed.attempts < SAFETY_STOP_ATTEMPTS
+        with self._cond:
+            if retry:
+                self._queues[Priority.SAFETY_STOP].appendleft(failed)
+            pending = [t for queue in self._queues[Priority.COMMAND:] for t in queue]
+            for queue in self._queues[Priority.COMMAND:]:
+                queue.clear()
+        if not retry:
+            self._fail(failed, error)
+        for transaction in pending:
+            self._fail(transaction, error)
+        # The commands that failed were already counted as sent by the shapers
+        for callback in self.failure_callbacks:
+            callback()
+
+    @staticmethod
+    def _fail(transaction: _Transaction, error: BaseException):
+        transaction.error = error
+        if transaction.done is not None:
+            transaction.done.set()
+
+    def _account(self, transaction: _Transaction):
+        transaction.attempts += 1
+        now = time.monotonic()
+        latency = now - transaction.submitted
+        stats = self.stats[transaction.priority]
+        stats.frames += 1
+        stats.bytes += len(transaction.packet)
+        if latency > stats.max_latency:
+            stats.max_latency = latency
+        if latency > self.deadlines[transaction.priority]:
+            stats.deadline_misses += 1
+        self._buckets[transaction.priority].consume(len(transaction.packet))
+
+    def _write_urgent(self):
+        """Writes any queued fire-and-forget safety and command frames."""
+        with self._cond:
+            urgent = []
+            for priority in (Priority.SAFETY_STOP, Priority.COMMAND):
+                queue = self._queues[priority]
+                while queue and queue[0].done is None:
+                    urgent.append(queue.popleft())
+        for i, transaction in enumerate(urgent):
+            self._account(transaction)
+            try:
+                self.serial_port.write(transaction.packet)
+            except Exception:
+                # Requeued, so a safety stop that didn't go out is retried like one that never left the queue
+                with self._cond:
+                    for unsent in reversed(urgent[i:]):
+                        self._queues[unsent.priority].appendleft(unsent)
+                raise
+
+    def _execute(self, transaction: _Transaction):
+        self._account(transaction)
+        self.serial_port.write(transaction.packet)
+        if transaction.done is None:
+            return
+
+        expected = transaction.num_read_bytes
+        deadline = time.monotonic() + self.read_timeout
+        # done is only set here on success. On an exception _run records the error before setting it.
+        while self.serial_port.in_waiting < expected:
+            if time.monotonic() > deadline:
+                self.stats[transaction.priority].read_timeouts += 1
+                self.serial_port.reset_input_buffer()
+                transaction.done.set()
+                return
+            self._write_urgent()
+            time.sleep(READ_POLL_INTERVAL)
+        response, _consumed = transaction.decoder(self.serial_port.read(self.serial_port.in_waiting))
+        transaction.response = response
+        transaction.done.set()
@@ -0,0 +1,168 @@
+"""Startup timeline and inotify-based waits for devices showing up.
+
+The timeline records named milestones in seconds since the process was
+launched (interpreter start, not when this module was imported), so
+time-to-drivable includes imports. It is logged as it goes and exposed on
+the metrics endpoint as couch_startup_seconds.
+
+DirectoryWatcher blocks until something is created in a directory such as
+/dev/input or /dev, instead of polling. Where inotify is unavailable it
+falls back to a short sleep.
+"""
+import ctypes
+import logging
+import os
+import select
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from logging_setup import fields
+
+# inotify(7)
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# A device node can be created before udev has fixed its permissions, so attribute changes count too
+WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_ATTRIB
+# How often a wait notices its stop event, and the poll interval without inotify
+STOP_CHECK_INTERVAL = 0.25
+
+logger = logging.getLogger(__name__)
+
+_libc = None
+
+
+def _inotify():
+    global _libc
+    if _libc is None:
+        try:
+            # libc is already loaded into the process, and ctypes.util costs more to import than this saves
+            _libc = ctypes.CDLL(None, use_errno=True)
+            _libc.inotify_init1  # noqa: B018, only checking it exists
+        except (OSError, AttributeError, TypeError):
+            _libc = False
+    return _libc
+
+
+def process_start_time() -> float:
+    """When this process was launched, on the time.monotonic() clock. Falls back to now."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesized command name; starttime is field 22 overall
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        since_start = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+        return time.monotonic() - since_start
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic()
+
+
+class StartupTimeline:
+    """Milestones on the way to drivable, in seconds since process start.
+
+    Quacks like a metric, so it can be registered with a MetricsRegistry.
+    """
+
+    name = "couch_startup_seconds"
+    help = "Seconds from process start to each startup milestone"
+    kind = "gauge"
+
+    def __init__(self, origin: Optional[float] = None):
+        # A child process passes its parent's origin so both share one timeline
+        self.origin = process_start_time() if origin is None else origin
+        self.marks: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def mark(self, milestone: str) -> float:
+        seconds = time.monotonic() - self.origin
+        with self._lock:
+            self.marks.append((milestone, seconds))
+        logger.info("Startup milestone", extra=fields(milestone=milestone, seconds=round(seconds, 3)))
+        return seconds
+
+    def seconds(self, milestone: str) -> Optional[float]:
+        with self._lock:
+            for name, seconds in self.marks:
+                if name == milestone:
+                    return seconds
+        return None
+
+    def summary(self) -> str:
+        with self._lock:
+            return " ".join(f"{name}={seconds:.2f}s" for name, seconds in self.marks)
+
+    def samples(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            return [(f'{self.name}{{milestone="{name}"}}', seconds) for name, seconds in self.marks]
+
+
+class DirectoryWatcher:
+    """Wakes up when entries are created in, or change permissions in, a directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.fd: Optional[int] = None
+        libc = _inotify()
+        if not libc:
+            return
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning("inotify unavailable, polling instead",
+                           extra=fields(error=os.strerror(ctypes.get_errno())))
+            return
+        if libc.inotify_add_watch(fd, directory.encode(), WATCH_MASK) < 0:
+            # e.g. /dev/input does not exist until the first input device appears
+            logger.warning("Cannot watch directory, polling instead",
+                           extra=fields(directory=directory, error=os.strerror(ctypes.get_errno())))
+            os.close(fd)
+            return
+        self.fd = fd
+
+    def __enter__(self) -> "DirectoryWatcher":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def wait_for_change(self, timeout: float) -> bool:
+        """Blocks until the directory changes or timeout passes. Returns whether it changed."""
+        if self.fd is None:
+            time.sleep(min(timeout, STOP_CHECK_INTERVAL))
+            # Without inotify every wakeup might be a change
+            return True
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        # Only whether something happened matters, not what
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def wait_until(self, condition: Callable[[], bool], stop_event: Optional[threading.Event] = None,
+                   timeout: Optional[float] = None) -> bool:
+        """Blocks until condition() is true, re-checking it whenever the directory changes.
+
+        Returns False if stop_event was set or timeout passed first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not condition():
+            if stop_event is not None and stop_event.is_set():
+                return False
+            wait = STOP_CHECK_INTERVAL if stop_event is not None else 3600.0
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            self.wait_for_change(wait)
+        return True
@@ -0,0 +1,238 @@
+"""Compressed columnar archive for ride telemetry, with a time index for random access.
+
+Records are grouped into blocks of RECORDS_PER_BLOCK. Inside a block each
+field is stored separately: the values are reinterpreted as unsigned
+integers, delta encoded against the previous record, byte shuffled so the
+mostly zero high bytes sit together, and zlib compressed. Every block is
+self-contained, so reading a time window only decompresses the blocks and
+columns it touches.
+
+File layout:
+    magic, uint32 header length, JSON header (fields, speed modes)
+    compressed blocks
+    JSON index: per block the first and last timestamp, the lowest and
+        highest timestamp, record count, file offset and compressed size of
+        each column
+    uint64 index offset, magic
+
+Timestamps are wall clock and can step backwards, e.g. when NTP first syncs
+a Pi that has no RTC, so window reads select blocks by their lowest and
+highest timestamp and records by comparing each timestamp, never by
+assuming the times are sorted.
+
+Usage, from backend/:
+    python telemetry_archive.py convert recordings/ride-20250101-120000.couchrec
+    python telemetry_archive.py info recordings/ride-20250101-120000.coucharc
+"""
+import argparse
+import json
+import os
+import struct
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from telemetry_recorder import read_header
+
+MAGIC = b"COUCHARC"
+FORMAT_VERSION = 1
+FILE_EXTENSION = ".coucharc"
+# About 80 s at 100 Hz: large enough to compress well, small enough for cheap window reads
+RECORDS_PER_BLOCK = 8192
+COMPRESSION_LEVEL = 6
+TRAILER_FORMAT = "<Q"
+TRAILER_SIZE = struct.calcsize(TRAILER_FORMAT) + len(MAGIC)
+
+
+def _unsigned(fmt: str) -> np.dtype:
+    return np.dtype(f"<u{np.dtype(fmt).itemsize}")
+
+
+def encode_column(values: np.ndarray) -> bytes:
+    """Delta encodes, byte shuffles and compresses one block of one column. Lossless for any dtype."""
+    raw = np.ascontiguousarray(values).view(_unsigned(values.dtype))
+    deltas = np.diff(raw, prepend=raw.dtype.type(0))
+    shuffled = deltas.view(np.uint8).reshape(-1, raw.dtype.itemsize).T.tobytes()
+    return zlib.compress(shuffled, COMPRESSION_LEVEL)
+
+
+def decode_column(data: bytes, dtype: np.dtype, count: int) -> np.ndarray:
+    unsigned = _unsigned(dtype)
+    shuffled = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(unsigned.itemsize, count)
+    deltas = np.ascontiguousarray(shuffled.T).view(unsigned).reshape(count)
+    # Unsigned cumulative sums wrap exactly like the encoding subtraction did
+    return np.cumsum(deltas, dtype=unsigned).view(dtype)
+
+
+class ArchiveWriter:
+    """Appends columns of records to an archive. Call close() to write the index."""
+
+    def __init__(self, path: str, fields: Sequence[Tuple[str, str]], speed_modes: Sequence[str],
+                 records_per_block: int = RECORDS_PER_BLOCK):
+        if fields[0][0] != "time":
+            raise ValueError("The first field must be the timestamp")
+        self.path = path
+        self.fields = [(name, fmt) for name, fmt in fields]
+        self.dtypes = {name: np.dtype("<" + fmt) for name, fmt in self.fields}
+        self.records_per_block = records_per_block
+        self._file = open(path, "wb")
+        header = json.dumps({
+            "version": FORMAT_VERSION,
+            "fields": [list(field) for field in self.fields],
+            "speed_modes": list(speed_modes),
+        }).encode()
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        self._pending: Dict[str, List[np.ndarray]] = {name: [] for name, _ in self.fields}
+        self._pending_count = 0
+        self._index: List[dict] = []
+
+    def write(self, columns: Dict[str, np.ndarray]):
+        """Appends records given as equal-length arrays, one per field."""
+        count = len(columns["time"])
+        for name, _ in self.fields:
+            self._pending[name].append(np.asarray(columns[name], dtype=self.dtypes[name]))
+        self._pending_count += count
+        while self._pending_count >= self.records_per_block:
+            self._write_block(self.records_per_block)
+
+    def _write_block(self, count: int):
+        block = {}
+        for name, _ in self.fields:
+            values = np.concatenate(self._pending[name])
+            block[name] = values[:count]
+            self._pending[name] = [values[count:]]
+        self._pending_count -= count
+
+        times = block["time"]
+        entry = {"start": float(times[0]), "end": float(times[-1]),
+                 "min": float(times.min()), "max": float(times.max()), "count": count,
+                 "offset": self._file.tell(), "sizes": []}
+        for name, _ in self.fields:
+            data = encode_column(block[name])
+            self._file.write(data)
+            entry["sizes"].append(len(data))
+        self._index.append(entry)
+
+    def close(self):
+        if self._pending_count:
+            self._write_block(self._pending_count)
+        index_offset = self._file.tell()
+        self._file.write(json.dumps(self._index).encode())
+        self._file.write(struct.pack(TRAILER_FORMAT, index_offset) + MAGIC)
+        self._file.close()
+
+
+class TelemetryArchive:
+    """Random access reader. Only the blocks overlapping the requested window are decompressed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        if self._file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a couch telemetry archive")
+        (length,) = struct.unpack("<I", self._file.read(4))
+        header = json.loads(self._file.read(length))
+        self.fields: List[Tuple[str, str]] = [(name, fmt) for name, fmt in header["fields"]]
+        self.speed_modes: List[str] = header["speed_modes"]
+        self._dtypes = {name: np.dtype("<" + fmt) for name, fmt in self.fields}
+        self._positions = {name: i for i, (name, _) in enumerate(self.fields)}
+
+        self._file.seek(-TRAILER_SIZE, os.SEEK_END)
+        trailer = self._file.read(TRAILER_SIZE)
+        if trailer[-len(MAGIC):] != MAGIC:
+            raise ValueError("Archive has no index, it was not closed properly")
+        (index_offset,) = struct.unpack(TRAILER_FORMAT, trailer[:-len(MAGIC)])
+        self._file.seek(index_offset)
+        self.blocks: List[dict] = json.loads(self._file.read(os.path.getsize(path) - TRAILER_SIZE - index_offset))
+        # Archives written before min/max were indexed only have first/last
+        self._block_mins = [block.get("min", block["start"]) for block in self.blocks]
+        self._block_maxes = [block.get("max", block["end"]) for block in self.blocks]
+        self.size = sum(block["count"] for block in self.blocks)
+
+    @property
+    def time_range(self) -> Optional[Tuple[float, float]]:
+        if not self.blocks:
+            return None
+        return min(self._block_mins), max(self._block_maxes)
+
+    def _read_block_column(self, block: dict, name: str) -> np.ndarray:
+        position = self._positions[name]
+        self._file.seek(block["offset"] + sum(block["sizes"][:position]))
+        data = self._file.read(block["sizes"][position])
+        return decode_column(data, self._dtypes[name], block["count"])
+
+    def read(self, columns: Optional[Iterable[str]] = None, start: Optional[float] = None,
+             end: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Returns the requested fields (all by default) for records with start <= time <= end, in recording order."""
+        names = list(columns) if columns is not None else [name for name, _ in self.fields]
+        blocks = [
+            block for block, low, high in zip(self.blocks, self._block_mins, self._block_maxes)
+            if (start is None or high >= start) and (end is None or low <= end)
+        ]
+        if not blocks:
+            return {name: np.zeros(0, dtype=self._dtypes[name]) for name in names}
+
+        result = {name: np.concatenate([self._read_block_column(block, name) for block in blocks])
+                  for name in names}
+        if start is not None or end is not None:
+            times = result["time"] if "time" in result else np.concatenate(
+                [self._read_block_column(block, "time") for block in blocks])
+            keep = np.ones(len(times), dtype=bool)
+            if start is not None:
+                keep &= times >= start
+            if end is not None:
+                keep &= times <= end
+            result = {name: values[keep] for name, values in result.items()}
+        return result
+
+    def column(self, name: str) -> np.ndarray:
+        return self.read([name])[name]
+
+    def close(self):
+        self._file.close()
+
+
+def convert(recording_path: str, archive_path: Optional[str] = None) -> str:
+    """Converts a live recorder file into an archive, block by block. Returns the archive path."""
+    # Deferred so this module does not import ride_analytics at load time, which imports it back
+    from ride_analytics import load_recording
+
+    if archive_path is None:
+        archive_path = os.path.splitext(recording_path)[0] + FILE_EXTENSION
+    with open(recording_path, "rb") as f:
+        header, _ = read_header(f)
+    recording = load_recording(recording_path)
+    columns = {name: recording.column(name) for name, _ in header["fields"]}
+    writer = ArchiveWriter(archive_path, header["fields"], header["speed_modes"])
+    for start in range(0, recording.size, RECORDS_PER_BLOCK):
+        writer.write({name: values[start:start + RECORDS_PER_BLOCK] for name, values in columns.items()})
+    writer.close()
+    return archive_path
+
+
+def main(argv: Sequence[str] = None):
+    parser = argparse.ArgumentParser(description="Couch telemetry archives")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert_parser = commands.add_parser("convert", help="convert a recording made with main.py --record")
+    convert_parser.add_argument("recording")
+    convert_parser.add_argument("--output", help="archive path, defaults to the recording path with " + FILE_EXTENSION)
+    info_parser = commands.add_parser("info", help="describe an archive")
+    info_parser.add_argument("archive")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        path = convert(args.recording, args.output)
+        before, after = os.path.getsize(args.recording), os.path.getsize(path)
+        print(f"Wrote {path}: {after / 1e6:.1f} MB, {before / after:.1f}x smaller than the recording")
+    else:
+        archive = TelemetryArchive(args.archive)
+        time_range = archive.time_range
+        print(f"{archive.path}: {archive.size} records in {len(archive.blocks)} blocks")
+        if time_range:
+            print(f"  {time_range[1] - time_range[0]:.0f} s from {time_range[0]:.3f} to {time_range[1]:.3f}")
+        print("  fields: " + ", ".join(name for name, _ in archive.fields))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Records per-tick ride telemetry to disk without blocking the control loop.
+
+File layout: an 8-byte magic, a little-endian uint32 header length and a JSON
+header describing the fields, followed by fixed-size blocks. Each block holds
+a uint64 record count and then RECORDS_PER_BLOCK values of each field, one
+field after the other. Only the last block can be partly filled.
+
+Storing each block column by column means an offline reader that memory-maps
+the file only touches the pages of the fields it asks for, see
+ride_analytics.load_recording.
+
+The speed_mode column indexes the header's speed_modes. When an edited
+speed_modes.toml changes that list mid-ride, the recording continues in a new
+segment file, ride-<date>-<time>-2.couchrec and so on, with the new list.
+"""
+import json
+import logging
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+from logging_setup import rate_limited
+
+MAGIC = b"COUCHREC"
+FORMAT_VERSION = 1
+FILE_EXTENSION = ".couchrec"
+
+# (name, format). Formats are shared by array and NumPy, keep them to d, f, i and B.
+RECORD_FIELDS: List[Tuple[str, str]] = [
+    ("time", "d"),
+    ("tick_seconds", "f"),
+    ("speed_mode", "B"),
+    ("speed_mph", "f"),
+    ("left_rpm", "f"),
+    ("right_rpm", "f"),
+    ("left_motor_current", "f"),
+    ("right_motor_current", "f"),
+    ("left_input_current", "f"),
+    ("right_input_current", "f"),
+    ("v_in", "f"),
+    ("left_temp_fet", "f"),
+    ("right_temp_fet", "f"),
+]
+
+# Records per block, about 10 s at 100 Hz. A multiple of 8 keeps every column aligned.
+RECORDS_PER_BLOCK = 1024
+BLOCK_COUNT_FORMAT = "<Q"
+
+logger = logging.getLogger(__name__)
+
+
+def write_header(f, speed_modes: Sequence[str], record_fields: Sequence[Tuple[str, str]] = RECORD_FIELDS) -> int:
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "records_per_block": RECORDS_PER_BLOCK,
+        "fields": [list(field) for field in record_fields],
+        "speed_modes": list(speed_modes),
+    }).encode()
+    f.write(MAGIC + struct.pack("<I", len(header)) + header)
+    return len(MAGIC) + 4 + len(header)
+
+
+def read_header(f) -> Tuple[dict, int]:
+    """Returns the decoded header and the offset of the first record."""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a couch telemetry recording")
+    (length,) = struct.unpack("<I", f.read(4))
+    header = json.loads(f.read(length))
+    return header, len(MAGIC) + 4 + length
+
+
+class TelemetryRecorder:
+    """Fills preallocated per-field columns and writes full blocks from a background thread."""
+
+    def __init__(self, path: str, speed_modes: Sequence[str], segment: int = 1):
+        """speed_modes: mode names in registry order, to decode the speed_mode index column."""
+        self.path = path
+        self.speed_modes = tuple(speed_modes)
+        self.segment = segment
+        self._file = open(path, "wb")
+        write_header(self._file, speed_modes)
+        self._columns = [array(fmt, bytes(array(fmt).itemsize * RECORDS_PER_BLOCK)) for _, fmt in RECORD_FIELDS]
+        self._count = 0
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._write_blocks, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def in_directory(cls, directory: str, speed_modes: Sequence[str]) -> "TelemetryRecorder":
+        """Starts a recording named after the current time in the given directory."""
+        os.makedirs(directory, exist_ok=True)
+        name = time.strftime("ride-%Y%m%d-%H%M%S") + FILE_EXTENSION
+        return cls(os.path.join(directory, name), speed_modes)
+
+    def next_segment(self, speed_modes: Sequence[str]) -> "TelemetryRecorder":
+        """Finishes this file in the background and continues in a new one whose header lists speed_modes."""
+        root, extension = os.path.splitext(self.path)
+        if self.segment > 1:
+            root = root.rsplit("-", 1)[0]
+        recorder = TelemetryRecorder(f"{root}-{self.segment + 1}{extension}", speed_modes, self.segment + 1)
+        self._finish()
+        return recorder
+
+    def record(self, *values):
+        """Appends one record, values in RECORD_FIELDS order."""
+        count = self._count
+        for column, value in zip(self._columns, values):
+            column[count] = value
+        self._count = count + 1
+        if self._count == RECORDS_PER_BLOCK:
+            self._flush_block()
+
+    def _flush_block(self):
+        columns = [column.tobytes() for column in self._columns]
+        if sys.byteorder == "big":
+            columns = [_swapped(column, fmt) for column, (_, fmt) in zip(columns, RECORD_FIELDS)]
+        self._queue.put(struct.pack(BLOCK_COUNT_FORMAT, self._count) + b"".join(columns))
+        self._count = 0
+
+    def _write_blocks(self):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                break
+            try:
+                self._file.write(block)
+                self._file.flush()
+            except OSError as e:
+                logger.warning("Error writing telemetry", extra=rate_limited(path=self.path, error=e))
+        self._file.close()
+
+    def _finish(self):
+        if self._count:
+            self._flush_block()
+        self._queue.put(None)
+
+    def close(self):
+        self._finish()
+        self._thread.join()
+
+
+def _swapped(data: bytes, fmt: str) -> bytes:
+    column = array(fmt, data)
+    column.byteswap()
+    return column.tobytes()
@@ -0,0 +1,115 @@
+"""Shared-memory ring buffer carrying dashboard telemetry between processes.
+
+One writer (the control process) and any number of readers. Each slot is
+guarded by a sequence number the way a seqlock works: the writer bumps it to
+an odd value before writing and to the next even value after, and readers
+retry if they saw an odd or changed sequence. Nothing here ever blocks the
+writer.
+"""
+import math
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Optional
+
+from ui_types import ScreenUIUpdate
+
+RING_SLOTS = 64
+
+# write index (total records written)
+_HEADER = struct.Struct("<Q")
+# sequence, timestamp, speed, power, battery, voltage, Wh consumed, Wh regenerated,
+# thermal limit, seconds to derate (NaN for never), x, y, heading, trip miles, speed mode
+# registry version (NaN for unknown), speed mode name. The name rather than an index, so the
+# two processes never have to agree on the order of the speed mode registry.
+_SLOT = struct.Struct("<Qdddddddddddddd16s")
+
+
+class TelemetryRing:
+    """Creates or attaches to a named shared-memory ring."""
+
+    def __init__(self, name: Optional[str] = None, create: bool = False, slots: int = RING_SLOTS):
+        self.slots = slots
+        size = _HEADER.size + slots * _SLOT.size
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.name = self.shm.name
+        self.owner = create
+        if create:
+            self.shm.buf[:size] = bytes(size)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def _slot_offset(self, index: int) -> int:
+        return _HEADER.size + (index % self.slots) * _SLOT.size
+
+
+class TelemetryWriter:
+    """Publishes ScreenUIUpdates into the ring. Quacks like ScreenUI so Couch can use it as its ui_manager."""
+
+    def __init__(self, ring: TelemetryRing):
+        self.ring = ring
+        self._buf = ring.shm.buf
+        (self._index,) = _HEADER.unpack_from(self._buf, 0)
+
+    def update(self, update: ScreenUIUpdate) -> None:
+        offset = self.ring._slot_offset(self._index)
+        (seq,) = struct.unpack_from("<Q", self._buf, offset)
+        seq |= 1  # odd: write in progress
+        struct.pack_into("<Q", self._buf, offset, seq)
+        _SLOT.pack_into(
+            self._buf, offset, seq, time.time(),
+            update.speed_mph, update.power_watts, update.battery_pct,
+            update.voltage, update.wh_consumed, update.wh_regenerated, update.thermal_limit,
+            math.nan if update.seconds_to_derate is None else update.seconds_to_derate,
+            update.x_m, update.y_m, update.heading_rad, update.trip_miles,
+            math.nan if update.modes_version is None else update.modes_version,
+            update.speed_mode.encode(),
+        )
+        struct.pack_into("<Q", self._buf, offset, seq + 1)
+        self._index += 1
+        _HEADER.pack_into(self._buf, 0, self._index)
+
+
+class TelemetryReader:
+    """Reads the latest published update from the ring."""
+
+    def __init__(self, ring: TelemetryRing):
+        self.ring = ring
+        self._buf = ring.shm.buf
+        self.last_index = 0
+        self.last_timestamp = 0.0
+
+    def latest(self) -> Optional[ScreenUIUpdate]:
+        """Returns the newest update, or None if nothing new was published since the last call."""
+        (index,) = _HEADER.unpack_from(self._buf, 0)
+        if index == 0 or index == self.last_index:
+            return None
+        offset = self.ring._slot_offset(index - 1)
+        for _ in range(3):
+            (seq, timestamp, speed, power, battery, voltage, wh_consumed, wh_regenerated,
+             thermal_limit, derate, x, y, heading, trip, modes_version, mode) = _SLOT.unpack_from(self._buf, offset)
+            (seq_after,) = struct.unpack_from("<Q", self._buf, offset)
+            if seq % 2 == 0 and seq == seq_after:
+                self.last_index = index
+                self.last_timestamp = timestamp
+                return ScreenUIUpdate(
+                    speed_mph=speed,
+                    power_watts=power,
+                    battery_pct=battery,
+                    speed_mode=mode.rstrip(b"\0").decode(),
+                    voltage=voltage,
+                    wh_consumed=wh_consumed,
+                    wh_regenerated=wh_regenerated,
+                    thermal_limit=thermal_limit,
+                    seconds_to_derate=None if math.isnan(derate) else derate,
+                    x_m=x,
+                    y_m=y,
+                    heading_rad=heading,
+                    trip_miles=trip,
+                    modes_version=None if math.isnan(modes_version) else modes_version,
+                )
+        # Writer kept lapping us, try again on the next poll
+        return None
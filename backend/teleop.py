@@ -0,0 +1,210 @@
+"""Driving the couch over UDP from a laptop or phone.
+
+Each packet is a fixed 22-byte little-endian struct carrying the whole
+input state, so a lost packet costs nothing and the newest one always wins:
+
+    magic     2s  b"CT"
+    version   B   1
+    flags     B   reserved, 0
+    sequence  I   incremented per packet, wrapping at 2**32
+    x, y      h   stick, -32767..32767, y negative forward like a joystick
+    buttons   H   bit i pressed is BUTTON_NAMES[i]
+    sent_ns   Q   sender's time.monotonic_ns(), only comparable on the same host
+
+Packets older than the newest one seen (by sequence, allowing for wrap) are
+dropped. If nothing arrives for stale_after seconds the stick reads as
+centered and no buttons as pressed, so the couch slows to a stop exactly as
+if the driver let go. After disconnect_after seconds the source counts as
+disconnected and the couch falls back to waiting for a gamepad or teleop.
+
+Only one sender drives at a time. Another is ignored until the first one
+goes stale. The port is unauthenticated, so only enable it on a trusted network.
+
+`python teleop.py send` is a stand-in sender that sweeps the stick.
+"""
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Optional, Tuple
+
+from input_source import Control
+from logging_setup import fields, rate_limited
+
+PACKET = struct.Struct("<2sBBIhhHQ")
+MAGIC = b"CT"
+VERSION = 1
+MAX_AXIS = 32767
+TELEOP_HOST = "0.0.0.0"
+TELEOP_PORT = 9200
+# A sender at 50 Hz can lose a few packets in a row before the stick is centered
+STALE_AFTER = 0.25
+DISCONNECT_AFTER = 3.0
+# Named so speed_modes.toml can bind them like gamepad buttons
+BUTTON_NAMES = ("PARK", "NEUTRAL", "CHILL", "STANDARD", "SPORT", "HORN")
+# How often the receive thread notices it was stopped
+RECEIVE_TIMEOUT = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+def encode(sequence: int, x: float, y: float, buttons: int = 0, sent_ns: Optional[int] = None) -> bytes:
+    if sent_ns is None:
+        sent_ns = time.monotonic_ns()
+    return PACKET.pack(MAGIC, VERSION, 0, sequence & 0xFFFFFFFF,
+                       round(max(-1.0, min(1.0, x)) * MAX_AXIS), round(max(-1.0, min(1.0, y)) * MAX_AXIS),
+                       buttons, sent_ns)
+
+
+def is_newer(sequence: int, last: int) -> bool:
+    """Whether sequence comes after last, treating the 32-bit counter as wrapping."""
+    return 0 < (sequence - last) & 0xFFFFFFFF < 0x80000000
+
+
+class TeleopReceiver:
+    """Receives teleop packets on a daemon thread and reads like a Gamepad to the control loop."""
+
+    axisNames = {0: "X", 1: "Y"}
+    axisIndex = {"X": 0, "Y": 1}
+    buttonNames = dict(enumerate(BUTTON_NAMES))
+    buttonIndex = {name: index for index, name in enumerate(BUTTON_NAMES)}
+
+    def __init__(self, host: str = TELEOP_HOST, port: int = TELEOP_PORT,
+                 stale_after: float = STALE_AFTER, disconnect_after: float = DISCONNECT_AFTER):
+        self.stale_after = stale_after
+        self.disconnect_after = disconnect_after
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.settimeout(RECEIVE_TIMEOUT)
+        self.port = self.socket.getsockname()[1]
+        # (received at on time.monotonic(), sequence, x, y, buttons, sent_ns), swapped whole so readers
+        # on the control thread never see half an update
+        self.state: Tuple[float, int, float, float, int, int] = (float("-inf"), 0, 0.0, 0.0, 0, 0)
+        self.sender: Optional[Tuple[str, int]] = None
+        self.packets = 0
+        self.out_of_order = 0
+        self.malformed = 0
+        self.ignored = 0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._receive, name="teleop", daemon=True)
+        self._thread.start()
+        logger.info("Listening for teleop", extra=fields(port=self.port))
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.socket.close()
+
+    def _receive(self):
+        while self._running:
+            try:
+                data, sender = self.socket.recvfrom(64)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                logger.warning("Teleop receive failed", extra=rate_limited(error=e))
+                continue
+            self.handle_packet(data, sender, time.monotonic())
+
+    def handle_packet(self, data: bytes, sender: Tuple[str, int], now: float) -> bool:
+        """Applies one packet. Returns whether it was accepted."""
+        if len(data) != PACKET.size:
+            self.malformed += 1
+            return False
+        magic, version, _, sequence, x, y, buttons, sent_ns = PACKET.unpack(data)
+        if magic != MAGIC or version != VERSION:
+            self.malformed += 1
+            return False
+        received_at, last_sequence = self.state[0], self.state[1]
+        stale = now - received_at >= self.stale_after
+        if sender != self.sender:
+            if not stale:
+                # Someone else is driving
+                self.ignored += 1
+                return False
+            logger.info("Teleop sender connected", extra=fields(sender=f"{sender[0]}:{sender[1]}"))
+            self.sender = sender
+        elif not stale and not is_newer(sequence, last_sequence):
+            # After a pause any sequence is accepted, so a restarted sender is not locked out
+            self.out_of_order += 1
+            return False
+        self.state = (now, sequence, x / MAX_AXIS, y / MAX_AXIS, buttons, sent_ns)
+        self.packets += 1
+        return True
+
+    def axis(self, axisName: Control) -> float:
+        state = self.state
+        if time.monotonic() - state[0] >= self.stale_after:
+            return 0.0
+        index = self.axisIndex.get(axisName, axisName)
+        if index == 0:
+            return state[2]
+        if index == 1:
+            return state[3]
+        raise ValueError('Axis name %s was not found' % axisName)
+
+    def isPressed(self, buttonName: Control) -> bool:
+        state = self.state
+        try:
+            index = self.buttonIndex[buttonName] if buttonName in self.buttonIndex else int(buttonName)
+        except ValueError:
+            raise ValueError('Button name %s was not found' % buttonName)
+        if time.monotonic() - state[0] >= self.stale_after:
+            return False
+        return bool(state[4] >> index & 1)
+
+    def isConnected(self) -> bool:
+        return time.monotonic() - self.state[0] < self.disconnect_after
+
+
+class TeleopSender:
+    """Sends teleop packets with increasing sequence numbers."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = TELEOP_PORT):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sequence = 0
+
+    def send(self, x: float, y: float, buttons: int = 0) -> int:
+        """Sends the stick and button state. Returns the sent_ns stamped into the packet."""
+        self.sequence += 1
+        sent_ns = time.monotonic_ns()
+        self.socket.sendto(encode(self.sequence, x, y, buttons, sent_ns), self.address)
+        return sent_ns
+
+    def close(self):
+        self.socket.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import math
+
+    parser = argparse.ArgumentParser(description="Stand-in teleop sender: sweeps the stick in a slow circle")
+    subparsers = parser.add_subparsers(dest="cmd", required=True)
+    send_parser = subparsers.add_parser("send")
+    send_parser.add_argument("--host", default="127.0.0.1")
+    send_parser.add_argument("--port", type=int, default=TELEOP_PORT)
+    send_parser.add_argument("--rate", type=float, default=50.0, help="packets per second")
+    send_parser.add_argument("--amplitude", type=float, default=0.3, help="stick deflection, 0..1")
+    send_parser.add_argument("--mode", choices=[name.lower() for name in BUTTON_NAMES[:5]], default="chill",
+                             help="speed mode button held down")
+    args = parser.parse_args()
+
+    sender = TeleopSender(args.host, args.port)
+    buttons = 1 << BUTTON_NAMES.index(args.mode.upper())
+    start = time.monotonic()
+    try:
+        while True:
+            phase = (time.monotonic() - start) / 4.0 * 2 * math.pi
+            sender.send(args.amplitude * math.sin(phase), -args.amplitude * math.cos(phase), buttons)
+            time.sleep(1.0 / args.rate)
+    except KeyboardInterrupt:
+        sender.close()
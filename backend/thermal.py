@@ -0,0 +1,194 @@
+"""Thermal derating for the motor controllers.
+
+Each temperature sensor gets a first-order thermal model,
+
+    dT/dt = (ambient + gain * I^2 - T) / time_constant
+
+fed one tick at a time with the sensor reading and the motor current. The
+model learns its gain online, which lets it predict where the temperature is
+heading at the current load and how long until it gets there. Output is
+scaled down linearly once a sensor passes its derate start temperature,
+well before the VESC's own thermal cutback kicks in.
+
+Run `python thermal.py` to see the model track and predict synthetic heat
+curves. It exits non-zero if derating never starts or was predicted more
+than SIMULATED_PREDICTION_TOLERANCE off.
+"""
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+# The VESC starts its own FET cutback at 85 C, derate earlier and more gently than that
+FET_DERATE_START = 70.0
+FET_DERATE_END = 85.0
+FET_TIME_CONSTANT = 120.0
+MOTOR_DERATE_START = 90.0
+MOTOR_DERATE_END = 110.0
+MOTOR_TIME_CONSTANT = 600.0
+# Never derate below this, so a hot couch can still limp home
+MIN_OUTPUT = 0.25
+
+# Starting guess for the temperature rise per amp squared, refined while driving
+INITIAL_GAIN = 0.05
+# Below this filtered I^2 the heating is too small to learn the gain from
+LEARN_MIN_CURRENT_SQUARED = 25.0
+LEARN_TIME_CONSTANT = 60.0
+# How quickly the load estimate follows the current
+LOAD_TIME_CONSTANT = 5.0
+TEMPERATURE_TIME_CONSTANT = 2.0
+# Readings outside this range come from a missing or broken thermistor
+PLAUSIBLE_RANGE = (-20.0, 150.0)
+# How far the self-check's predictions of derating may be from when it actually starts, in seconds
+SIMULATED_PREDICTION_TOLERANCE = 15.0
+
+
+def _ema(previous: float, value: float, dt: float, time_constant: float) -> float:
+    return previous + (value - previous) * min(1.0, dt / time_constant)
+
+
+class ThermalModel:
+    """Tracks one temperature sensor and predicts its trajectory at the current load."""
+
+    def __init__(self, derate_start: float, derate_end: float, time_constant: float):
+        self.derate_start = derate_start
+        self.derate_end = derate_end
+        self.time_constant = time_constant
+        self.gain = INITIAL_GAIN
+        self.temperature: Optional[float] = None
+        self.ambient: Optional[float] = None
+        self.load = 0.0  # filtered I^2
+        self._smoothed: Optional[float] = None
+
+    def update(self, temperature: float, current: float, dt: float):
+        if not PLAUSIBLE_RANGE[0] < temperature < PLAUSIBLE_RANGE[1] or dt <= 0:
+            return
+        if self.temperature is None:
+            self.temperature = self._smoothed = self.ambient = temperature
+            return
+
+        previous = self._smoothed
+        self._smoothed = _ema(self._smoothed, temperature, dt, TEMPERATURE_TIME_CONSTANT)
+        self.temperature = temperature
+        # Anything the sensor reads while cooling below our ambient guess is a better guess
+        self.ambient = min(self.ambient, self._smoothed)
+        self.load = _ema(self.load, current * current, dt, LOAD_TIME_CONSTANT)
+
+        if self.load > LEARN_MIN_CURRENT_SQUARED:
+            # Solve the model for the gain using the observed rate of change
+            rate = (self._smoothed - previous) / dt
+            sample = (self.time_constant * rate + self._smoothed - self.ambient) / self.load
+            self.gain = max(0.0, _ema(self.gain, sample, dt, LEARN_TIME_CONSTANT))
+
+    @property
+    def steady_state(self) -> Optional[float]:
+        """Where the temperature settles if the current load is held."""
+        if self.ambient is None:
+            return None
+        return self.ambient + self.gain * self.load
+
+    def output_limit(self) -> float:
+        if self.temperature is None or self.temperature <= self.derate_start:
+            return 1.0
+        progress = min(1.0, (self.temperature - self.derate_start) / (self.derate_end - self.derate_start))
+        return 1.0 - (1.0 - MIN_OUTPUT) * progress
+
+    def seconds_to_derate(self) -> Optional[float]:
+        """Predicted time until derating starts at the current load: 0 if already derating, None if never."""
+        if self.temperature is None:
+            return None
+        if self.temperature >= self.derate_start:
+            return 0.0
+        target = self.steady_state
+        if target <= self.derate_start:
+            return None
+        return self.time_constant * math.log((target - self.temperature) / (target - self.derate_start))
+
+
+class ThermalLimiter:
+    """Derates both wheels together from the FET and motor temperatures of both controllers.
+
+    The same factor goes to both wheels so a hot controller slows the couch
+    down instead of steering it.
+    """
+
+    def __init__(self):
+        self.models: Dict[str, ThermalModel] = {}
+        for side in ("left", "right"):
+            self.models[f"{side}_fet"] = ThermalModel(FET_DERATE_START, FET_DERATE_END, FET_TIME_CONSTANT)
+            self.models[f"{side}_motor"] = ThermalModel(MOTOR_DERATE_START, MOTOR_DERATE_END, MOTOR_TIME_CONSTANT)
+        self.output_limit = 1.0
+        self.seconds_to_derate: Optional[float] = None
+        self._last_time = time.monotonic()
+
+    def update(self, measurements_left, measurements_right, dt: Optional[float] = None):
+        """Feeds one tick of measurements (anything with temp_fet, temp_motor and avg_motor_current)."""
+        now = time.monotonic()
+        if dt is None:
+            dt = min(now - self._last_time, 1.0)
+        self._last_time = now
+
+        for side, measurements in (("left", measurements_left), ("right", measurements_right)):
+            current = measurements.avg_motor_current
+            self.models[f"{side}_fet"].update(measurements.temp_fet, current, dt)
+            self.models[f"{side}_motor"].update(measurements.temp_motor, current, dt)
+
+        self.output_limit = min(model.output_limit() for model in self.models.values())
+        predictions = [seconds for seconds in (model.seconds_to_derate() for model in self.models.values())
+                       if seconds is not None]
+        self.seconds_to_derate = min(predictions) if predictions else None
+
+    def limit(self, left: float, right: float) -> Tuple[float, float]:
+        return left * self.output_limit, right * self.output_limit
+
+
+if __name__ == "__main__":
+    import types
+
+    # Synthetic controller whose true gain and time constant differ from the model's starting guesses
+    TRUE_GAIN = 0.09
+    TRUE_FET_TIME_CONSTANT = 150.0
+    AMBIENT = 25.0
+    DT = 0.05
+
+    def current_profile(t: float) -> float:
+        """Cruise, a long hill climb, then cruise again."""
+        if t < 120:
+            return 10.0
+        if t < 900:
+            return 30.0
+        return 8.0
+
+    limiter = ThermalLimiter()
+    fet_temperature = AMBIENT
+    predicted_at: Dict[int, float] = {}
+    derate_time = None
+    print(f"{'t (s)':>6} {'current':>8} {'temp_fet':>9} {'limit':>6} {'derate in':>10} {'gain':>6}")
+    for step in range(int(1500 / DT)):
+        t = step * DT
+        # Current drops as the limiter derates, like the real couch slowing down
+        current = current_profile(t) * limiter.output_limit
+        fet_temperature += (AMBIENT + TRUE_GAIN * current ** 2 - fet_temperature) / TRUE_FET_TIME_CONSTANT * DT
+        reading = round(fet_temperature, 1)  # the VESC reports tenths of a degree
+        measurements = types.SimpleNamespace(avg_motor_current=current, temp_fet=reading, temp_motor=-100.0)
+        limiter.update(measurements, measurements, dt=DT)
+
+        if derate_time is None and limiter.output_limit < 1.0:
+            derate_time = t
+        if step % int(30 / DT) == 0:
+            seconds = limiter.seconds_to_derate
+            predicted_at[int(t)] = t + seconds if seconds is not None else float("nan")
+            print(f"{t:>6.0f} {current:>8.1f} {reading:>9.1f} {limiter.output_limit:>6.2f}"
+                  f" {'-' if seconds is None else f'{seconds:.0f} s':>10} {limiter.models['left_fet'].gain:>6.3f}")
+
+    if derate_time is None:
+        print("\nNOT OK: derating never started")
+        raise SystemExit(1)
+    print(f"\nDerating started at t={derate_time:.0f} s")
+    failed = False
+    for t in (150, 180, 210):
+        # NaN, no prediction at all, fails the comparison too
+        within = abs(predicted_at[t] - derate_time) <= SIMULATED_PREDICTION_TOLERANCE
+        failed |= not within
+        print(f"  predicted at t={t}: derating at t={predicted_at[t]:.0f} s{'' if within else '  NOT OK'}")
+    if failed:
+        raise SystemExit(1)
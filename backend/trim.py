@@ -0,0 +1,275 @@
+"""Per-wheel trim, learned while driving straight, so the couch tracks straight at any stick.
+
+The VESCs close the loop on RPM, but the two controllers and drivetrains
+don't track their commands identically, so equal commands can leave one
+wheel a little slower and the couch pulls to that side. Each wheel is
+modelled as
+
+    measured = gain * commanded + offset * sign(commanded)
+
+and speed_to_rpm asks for (wanted - offset * sign) / gain instead of the
+wanted RPM. The sign term keeps a zero command exactly zero, so an offset
+can never make a parked couch creep, and the offset is faded in over the
+lowest speeds so a barely touched stick stays gentle.
+
+Both parameters are estimated with recursive least squares (two
+parameters, a 2x2 covariance, constant cost per tick) from ticks where
+both wheels were commanded the same steady speed for a while and the
+VESCs had time to settle. Learned values are bounded, kept in
+~/.config/couch/wheel_trim.json and reloaded with reduced confidence, so
+they keep adapting without jumping.
+
+`python trim.py simulate` checks convergence against a simulated mismatched
+pair and exits non-zero if the learned trim misses the tolerances below.
+"""
+import json
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from logging_setup import fields
+
+if TYPE_CHECKING:
+    from motor_controller import MotorController
+
+TRIM_PATH = os.path.join(os.path.expanduser("~"), ".config", "couch", "wheel_trim.json")
+# Commands and measurements are scaled by this, so both parameters are of order one
+RPM_SCALE = 20000.0
+# Prior spread of the parameters, and of one RPM measurement, in scaled units
+GAIN_VARIANCE = 0.1 ** 2
+OFFSET_VARIANCE = 0.05 ** 2
+MEASUREMENT_VARIANCE = 0.01 ** 2
+# Slowly forgets old samples so the trim follows wear and tyre pressure
+FORGETTING = 0.9995
+# A reloaded estimate is trusted like this fraction of the prior spread
+SAVED_VARIANCE_FACTOR = 0.25
+MIN_GAIN, MAX_GAIN = 0.8, 1.25
+MAX_OFFSET = 0.05
+# The offset is learned above MIN_SPEED, so it is faded in up to about there rather than applied at a creep
+OFFSET_FADE_RPM = 3000.0
+
+# Learning only happens driving straight at a steady speed, once the VESCs had time to get there
+MIN_SPEED = 0.15
+MAX_SPEED_DIFFERENCE = 0.02
+MAX_SPEED_CHANGE = 0.01
+STEADY_TICKS = 10
+SAVE_INTERVAL = 60.0
+
+# What `trim.py simulate` accepts after its run: parameter errors, and the left-right
+# difference at 70% stick, about 0.3% of the untrimmed couch's 14000 ERPM
+SIMULATED_GAIN_TOLERANCE = 0.005
+SIMULATED_OFFSET_TOLERANCE_RPM = 25.0
+SIMULATED_PULL_TOLERANCE_RPM = 40.0
+
+logger = logging.getLogger(__name__)
+
+
+def _sign(value: float) -> float:
+    return 1.0 if value > 0 else -1.0 if value < 0 else 0.0
+
+
+class WheelTrim:
+    """Gain and offset of one wheel, with their RLS covariance."""
+
+    def __init__(self, gain: float = 1.0, offset: float = 0.0, variance_factor: float = 1.0, samples: int = 0):
+        self.gain = gain
+        # Scaled by RPM_SCALE
+        self.offset = offset
+        self.p_gg = GAIN_VARIANCE * variance_factor
+        self.p_go = 0.0
+        self.p_oo = OFFSET_VARIANCE * variance_factor
+        self.samples = samples
+
+    def correct(self, rpm: float) -> float:
+        """The RPM to command so this wheel ends up at rpm."""
+        if rpm == 0:
+            return 0.0
+        sign = 1.0 if rpm > 0 else -1.0
+        offset = self.offset * RPM_SCALE * min(1.0, rpm * sign / OFFSET_FADE_RPM)
+        corrected = (rpm - offset * sign) / self.gain
+        # Never reverses the direction asked for
+        return corrected if corrected * sign > 0 else 0.0
+
+    def observe(self, commanded: float, measured: float):
+        """One RLS step with a settled (commanded, measured) RPM pair."""
+        c = commanded / RPM_SCALE
+        s = _sign(commanded)
+        y = measured / RPM_SCALE
+        p_gg, p_go, p_oo = self.p_gg, self.p_go, self.p_oo
+        # P * phi, for phi = (c, s)
+        pg = p_gg * c + p_go * s
+        po = p_go * c + p_oo * s
+        denominator = MEASUREMENT_VARIANCE + c * pg + s * po
+        kg = pg / denominator
+        ko = po / denominator
+        error = y - (self.gain * c + self.offset * s)
+        self.gain = min(MAX_GAIN, max(MIN_GAIN, self.gain + kg * error))
+        self.offset = min(MAX_OFFSET, max(-MAX_OFFSET, self.offset + ko * error))
+        # P = (P - k phi^T P) / lambda, capped at the prior so it can't wind up while unexcited
+        self.p_gg = min(GAIN_VARIANCE, (p_gg - kg * pg) / FORGETTING)
+        self.p_go = (p_go - kg * po) / FORGETTING
+        self.p_oo = min(OFFSET_VARIANCE, (p_oo - ko * po) / FORGETTING)
+        self.samples += 1
+
+    def to_json(self) -> dict:
+        return {"gain": round(self.gain, 5), "offset_rpm": round(self.offset * RPM_SCALE, 1), "samples": self.samples}
+
+    @classmethod
+    def from_json(cls, entry: dict) -> "WheelTrim":
+        return cls(float(entry["gain"]), float(entry["offset_rpm"]) / RPM_SCALE,
+                   SAVED_VARIANCE_FACTOR, int(entry.get("samples", 0)))
+
+
+class DriveTrim:
+    """Both wheels' trim, and when to learn it."""
+
+    def __init__(self, left: Optional[WheelTrim] = None, right: Optional[WheelTrim] = None, path: str = TRIM_PATH):
+        self.left = left or WheelTrim()
+        self.right = right or WheelTrim()
+        self.path = path
+        self.changed = False
+        self._steady_ticks = 0
+        self._last_speeds: Tuple[Optional[float], Optional[float]] = (None, None)
+        self._last_save = time.monotonic()
+
+    @classmethod
+    def load(cls, path: str = TRIM_PATH) -> "DriveTrim":
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+            return cls(WheelTrim.from_json(saved["left"]), WheelTrim.from_json(saved["right"]), path)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring unreadable wheel trim", extra=fields(path=path, error=e))
+        return cls(path=path)
+
+    def attach(self, left_motor: "MotorController", right_motor: "MotorController"):
+        left_motor.trim = self.left
+        right_motor.trim = self.right
+
+    def learn(self, left_motor: "MotorController", right_motor: "MotorController",
+              left_rpm: float, right_rpm: float):
+        """Call each tick with freshly measured RPM, before sending this tick's commands.
+
+        The motors' last_speed and last_rpm are then still the previous tick's commands.
+        """
+        left_speed, right_speed = left_motor.last_speed, right_motor.last_speed
+        last_left, last_right = self._last_speeds
+        self._last_speeds = (left_speed, right_speed)
+        if (left_speed is None or right_speed is None or last_left is None or last_right is None
+                or abs(left_speed) < MIN_SPEED or abs(left_speed - right_speed) > MAX_SPEED_DIFFERENCE
+                or abs(left_speed - last_left) > MAX_SPEED_CHANGE or abs(right_speed - last_right) > MAX_SPEED_CHANGE):
+            self._steady_ticks = 0
+            return
+        self._steady_ticks += 1
+        if self._steady_ticks < STEADY_TICKS:
+            return
+        self.left.observe(left_motor.last_rpm, left_rpm)
+        self.right.observe(right_motor.last_rpm, right_rpm)
+        self.changed = True
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"left": self.left.to_json(), "right": self.right.to_json()}, f, indent=2)
+        os.replace(temporary, self.path)
+        self.changed = False
+        self._last_save = time.monotonic()
+
+    def save_if_changed(self, min_interval: float = SAVE_INTERVAL):
+        if not self.changed or time.monotonic() - self._last_save < min_interval:
+            return
+        try:
+            self.save()
+        except OSError as e:
+            logger.warning("Could not save wheel trim", extra=fields(path=self.path, error=e))
+
+
+def simulate(seconds: float = 120.0, tick: float = 0.05, seed: int = 1) -> bool:
+    """Drives a simulated mismatched pair straight at changing speeds and reports how the trim converges.
+
+    Returns whether the learned trim ends up within the SIMULATED_* tolerances.
+    """
+    import random
+
+    from motor_controller import MotorController
+
+    class SimulatedWheel(MotorController):
+        """Settles to gain * command + offset * sign within a few ticks, with measurement noise."""
+
+        def __init__(self, gain: float, offset_rpm: float):
+            super().__init__()
+            self.true_gain = gain
+            self.true_offset = offset_rpm
+            self.rpm = 0.0
+
+        def _send_rpm(self, rpm: int):
+            pass
+
+        def step(self):
+            target = self.true_gain * self.last_rpm + self.true_offset * _sign(self.last_rpm)
+            self.rpm += (target - self.rpm) * 0.5
+            return self.rpm + rng.gauss(0.0, 40.0)
+
+    rng = random.Random(seed)
+    left = SimulatedWheel(0.93, -250.0)
+    right = SimulatedWheel(1.02, 120.0)
+    trim = DriveTrim(path=os.devnull)
+    trim.attach(left, right)
+    speed = 0.5
+    wanted = 0.7 * left.max_rpm
+    print(f"true      left gain {left.true_gain:.3f} offset {left.true_offset:+.0f}   "
+          f"right gain {right.true_gain:.3f} offset {right.true_offset:+.0f}")
+    ticks = int(seconds / tick)
+    for i in range(ticks):
+        if i % 60 == 0:
+            # Hold a new straight-stick speed for 3 s, sometimes in reverse
+            speed = rng.choice((-1, 1, 1, 1)) * rng.uniform(0.2, 1.0)
+        left.set_rpm(speed)
+        right.set_rpm(speed)
+        trim.learn(left, right, left.step(), right.step())
+        if (i + 1) % (ticks // 6) == 0:
+            pull = [wheel.true_gain * wheel.trim.correct(wanted) + wheel.true_offset for wheel in (left, right)]
+            print(f"{(i + 1) * tick:5.0f} s  left gain {trim.left.gain:.3f} offset {trim.left.offset * RPM_SCALE:+5.0f}   "
+                  f"right gain {trim.right.gain:.3f} offset {trim.right.offset * RPM_SCALE:+5.0f}   "
+                  f"left-right at 70% stick {pull[0] - pull[1]:+5.0f} erpm")
+    untrimmed = (left.true_gain - right.true_gain) * wanted + left.true_offset - right.true_offset
+    print(f"untrimmed left-right at 70% stick {untrimmed:+5.0f} erpm")
+
+    pull = [wheel.true_gain * wheel.trim.correct(wanted) + wheel.true_offset for wheel in (left, right)]
+    failures = []
+    for side, wheel, learned in (("left", left, trim.left), ("right", right, trim.right)):
+        if abs(learned.gain - wheel.true_gain) > SIMULATED_GAIN_TOLERANCE:
+            failures.append(f"{side} gain off by {learned.gain - wheel.true_gain:+.4f}")
+        if abs(learned.offset * RPM_SCALE - wheel.true_offset) > SIMULATED_OFFSET_TOLERANCE_RPM:
+            failures.append(f"{side} offset off by {learned.offset * RPM_SCALE - wheel.true_offset:+.0f} erpm")
+    if abs(pull[0] - pull[1]) > SIMULATED_PULL_TOLERANCE_RPM:
+        failures.append(f"still pulls {pull[0] - pull[1]:+.0f} erpm at 70% stick")
+    for failure in failures:
+        print(f"NOT CONVERGED: {failure}")
+    return not failures
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Per-wheel trim")
+    parser.add_argument("--path", default=TRIM_PATH)
+    subparsers = parser.add_subparsers(dest="cmd", required=True)
+    subparsers.add_parser("show", help="print the saved trim")
+    subparsers.add_parser("reset", help="forget the learned trim")
+    simulate_parser = subparsers.add_parser("simulate", help="check convergence on a simulated mismatched pair")
+    simulate_parser.add_argument("--seconds", type=float, default=120.0)
+    simulate_parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.cmd == "show":
+        trim = DriveTrim.load(args.path)
+        print(json.dumps({"left": trim.left.to_json(), "right": trim.right.to_json()}, indent=2))
+    elif args.cmd == "reset":
+        DriveTrim(path=args.path).save()
+    elif not simulate(args.seconds, seed=args.seed):
+        raise SystemExit(1)
@@ -0,0 +1,247 @@
+"""Live tuning of the control loop's parameters over a local UNIX socket.
+
+Clients send one JSON object per line and get one JSON object back:
+
+    {"cmd": "get"}
+    {"cmd": "set", "params": {"smoothing_factor": 0.2}}
+    {"cmd": "rollback"}                  # back to the previously active version
+    {"cmd": "rollback", "version": 3}
+    {"cmd": "history"}
+
+Every accepted parameter set becomes a new numbered, immutable Revision.
+Publishing one is a single attribute assignment, and the control loop
+applies it between ticks only when it sees a revision it hasn't applied
+yet. When nobody is tuning, each tick costs one identity comparison. A
+revision that changes any of PARKED_ONLY_PARAMS waits until the couch is
+parked, so it can't step the wheel speeds mid-ride.
+
+Run `python tuning.py get`, `python tuning.py set deadband=0.03` or
+`python tuning.py rollback` against a running couch.
+"""
+import dataclasses
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from logging_setup import fields
+
+TUNING_SOCKET = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"), "couch-tuning.sock")
+# Sanity bound on what can be typed in, not a rating of the motors
+MAX_RPM_CEILING = 30000
+
+# Change what a held stick commands outright, so the control loop only switches to them while parked.
+# max_rpm in particular scales the wheel outputs after the motion profile's accel and jerk limits.
+PARKED_ONLY_PARAMS = ("rotation_sensitivity", "deadband", "max_rpm")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ControlParams:
+    smoothing_factor: float = 0.3  # 0 = no input smoothing, closer to 1 = smoother
+    max_accel_per_sec: float = 4.0  # input smoother slew limit, stick units per second
+    rotation_sensitivity: float = 0.3  # 70% less sensitive turning
+    deadband: float = 0.03  # stick deadzone, only covers jitter now that calibration removes the center offset
+    max_rpm: int = 20000  # ERPM at full command
+
+    def validate(self):
+        """Raises ValueError unless every parameter is safe to drive with."""
+        if not 0.0 <= self.smoothing_factor < 1.0:
+            raise ValueError("smoothing_factor must be in [0, 1)")
+        if not 0.0 < self.max_accel_per_sec <= 100.0:
+            raise ValueError("max_accel_per_sec must be in (0, 100]")
+        if not 0.0 <= self.rotation_sensitivity <= 1.0:
+            raise ValueError("rotation_sensitivity must be in [0, 1]")
+        if not 0.0 <= self.deadband < 0.5:
+            raise ValueError("deadband must be in [0, 0.5)")
+        if not 0 < self.max_rpm <= MAX_RPM_CEILING:
+            raise ValueError(f"max_rpm must be in (0, {MAX_RPM_CEILING}]")
+
+    def needs_parking(self, new: "ControlParams") -> bool:
+        """Whether switching from these parameters to new ones has to wait until the couch is parked."""
+        return any(getattr(self, name) != getattr(new, name) for name in PARKED_ONLY_PARAMS)
+
+    def replace(self, changes: Dict[str, object]) -> "ControlParams":
+        """Returns a validated copy with some parameters changed."""
+        known = {field.name: field.type for field in dataclasses.fields(self)}
+        unknown = set(changes) - set(known)
+        if unknown:
+            raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+        converted = {}
+        for name, value in changes.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"{name} must be a number")
+            if known[name] is int:
+                if value != int(value):
+                    raise ValueError(f"{name} must be a whole number")
+                value = int(value)
+            converted[name] = value
+        params = dataclasses.replace(self, **converted)
+        params.validate()
+        return params
+
+
+@dataclass(frozen=True)
+class Revision:
+    version: int
+    params: ControlParams
+    created: float  # wall clock, for the history listing
+
+
+class ParamStore:
+    """Versioned control parameters. `current` is always a complete, validated Revision."""
+
+    def __init__(self, params: ControlParams = ControlParams()):
+        params.validate()
+        self._lock = threading.Lock()
+        self._revisions: Dict[int, Revision] = {}
+        # Versions in the order they were activated, so rollback can step back through them
+        self._activations: List[int] = []
+        self.current: Revision
+        self._add(params)
+
+    def _add(self, params: ControlParams) -> Revision:
+        revision = Revision(len(self._revisions) + 1, params, time.time())
+        self._revisions[revision.version] = revision
+        self._activate(revision)
+        return revision
+
+    def _activate(self, revision: Revision):
+        self._activations.append(revision.version)
+        # Publishing is a single reference swap, readers never see half an update
+        self.current = revision
+
+    def set(self, changes: Dict[str, object]) -> Revision:
+        with self._lock:
+            return self._add(self.current.params.replace(changes))
+
+    def rollback(self, version: Optional[int] = None) -> Revision:
+        """Reactivates `version`, or without one, whatever was active before the current revision."""
+        with self._lock:
+            if version is None:
+                if len(self._activations) < 2:
+                    raise ValueError("Nothing to roll back to")
+                self._activations.pop()
+                self.current = self._revisions[self._activations[-1]]
+                return self.current
+            revision = self._revisions.get(version)
+            if revision is None:
+                raise ValueError(f"No version {version}")
+            self._activate(revision)
+            return revision
+
+    def history(self) -> List[Revision]:
+        with self._lock:
+            return list(self._revisions.values())
+
+
+def _describe(revision: Revision) -> dict:
+    return {"version": revision.version, "created": revision.created, "params": dataclasses.asdict(revision.params)}
+
+
+def handle_command(store: ParamStore, command: dict) -> dict:
+    """Runs one decoded client command against the store and returns the reply."""
+    try:
+        cmd = command.get("cmd")
+        if cmd == "get":
+            revision = store.current
+        elif cmd == "set":
+            params = command.get("params")
+            if not isinstance(params, dict):
+                raise ValueError("set needs a params object")
+            revision = store.set(params)
+            logger.info("Control parameters changed", extra=fields(version=revision.version, **params))
+        elif cmd == "rollback":
+            revision = store.rollback(command.get("version"))
+            logger.info("Control parameters rolled back", extra=fields(version=revision.version))
+        elif cmd == "history":
+            return {"ok": True, "current": store.current.version,
+                    "history": [_describe(revision) for revision in store.history()]}
+        else:
+            raise ValueError(f"Unknown command {cmd!r}")
+    except (ValueError, TypeError) as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": True, **_describe(revision)}
+
+
+class TuningServer:
+    """Serves a ParamStore on a UNIX socket from a daemon thread."""
+
+    def __init__(self, store: ParamStore, path: str = TUNING_SOCKET):
+        self.path = path
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(handler):
+                for line in handler.rfile:
+                    try:
+                        command = json.loads(line)
+                        if not isinstance(command, dict):
+                            raise ValueError("Expected a JSON object")
+                    except ValueError as e:
+                        reply = {"ok": False, "error": str(e)}
+                    else:
+                        reply = handle_command(store, command)
+                    handler.wfile.write(json.dumps(reply).encode() + b"\n")
+
+        # A socket left behind by a crashed run would make bind fail
+        if os.path.exists(path):
+            os.unlink(path)
+        self.server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        self.server.daemon_threads = True
+        # Tuning changes how the couch drives, keep it to this user
+        os.chmod(path, 0o600)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def send_command(command: dict, path: str = TUNING_SOCKET) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps(command).encode() + b"\n")
+        with sock.makefile("rb") as replies:
+            return json.loads(replies.readline())
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Tune a running couch's control parameters")
+    parser.add_argument("--socket", default=TUNING_SOCKET)
+    subparsers = parser.add_subparsers(dest="cmd", required=True)
+    subparsers.add_parser("get", help="show the active parameters")
+    subparsers.add_parser("history", help="list every version")
+    set_parser = subparsers.add_parser("set", help="change parameters, e.g. deadband=0.03")
+    set_parser.add_argument("assignments", nargs="+", metavar="NAME=VALUE")
+    rollback_parser = subparsers.add_parser("rollback", help="go back to the previous or a given version")
+    rollback_parser.add_argument("version", type=int, nargs="?")
+    args = parser.parse_args()
+
+    command: dict = {"cmd": args.cmd}
+    if args.cmd == "set":
+        params = {}
+        for assignment in args.assignments:
+            name, _, value = assignment.partition("=")
+            params[name] = float(value)
+        command["params"] = params
+    elif args.cmd == "rollback" and args.version is not None:
+        command["version"] = args.version
+    reply = send_command(command, args.socket)
+    print(json.dumps(reply, indent=2))
+    sys.exit(0 if reply.get("ok") else 1)
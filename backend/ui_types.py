@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+from typing import Optional, Protocol, Sequence
+
+from drive_modes import SpeedMode
+
+
+@dataclass
+class ScreenUIUpdate:
+    speed_mph: float
+    # Signed pack power, negative while regenerating
+    power_watts: float
+    battery_pct: float
+    speed_mode: "SpeedMode"
+    voltage: float = 0.0
+    wh_consumed: float = 0.0
+    wh_regenerated: float = 0.0
+    # Fraction of full output the thermal limiter allows, and its prediction of when it starts limiting
+    thermal_limit: float = 1.0
+    seconds_to_derate: Optional[float] = None
+    # Odometry pose since startup: meters, x forward from where it started, heading counterclockwise
+    x_m: float = 0.0
+    y_m: float = 0.0
+    heading_rad: float = 0.0
+    trip_miles: float = 0.0
+    # mtime of the speed mode registry the control loop runs, see ModeRegistry.for_version
+    modes_version: Optional[float] = None
+
+
+class UIManager(Protocol):
+    """Anything Couch can push dashboard updates to: the Tk ScreenUI or a telemetry publisher."""
+
+    def update(self, update: ScreenUIUpdate) -> None: ...
+
+
+class MultiUIManager:
+    """Sends every update to several UI managers, e.g. the Tk screen and the web dashboard."""
+
+    def __init__(self, managers: Sequence[UIManager]):
+        self.managers = list(managers)
+
+    def update(self, update: ScreenUIUpdate) -> None:
+        for manager in self.managers:
+            manager.update(update)
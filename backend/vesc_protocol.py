@@ -0,0 +1,176 @@
+"""Minimal VESC packet framing and the COMM_GET_VALUES_SELECTIVE message.
+
+pyvesc only knows the full COMM_GET_VALUES reply. The selective variant lets
+the caller pick fields with a bitmask, so the reply only carries what we use.
+Field names match pyvesc's GetValues so callers can use either interchangeably.
+"""
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+COMM_GET_VALUES = 4
+COMM_SET_CURRENT = 6
+COMM_SET_RPM = 8
+COMM_ALIVE = 30
+COMM_FORWARD_CAN = 34
+COMM_GET_VALUES_SELECTIVE = 50
+
+SHORT_PACKET_START = 0x02
+LONG_PACKET_START = 0x03
+PACKET_END = 0x03
+
+# (name, struct format, scale) in mask bit order, as sent by the VESC firmware.
+SELECTIVE_FIELDS: List[Tuple[str, str, float]] = [
+    ("temp_fet", "h", 1e1),
+    ("temp_motor", "h", 1e1),
+    ("avg_motor_current", "i", 1e2),
+    ("avg_input_current", "i", 1e2),
+    ("avg_id", "i", 1e2),
+    ("avg_iq", "i", 1e2),
+    ("duty_cycle_now", "h", 1e3),
+    ("rpm", "i", 1e0),
+    ("v_in", "h", 1e1),
+    ("amp_hours", "i", 1e4),
+    ("amp_hours_charged", "i", 1e4),
+    ("watt_hours", "i", 1e4),
+    ("watt_hours_charged", "i", 1e4),
+    ("tachometer", "i", 1e0),
+    ("tachometer_abs", "i", 1e0),
+    ("mc_fault_code", "B", 1e0),
+    ("pid_pos_now", "i", 1e6),
+    ("app_controller_id", "B", 1e0),
+]
+FIELD_BITS: Dict[str, int] = {name: bit for bit, (name, _, _) in enumerate(SELECTIVE_FIELDS)}
+
+
+def _make_crc_table() -> List[int]:
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC_TABLE = _make_crc_table()
+
+
+def crc16(data: bytes) -> int:
+    """CRC-16/XMODEM, the checksum VESC packets use."""
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC_TABLE[((crc >> 8) ^ byte) & 0xFF]
+    return crc
+
+
+def frame(payload: bytes) -> bytes:
+    """Wraps a payload in VESC packet framing."""
+    if len(payload) < 256:
+        header = struct.pack(">BB", SHORT_PACKET_START, len(payload))
+    else:
+        header = struct.pack(">BH", LONG_PACKET_START, len(payload))
+    return header + payload + struct.pack(">HB", crc16(payload), PACKET_END)
+
+
+def framed_size(payload_length: int) -> int:
+    return payload_length + (5 if payload_length < 256 else 6)
+
+
+def unframe(buffer: bytes) -> Tuple[Optional[bytes], int]:
+    """Extracts the first complete packet from a buffer.
+
+    Returns:
+        (payload, bytes consumed). The payload is None if no valid packet is complete yet.
+    """
+    start = 0
+    while start < len(buffer):
+        if buffer[start] == SHORT_PACKET_START:
+            header_length, length_format = 2, ">B"
+        elif buffer[start] == LONG_PACKET_START:
+            header_length, length_format = 3, ">H"
+        else:
+            start += 1
+            continue
+        if len(buffer) < start + header_length:
+            break
+        (length,) = struct.unpack_from(length_format, buffer, start + 1)
+        end = start + header_length + length + 3
+        if len(buffer) < end:
+            break
+        payload = bytes(buffer[start + header_length:start + header_length + length])
+        (crc,) = struct.unpack_from(">H", buffer, end - 3)
+        if crc == crc16(payload) and buffer[end - 1] == PACKET_END:
+            return payload, end
+        # Corrupt packet, resynchronize on the next start byte
+        start += 1
+    return None, start
+
+
+def forward_can(payload: bytes, can_id: Optional[int]) -> bytes:
+    """Prefixes a payload so the receiving VESC forwards it over CAN."""
+    if can_id is None:
+        return payload
+    return struct.pack(">BB", COMM_FORWARD_CAN, can_id) + payload
+
+
+def encode_set_current(current: float, can_id: Optional[int] = None) -> bytes:
+    """Builds a framed COMM_SET_CURRENT packet, current in amps."""
+    return frame(forward_can(struct.pack(">Bi", COMM_SET_CURRENT, int(current * 1000)), can_id))
+
+
+def selective_mask(fields: Iterable[str]) -> int:
+    """Builds the COMM_GET_VALUES_SELECTIVE mask for the given field names."""
+    mask = 0
+    for name in fields:
+        if name not in FIELD_BITS:
+            raise ValueError(f"Unknown VESC value field {name}")
+        mask |= 1 << FIELD_BITS[name]
+    return mask
+
+
+def _reply_format(mask: int) -> str:
+    return ">" + "".join(fmt for bit, (_, fmt, _) in enumerate(SELECTIVE_FIELDS) if mask & (1 << bit))
+
+
+class SelectiveValues:
+    """Decoded COMM_GET_VALUES_SELECTIVE reply. Only the requested fields are set."""
+
+    def __init__(self, **values: float):
+        self.__dict__.update(values)
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v}" for k, v in self.__dict__.items())
+        return f"SelectiveValues({fields})"
+
+
+class GetValuesSelective:
+    """Precomputed request and reply layout for one field mask and CAN id."""
+
+    def __init__(self, fields: Iterable[str], can_id: Optional[int] = None):
+        self.mask = selective_mask(fields)
+        self.can_id = can_id
+        self.names = [name for bit, (name, _, _) in enumerate(SELECTIVE_FIELDS) if self.mask & (1 << bit)]
+        self.scales = [scale for bit, (_, _, scale) in enumerate(SELECTIVE_FIELDS) if self.mask & (1 << bit)]
+        self._body = struct.Struct(_reply_format(self.mask))
+
+        payload = struct.pack(">BI", COMM_GET_VALUES_SELECTIVE, self.mask)
+        self.request = frame(forward_can(payload, can_id))
+        # Replies come back from the parent VESC without the CAN forwarding prefix
+        self.reply_length = framed_size(5 + self._body.size)
+
+    def decode(self, buffer: bytes) -> Tuple[Optional[SelectiveValues], int]:
+        """Decodes a reply. Same return convention as pyvesc's decode."""
+        payload, consumed = unframe(buffer)
+        if payload is None or len(payload) < 5 or payload[0] != COMM_GET_VALUES_SELECTIVE:
+            return None, consumed
+        (mask,) = struct.unpack_from(">I", payload, 1)
+        if mask != self.mask:
+            return None, consumed
+        raw = self._body.unpack_from(payload, 5)
+        values = SelectiveValues(**{name: value / scale for name, value, scale in zip(self.names, raw, self.scales)})
+        return values, consumed
+
+    def encode_reply(self, values: Dict[str, float]) -> bytes:
+        """Builds the reply a VESC would send. Used by the fake VESC."""
+        raw = [int(round(values.get(name, 0) * scale)) for name, scale in zip(self.names, self.scales)]
+        return frame(struct.pack(">BI", COMM_GET_VALUES_SELECTIVE, self.mask) + self._body.pack(*raw))
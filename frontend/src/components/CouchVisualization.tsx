@@ -2,13 +2,32 @@ import { useEffect, useRef } from 'react';
 import * as THREE from 'three';
 import { GLTFLoader } from 'three/examples/jsm/loaders/GLTFLoader.js';
 
-export default function CouchVisualization() {
+export interface CouchPose {
+    // Meters from where the couch started, x forward, y to the left
+    x: number;
+    y: number;
+    // Radians, counterclockwise seen from above
+    heading: number;
+}
+
+interface CouchVisualizationProps {
+    // Live odometry pose, or null to idly spin the model
+    pose?: CouchPose | null;
+}
+
+// Recent positions drawn as a trail on the ground, one every TRAIL_SPACING meters
+const TRAIL_POINTS = 500;
+const TRAIL_SPACING = 0.05;
+
+export default function CouchVisualization({ pose = null }: CouchVisualizationProps) {
     const mountRef = useRef<HTMLDivElement>(null);
     const frameId = useRef<number>(0);
     const sceneRef = useRef<THREE.Scene | null>(null);
     const rendererRef = useRef<THREE.WebGLRenderer | null>(null);
     const cameraRef = useRef<THREE.PerspectiveCamera | null>(null);
     const modelRef = useRef<THREE.Object3D | null>(null);
+    const poseRef = useRef<CouchPose | null>(pose);
+    poseRef.current = pose;
 
     useEffect(() => {
         if (!mountRef.current) return;
@@ -56,6 +75,36 @@ export default function CouchVisualization() {
         pointLight.position.set(-10, 10, -10);
         scene.add(pointLight);
 
+        // The model turns around the origin with the couch's heading
+        const pivot = new THREE.Group();
+        scene.add(pivot);
+
+        // Scene x is the couch's x and scene -z its y, so heading is a plain rotation about +y.
+        // The couch stays in the middle and the trail moves past it.
+        const trail: [number, number][] = [];
+        const trailPositions = new Float32Array(TRAIL_POINTS * 3);
+        const trailGeometry = new THREE.BufferGeometry();
+        trailGeometry.setAttribute('position', new THREE.BufferAttribute(trailPositions, 3));
+        trailGeometry.setDrawRange(0, 0);
+        const trailLine = new THREE.Line(trailGeometry, new THREE.LineBasicMaterial({ color: 0x0ea5e9 }));
+        trailLine.position.y = -1;
+        scene.add(trailLine);
+
+        const updateTrail = (current: CouchPose) => {
+            const last = trail[trail.length - 1];
+            if (!last || Math.hypot(current.x - last[0], current.y - last[1]) >= TRAIL_SPACING) {
+                trail.push([current.x, current.y]);
+                if (trail.length > TRAIL_POINTS) trail.shift();
+            }
+            trail.forEach(([px, py], i) => {
+                trailPositions[i * 3] = px - current.x;
+                trailPositions[i * 3 + 1] = 0;
+                trailPositions[i * 3 + 2] = -(py - current.y);
+            });
+            trailGeometry.setDrawRange(0, trail.length);
+            trailGeometry.attributes.position.needsUpdate = true;
+        };
+
         // Load the couch model using direct URL
         const loader = new GLTFLoader();
         console.log('Loading model from /couch.glb');
@@ -101,8 +150,10 @@ export default function CouchVisualization() {
                 model.position.copy(center).multiplyScalar(-scale);
                 model.position.y -= (size.y * scale) / 2;
                 
-                scene.add(model);
+                pivot.add(model);
                 modelRef.current = model;
+                // Trail on the ground under the model
+                trailLine.position.y = new THREE.Box3().setFromObject(model).min.y;
             },
             (progress) => {
                 console.log('Loading progress:', (progress.loaded / progress.total) * 100 + '%');
@@ -113,7 +164,7 @@ export default function CouchVisualization() {
                 const geometry = new THREE.BoxGeometry(1, 1, 1);
                 const material = new THREE.MeshStandardMaterial({ color: 0x00ff00 });
                 const cube = new THREE.Mesh(geometry, material);
-                scene.add(cube);
+                pivot.add(cube);
                 modelRef.current = cube;
                 console.log('Added fallback cube');
             }
@@ -123,9 +174,13 @@ export default function CouchVisualization() {
         const animate = () => {
             frameId.current = requestAnimationFrame(animate);
             
-            // Rotate the model slowly
-            if (modelRef.current) {
-                modelRef.current.rotation.y += 0.005;
+            const current = poseRef.current;
+            if (current) {
+                pivot.rotation.y = current.heading;
+                updateTrail(current);
+            } else {
+                // Rotate the model slowly while there is no live pose
+                pivot.rotation.y += 0.005;
             }
             
             renderer.render(scene, camera);
@@ -161,6 +216,8 @@ export default function CouchVisualization() {
             if (rendererRef.current) {
                 rendererRef.current.dispose();
             }
+
+            trailGeometry.dispose();
             
             if (sceneRef.current) {
                 sceneRef.current.clear();
@@ -9,6 +9,11 @@ const DashboardDataSchema = z.object({
   voltage: z.number(),
   speedMode: z.number(),
   gear: z.number(),
+  // Odometry pose: meters from where the couch started, heading in radians counterclockwise
+  x: z.number().default(0),
+  y: z.number().default(0),
+  heading: z.number().default(0),
+  trip: z.number().default(0),
 });
 
 export type DashboardData = z.infer<typeof DashboardDataSchema>;
@@ -22,6 +27,10 @@ export function useDashboardWebSocket() {
     voltage: 0,
     speedMode: 0,
     gear: 0,
+    x: 0,
+    y: 0,
+    heading: 0,
+    trip: 0,
   });
   const [connected, setConnected] = useState(false);
   const wsRef = useRef<WebSocket | null>(null);
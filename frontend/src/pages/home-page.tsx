@@ -21,6 +21,9 @@ export default function HomePage() {
     wattage,
     range,
     voltage,
+    x,
+    y,
+    heading,
     connected,
   } = useDashboardWebSocket();
 
@@ -70,7 +73,7 @@ export default function HomePage() {
             {/* Center: couch visualization */}
             <div className="flex flex-col items-center justify-center flex-1">
               <div className="w-80 h-80">
-                <CouchVisualization />
+                <CouchVisualization pose={connected ? { x, y, heading } : null} />
               </div>
             </div>
 